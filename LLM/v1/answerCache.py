@@ -0,0 +1,144 @@
+import hashlib
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Sequence
+
+
+# Seconds between sweeps of expired rows from the on-disk level
+CLEANUP_INTERVAL_S = 3600
+
+
+def answer_key(redacted_query: str, chunk_ids: Sequence[str], model_name: str,
+               index_version: Optional[str] = None) -> str:
+    """
+    Returns the cache key of an answer: the PII-redacted query (case and
+    whitespace normalized), a hash of the retrieved chunk IDs in prompt
+    order, the model that generates the answer and the index version the
+    chunks were retrieved from.
+    """
+    query = re.sub(r"\s+", " ", redacted_query.lower()).strip()
+    context = hashlib.sha256("\0".join(chunk_ids).encode("utf-8")).hexdigest()
+    return hashlib.sha256(f"{model_name}\0{index_version}\0{context}\0{query}".encode("utf-8")).hexdigest()
+
+
+class AnswerCache:
+    """
+    A cache of full LLM answers placed in front of Ollama. A hit skips
+    generation entirely.
+
+    Entries live in an in-memory LRU with a TTL and, optionally, in a SQLite
+    file that survives restarts and can be shared by workers on one host.
+    Every entry is scoped to the index version stamp it was generated
+    against, so after a re-ingest lookups simply miss the old entries. While
+    replicas report different versions (a rolling re-ingest) the entries of
+    both stay usable; old ones age out of the LRU and the TTL sweep. Callers
+    only put answers that passed the guardrail.
+    """
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 86400, disk_path: str = ""):
+        """
+        Args:
+            max_entries (int): Capacity of the in-memory level.
+            ttl_seconds (float): Lifetime of an entry in either level.
+            disk_path (str): SQLite file for the on-disk level; empty disables it.
+        """
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        # The LLM worker serves several messages at once on worker threads
+        self._lock = threading.RLock()
+        # Keyed by (index version, key)
+        self._memory: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self.stats: Dict[str, int] = {"hits": 0, "disk_hits": 0, "misses": 0, "stores": 0, "evictions": 0,
+                                      "expired_rows": 0}
+        self.connection = None
+        self._cleaned_at = 0.0
+        if disk_path:
+            self.connection = sqlite3.connect(disk_path, check_same_thread=False)
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS answers ("
+                " key TEXT PRIMARY KEY, version TEXT, response TEXT NOT NULL, stored_at REAL NOT NULL)"
+            )
+            self.purge_expired()
+
+    def purge_expired(self):
+        """
+        Deletes the on-disk rows older than the TTL, including those of index
+        versions no longer in use.
+        """
+        with self._lock:
+            self._cleaned_at = time.monotonic()
+            if self.connection is None:
+                return
+            deleted = self.connection.execute("DELETE FROM answers WHERE stored_at < ?",
+                                              (time.time() - self.ttl_seconds,)).rowcount
+            self.connection.commit()
+            self.stats["expired_rows"] += max(deleted, 0)
+
+    def _expired(self, stored_at: float) -> bool:
+        return time.time() - stored_at > self.ttl_seconds
+
+    def get(self, key: str, version: Optional[str] = None) -> Optional[str]:
+        """
+        Returns the answer cached for a key under an index version, if any,
+        from memory or from disk.
+        """
+        slot = (version, key)
+        with self._lock:
+            entry = self._memory.get(slot)
+            if entry is not None:
+                response, stored_at = entry
+                if not self._expired(stored_at):
+                    self._memory.move_to_end(slot)
+                    self.stats["hits"] += 1
+                    return response
+                del self._memory[slot]
+            if self.connection is not None:
+                row = self.connection.execute(
+                    "SELECT response, stored_at FROM answers WHERE key = ? AND version IS ?", (key, version)
+                ).fetchone()
+                if row is not None and not self._expired(row[1]):
+                    self._store_in_memory(slot, row[0], row[1])
+                    self.stats["disk_hits"] += 1
+                    return row[0]
+            self.stats["misses"] += 1
+            return None
+
+    def put(self, key: str, response: str, version: Optional[str] = None):
+        """
+        Stores an answer that passed the guardrail, generated against an index version.
+        """
+        with self._lock:
+            now = time.time()
+            self._store_in_memory((version, key), response, now)
+            if self.connection is not None:
+                self.connection.execute(
+                    "INSERT OR REPLACE INTO answers (key, version, response, stored_at) VALUES (?, ?, ?, ?)",
+                    (key, version, response, now),
+                )
+                self.connection.commit()
+                if time.monotonic() - self._cleaned_at > CLEANUP_INTERVAL_S:
+                    self.purge_expired()
+            self.stats["stores"] += 1
+
+    def discard(self, key: str, version: Optional[str] = None):
+        """
+        Removes an entry, e.g. one that a since-changed guardrail rule now blocks.
+        """
+        with self._lock:
+            self._memory.pop((version, key), None)
+            if self.connection is not None:
+                self.connection.execute("DELETE FROM answers WHERE key = ? AND version IS ?", (key, version))
+                self.connection.commit()
+
+    def _store_in_memory(self, slot: tuple, response: str, stored_at: float):
+        self._memory[slot] = (response, stored_at)
+        self._memory.move_to_end(slot)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
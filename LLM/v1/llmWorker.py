@@ -0,0 +1,349 @@
+import asyncio
+import json
+import os
+import sys
+import time
+from typing import Iterator, List, Optional, Tuple
+import requests
+from requests.adapters import HTTPAdapter
+
+# Add the project root to the system path to allow importing the shared package
+# when this script is run from its own directory.
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(os.path.dirname(current_dir)))
+# The streaming guardrail lives with the guardrail stage; the Docker image copies it next to this file
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(current_dir)), "external-guardtail", "v1"))
+
+from shared.asyncQueueManager import serve_handler
+from shared.envelope import parse_envelope, stamp, dumps
+from shared.flowControl import QueueFullError, expired, mark_busy, message_priority, reply_busy
+from shared.instrumentation import count_cache, get_logger, observe_substage
+from guardrailEngine import get_engine
+from streamingGuard import StreamingGuard
+from answerCache import AnswerCache, answer_key
+
+OLLAMA_URL = os.getenv("OLLAMA_URL", "http://localhost:11434/api/generate")
+OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "llama3")
+# Maximum number of generations running against Ollama at once
+LLM_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", 4))
+# Forward tokens to the client's reply queue as they are generated
+LLM_STREAM_TOKENS = os.getenv("LLM_STREAM_TOKENS", "1") == "1"
+# Run streamed tokens through the guardrail before they reach the client
+LLM_GUARD_STREAM = os.getenv("LLM_GUARD_STREAM", "1") == "1"
+# Answers kept in memory by the answer cache; 0 disables the cache
+LLM_ANSWER_CACHE_SIZE = int(os.getenv("LLM_ANSWER_CACHE_SIZE", 1024))
+# Seconds a cached answer stays valid
+LLM_ANSWER_CACHE_TTL_S = float(os.getenv("LLM_ANSWER_CACHE_TTL_S", 86400))
+# SQLite file for the on-disk level of the answer cache; empty keeps it in memory only
+LLM_ANSWER_CACHE_PATH = os.getenv("LLM_ANSWER_CACHE_PATH", "")
+RABBITMQ_HOST = os.getenv("RABBITMQ_HOST", "rabbitmq")
+
+log = get_logger("llm")
+
+
+class OllamaClient:
+    """
+    A thin Ollama client that reuses pooled keep-alive connections instead of
+    opening a new one per prompt.
+    """
+    def __init__(self, url: str = OLLAMA_URL, pool_size: int = LLM_CONCURRENCY,
+                 connect_timeout: float = 5.0, read_timeout: float = 120.0):
+        """
+        Args:
+            url (str): The Ollama generate endpoint.
+            pool_size (int): Number of connections kept open to the server.
+            connect_timeout (float): Seconds to wait for a connection.
+            read_timeout (float): Seconds to wait between streamed chunks.
+        """
+        self.url = url
+        self.timeout = (connect_timeout, read_timeout)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def generate(self, prompt: str, model_name: str) -> str:
+        """
+        Returns the full completion for a prompt in one response.
+        """
+        payload = {"model": model_name, "prompt": prompt, "stream": False}
+        response = self.session.post(self.url, json=payload, timeout=self.timeout)
+        response.raise_for_status()
+        generated_text = response.json().get('response', '')
+        if not generated_text:
+            raise ValueError("Ollama response was empty.")
+        return generated_text
+
+    def stream(self, prompt: str, model_name: str) -> Iterator[str]:
+        """
+        Yields the completion token by token using Ollama's streaming API,
+        which sends one JSON object per line until "done" is true. The body is
+        read to the end so the connection goes back to the pool.
+        """
+        payload = {"model": model_name, "prompt": prompt, "stream": True}
+        with self.session.post(self.url, json=payload, timeout=self.timeout, stream=True) as response:
+            response.raise_for_status()
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                chunk = json.loads(line)
+                if chunk.get("error"):
+                    raise ValueError(f"Ollama error: {chunk['error']}")
+                token = chunk.get("response", "")
+                if token:
+                    yield token
+
+    def close(self):
+        self.session.close()
+
+
+def passes_guardrail(response: str) -> bool:
+    """
+    Returns whether the response gets through the guardrail rules unblocked,
+    as check_safety() in the guardrail stage would decide.
+    """
+    _, matches = get_engine().evaluate(response)
+    return not any(match.action == "block" for match in matches)
+
+
+ollama = OllamaClient()
+answer_cache = (AnswerCache(LLM_ANSWER_CACHE_SIZE, LLM_ANSWER_CACHE_TTL_S, LLM_ANSWER_CACHE_PATH)
+                if LLM_ANSWER_CACHE_SIZE > 0 else None)
+queue_manager = None
+
+def forward_to_guardrail(envelope):
+    """
+    Publishes the answered envelope to the guardrail stage, telling the client
+    the service is busy if the guardrail queue is full.
+    """
+    try:
+        queue_manager.send_message(queue_name='guardrail_queue', message=dumps(envelope),
+                                   priority=message_priority(envelope))
+    except QueueFullError as e:
+        reply_busy(queue_manager, envelope, "llm", e.queue_name)
+
+def lookup_answer(envelope) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Looks the request up in the answer cache when RAG-Core has identified its
+    context. Returns the cached answer (None on a miss) and the cache key
+    (None when the request can't be cached).
+    """
+    if answer_cache is None or envelope.get("context_ids") is None:
+        return None, None
+    version = envelope.get("index_version")
+    cache_key = answer_key(envelope["text"], envelope["context_ids"], OLLAMA_MODEL, version)
+    cached = answer_cache.get(cache_key, version)
+    # The rules may have changed since the answer was stored
+    if cached is not None and not passes_guardrail(cached):
+        answer_cache.discard(cache_key, version)
+        cached = None
+    count_cache("answer", hit=cached is not None)
+    return cached, cache_key
+
+def use_cached_answer(envelope, cached: str):
+    log.debug("answer cache hit", correlation_id=envelope["correlation_id"])
+    envelope["response"] = cached
+    envelope["answer_cache"] = "hit"
+    stamp(envelope, "llm")
+
+def store_answer(cache_key: Optional[str], envelope, blocked: bool):
+    # Only answers the guardrail would let through are reused
+    if cache_key is not None and not blocked and passes_guardrail(envelope["response"]):
+        answer_cache.put(cache_key, envelope["response"], envelope.get("index_version"))
+
+
+class GenerationStream:
+    """
+    One streamed generation, shared by the blocking callback and the async
+    handler: runs the tokens through the streaming guardrail, stamps the
+    envelope and times generation and guard separately. The caller reads
+    the tokens and sends the returned text to the client.
+    """
+    def __init__(self, envelope, forward: bool):
+        self.envelope = envelope
+        self.forward = forward
+        self.guard = StreamingGuard() if LLM_GUARD_STREAM else None
+        self.pieces = []
+        self.released_any = False
+        # Time inside the guard is subtracted from the generation time
+        self.guard_seconds = 0.0
+        self.started = time.perf_counter()
+
+    @property
+    def blocked(self) -> bool:
+        return self.guard is not None and self.guard.blocked is not None
+
+    def feed(self, token: str) -> str:
+        """
+        Adds a generated token. Returns the text to forward to the client now,
+        possibly empty. Stop reading once `blocked` is set.
+        """
+        if not self.pieces:
+            # The gap between this stamp and 'rag_core' is the time to first token
+            stamp(self.envelope, "llm_first_token")
+        self.pieces.append(token)
+        guard_started = time.perf_counter()
+        safe_text = self.guard.feed(token) if self.guard else token
+        self.guard_seconds += time.perf_counter() - guard_started
+        if self.blocked or not (safe_text and self.forward):
+            return ""
+        if not self.released_any:
+            stamp(self.envelope, "llm_first_release")
+            self.released_any = True
+        return safe_text
+
+    def finish(self) -> List[Tuple[str, str]]:
+        """
+        Ends the stream, checking the held-back tail, and sets the envelope's response.
+
+        Returns:
+            List[Tuple[str, str]]: The (type, text) messages still to send to the client.
+        """
+        generation_seconds = time.perf_counter() - self.started - self.guard_seconds
+        messages = []
+        if self.guard:
+            guard_started = time.perf_counter()
+            tail = self.guard.finish()
+            self.guard_seconds += time.perf_counter() - guard_started
+            observe_substage("llm", "guard", self.guard_seconds)
+            if self.guard.blocked:
+                log.warning("guardrail rule fired mid-stream", correlation_id=self.envelope["correlation_id"],
+                            rule=self.guard.blocked.rule_id)
+                self.envelope["guardrail_stream_block"] = self.guard.blocked._asdict()
+                if self.forward:
+                    messages.append(("blocked", self.guard.block_message))
+            elif tail and self.forward:
+                messages.append(("token", tail))
+
+        observe_substage("llm", "generate", generation_seconds)
+        self.envelope["response"] = "".join(self.pieces)
+        if not self.envelope["response"]:
+            raise ValueError("Ollama response was empty.")
+        stamp(self.envelope, "llm")
+        return messages
+
+
+def llm_callback(ch, method, properties, body):
+    """
+    Callback function for the LLM worker. It streams the completion for the
+    prompt in the envelope, forwarding each token that the streaming guardrail
+    has verified to the client's reply queue, then sends the full response on
+    to the guardrail stage. If a blocking rule fires mid-stream, generation is
+    cut off and the client is told the answer was blocked.
+
+    When RAG-Core has identified the context, an answer cached for the same
+    redacted query, chunks and model is returned without calling Ollama.
+    Requests whose deadline has passed are dropped before generation starts.
+    """
+    envelope = parse_envelope(body)
+    if expired(envelope, 'llm_queue'):
+        return
+    correlation_id = envelope["correlation_id"]
+    reply_to = envelope.get("reply_to")
+    forward = LLM_STREAM_TOKENS and reply_to
+    log.debug("received", correlation_id=correlation_id, prompt_tokens=envelope.get("prompt_tokens"))
+
+    def send_to_client(message_type: str, text: str):
+        message = {"correlation_id": correlation_id, "type": message_type, "text": text}
+        queue_manager.send_reply(reply_to, json.dumps(message), correlation_id)
+
+    cached, cache_key = lookup_answer(envelope)
+    if cached is not None:
+        if forward:
+            send_to_client("token", cached)
+        use_cached_answer(envelope, cached)
+        forward_to_guardrail(envelope)
+        return
+
+    stream = GenerationStream(envelope, forward)
+    # Errors propagate so the QueueManager rejects the message instead of acking it
+    for token in ollama.stream(envelope.get("prompt") or envelope["text"], OLLAMA_MODEL):
+        safe_text = stream.feed(token)
+        if stream.blocked:
+            # Leaving the loop closes the streaming response, which stops the generation
+            break
+        if safe_text:
+            send_to_client("token", safe_text)
+    for message_type, text in stream.finish():
+        send_to_client(message_type, text)
+    store_answer(cache_key, envelope, stream.blocked)
+
+    # The guardrail stage still checks the whole response and has the final word
+    forward_to_guardrail(envelope)
+
+def make_async_handler(manager):
+    """
+    Returns the handler the worker runs: llm_callback's steps with each read
+    of the Ollama stream and each answer-cache access awaited on the
+    manager's thread pool, and the tokens, replies and the hand-off to the
+    guardrail published with awaited confirms. The event loop interleaves
+    LLM_CONCURRENCY generations. Errors propagate so the manager rejects the message.
+    """
+    async def llm_handler(message):
+        envelope = parse_envelope(message.body)
+        if expired(envelope, 'llm_queue'):
+            return
+        correlation_id = envelope["correlation_id"]
+        reply_to = envelope.get("reply_to")
+        forward = LLM_STREAM_TOKENS and reply_to
+        log.debug("received", correlation_id=correlation_id, prompt_tokens=envelope.get("prompt_tokens"))
+
+        async def send_to_client(message_type: str, text: str):
+            body = {"correlation_id": correlation_id, "type": message_type, "text": text}
+            await manager.send_reply(reply_to, json.dumps(body), correlation_id)
+
+        async def forward_envelope():
+            try:
+                await manager.forward('guardrail_queue', dumps(envelope), priority=message_priority(envelope))
+            except QueueFullError as e:
+                if mark_busy(envelope, "llm", e.queue_name):
+                    await manager.send_reply(reply_to, dumps(envelope), correlation_id)
+
+        cached, cache_key = await manager.run_blocking(lookup_answer, envelope)
+        if cached is not None:
+            if forward:
+                await send_to_client("token", cached)
+            use_cached_answer(envelope, cached)
+            await forward_envelope()
+            return
+
+        stream = GenerationStream(envelope, forward)
+        tokens = ollama.stream(envelope.get("prompt") or envelope["text"], OLLAMA_MODEL)
+        try:
+            while True:
+                # The stream only yields non-empty tokens, so None marks its end
+                token = await manager.run_blocking(next, tokens, None)
+                if token is None:
+                    break
+                safe_text = stream.feed(token)
+                if stream.blocked:
+                    break
+                if safe_text:
+                    await send_to_client("token", safe_text)
+        finally:
+            # Closes the streaming response, which stops the generation
+            tokens.close()
+        for message_type, text in stream.finish():
+            await send_to_client(message_type, text)
+        await manager.run_blocking(store_answer, cache_key, envelope, stream.blocked)
+        await forward_envelope()
+
+    return llm_handler
+
+def bind_queue_manager(publisher):
+    """
+    Installs the publisher the callback uses to forward messages.
+    """
+    global queue_manager
+    queue_manager = publisher
+
+if __name__ == "__main__":
+    # LLM_CONCURRENCY bounds the number of generations in flight on the event loop
+    try:
+        asyncio.run(serve_handler('llm_queue', make_async_handler, LLM_CONCURRENCY, rabbitmq_host=RABBITMQ_HOST))
+    except KeyboardInterrupt:
+        print('Interrupted. Exiting...')
+    finally:
+        ollama.close()
+        if answer_cache is not None:
+            answer_cache.close()
@@ -3,9 +3,12 @@ import sys
 import json
 import requests
 
-def get_llm_response(prompt: str, model_name: str) -> str:
+OLLAMA_URL = os.getenv("OLLAMA_URL", "http://localhost:11434/api/generate")
+
+def generate(prompt: str, model_name: str) -> str:
     """
-    Sends a prompt to a local Ollama server and returns the generated text.
+    Sends a prompt to the Ollama server and returns the generated text,
+    raising on connection, HTTP or parsing errors.
 
     Args:
         prompt (str): The final, formatted prompt from the RAG core.
@@ -14,29 +17,33 @@ def get_llm_response(prompt: str, model_name: str) -> str:
     Returns:
         str: The generated response from the LLM.
     """
-    # The URL for the local Ollama server's generate endpoint
-    url = "http://localhost:11434/api/generate"
-    
     headers = {"Content-Type": "application/json"}
     payload = {
         "model": model_name,
         "prompt": prompt,
         "stream": False  # We want the full response at once
     }
+    response = requests.post(OLLAMA_URL, headers=headers, data=json.dumps(payload), timeout=120)
+    response.raise_for_status()  # Raise an HTTPError for bad responses (4xx or 5xx)
 
-    try:
-        response = requests.post(url, headers=headers, data=json.dumps(payload), timeout=120)
-        response.raise_for_status()  # Raise an HTTPError for bad responses (4xx or 5xx)
+    generated_text = response.json().get('response', '')
+    if not generated_text:
+        raise ValueError("Ollama response was empty.")
+    return generated_text
+
+def get_llm_response(prompt: str, model_name: str) -> str:
+    """
+    Sends a prompt to a local Ollama server and returns the generated text.
 
-        data = response.json()
-        
-        # Extract the response from the Ollama payload
-        generated_text = data.get('response', '')
-        
-        if not generated_text:
-            raise ValueError("Ollama response was empty.")
-            
-        return generated_text
+    Args:
+        prompt (str): The final, formatted prompt from the RAG core.
+        model_name (str): The name of the Ollama model to use (e.g., 'llama3').
+
+    Returns:
+        str: The generated response from the LLM.
+    """
+    try:
+        return generate(prompt, model_name)
 
     except requests.exceptions.ConnectionError as e:
         print("Error: Could not connect to Ollama server.", file=sys.stderr)
@@ -47,7 +54,6 @@ def get_llm_response(prompt: str, model_name: str) -> str:
         sys.exit(1)
     except (KeyError, ValueError) as e:
         print(f"Failed to parse Ollama response: {e}", file=sys.stderr)
-        print("Response:", response.text, file=sys.stderr)
         sys.exit(1)
 
 
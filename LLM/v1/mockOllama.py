@@ -0,0 +1,90 @@
+import argparse
+import json
+import sys
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_RESPONSE = (
+    "Under the Consumer Protection Act, 2019 you can file a complaint with the "
+    "District Commission where the value of the goods or services paid does not "
+    "exceed one crore rupees."
+)
+
+
+def make_handler(response_text: str, token_delay_ms: float, first_token_delay_ms: float):
+    """
+    Builds a request handler that imitates Ollama's /api/generate endpoint.
+    The canned response is split on spaces into tokens; in streaming mode each
+    token is sent as its own NDJSON line after `token_delay_ms`.
+    """
+    tokens = [word + " " for word in response_text.split(" ")]
+
+    class MockOllamaHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        # Send each token line immediately instead of coalescing small writes
+        disable_nagle_algorithm = True
+
+        def do_POST(self):
+            if self.path != "/api/generate":
+                self.send_error(404)
+                return
+            length = int(self.headers.get("Content-Length", 0))
+            payload = json.loads(self.rfile.read(length) or b"{}")
+            model = payload.get("model", "mock")
+            time.sleep(first_token_delay_ms / 1000.0)
+
+            if not payload.get("stream", True):
+                time.sleep(token_delay_ms * len(tokens) / 1000.0)
+                body = json.dumps({"model": model, "response": "".join(tokens), "done": True}).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+                return
+
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            for token in tokens:
+                self._write_chunk({"model": model, "response": token, "done": False})
+                time.sleep(token_delay_ms / 1000.0)
+            self._write_chunk({"model": model, "response": "", "done": True})
+            self.wfile.write(b"0\r\n\r\n")
+
+        def _write_chunk(self, obj):
+            line = json.dumps(obj).encode("utf-8") + b"\n"
+            self.wfile.write(f"{len(line):x}\r\n".encode("ascii") + line + b"\r\n")
+            self.wfile.flush()
+
+        def log_message(self, format, *args):
+            pass
+
+    return MockOllamaHandler
+
+
+def serve(port: int = 11434, response_text: str = DEFAULT_RESPONSE, token_delay_ms: float = 20.0,
+          first_token_delay_ms: float = 100.0) -> ThreadingHTTPServer:
+    """
+    Creates a threaded mock Ollama server on localhost. Call serve_forever()
+    on the result, or run it in a background thread from a test or benchmark.
+    """
+    handler = make_handler(response_text, token_delay_ms, first_token_delay_ms)
+    return ThreadingHTTPServer(("127.0.0.1", port), handler)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="A local stand-in for Ollama's /api/generate endpoint.")
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--token-delay-ms", type=float, default=20.0)
+    parser.add_argument("--first-token-delay-ms", type=float, default=100.0)
+    parser.add_argument("--response", default=DEFAULT_RESPONSE)
+    args = parser.parse_args()
+
+    server = serve(args.port, args.response, args.token_delay_ms, args.first_token_delay_ms)
+    print(f" [i] Mock Ollama listening on http://127.0.0.1:{args.port}/api/generate", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
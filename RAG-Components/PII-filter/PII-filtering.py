@@ -1,51 +1,91 @@
-import re
+import asyncio
+import os
 import sys
 # This is the new import statement to use the shared QueueManager
 from shared.queueManager import QueueManager
+from shared.asyncQueueManager import serve_callback
+from shared.envelope import parse_envelope, stamp, dumps
+from shared.flowControl import QueueFullError, expired, message_priority, reply_busy
+from shared.instrumentation import get_logger, substage
+from redactionEngine import default_engine
+from parallelRedaction import redact_text
+
+# Number of unacknowledged messages RabbitMQ may push to this consumer at once
+QUEUE_PREFETCH = int(os.getenv("QUEUE_PREFETCH", 1))
+
+# QUEUE_MODE=async runs the callback under the asyncio QueueManager with
+# QUEUE_CONCURRENCY messages in flight instead of the blocking consumer.
+QUEUE_MODE = os.getenv("QUEUE_MODE", "blocking")
+QUEUE_CONCURRENCY = int(os.getenv("QUEUE_CONCURRENCY", 8))
+
+# Messages at least this many characters long (pasted invoices, e-mail threads)
+# are split across a process pool, which cuts the time to redact that message.
+# The callback still waits for the result, so in the default blocking mode a
+# large message holds up the messages behind it; only QUEUE_MODE=async keeps
+# short messages flowing on other workers meanwhile.
+PII_PARALLEL_THRESHOLD = int(os.getenv("PII_PARALLEL_THRESHOLD", 32768))
+
+log = get_logger("pii_filter")
 
-# The PII redaction function remains the same
 def redact_pii(text: str) -> str:
     """
     Scans a text string for common PII and redacts it.
-    """
-    name_regex = r"\b(?!Mr\.|Ms\.|Dr\.|Mrs\.|Mr|Ms|Dr|and)\b([A-Z][a-z]+)\s+([A-Z][a-z]+)\b"
-    email_regex = r"\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b"
-    phone_regex = r"(\(\d{3}\)\s*\d{3}-\d{4}|\d{3}-\d{3}-\d{4})"
-
-    redacted_text = re.sub(email_regex, "[EMAIL]", text)
-    redacted_text = re.sub(phone_regex, "[PHONE]", redacted_text)
-    redacted_text = re.sub(name_regex, "[NAME]", redacted_text)
 
-    return redacted_text
+    All PII types (names, e-mails, phone numbers, PAN, Aadhaar, UPI IDs and
+    order/invoice numbers) are matched in a single pass by the precompiled
+    RedactionEngine.
+    """
+    return default_engine.redact(text)
 
 # This is the new callback function for RabbitMQ
 def pii_redact_callback(ch, method, properties, body):
     """
     Callback function to handle incoming messages from the queue.
-    It redacts PII and publishes the result to the next queue.
+    It redacts PII and publishes the result to the next queue, in the
+    priority lane chosen from the original query.
     """
+    # Decode the message envelope and pull out the user's text
+    envelope = parse_envelope(body)
+    if expired(envelope, 'pii_redaction_queue'):
+        return
+    priority = message_priority(envelope)
+    original_text = envelope["text"]
+    log.debug("received", correlation_id=envelope["correlation_id"], chars=len(original_text))
+
+    # Redact PII; large payloads are split across the process pool (this still blocks until done)
+    with substage("pii_filter", "redact"):
+        redacted_text = redact_text(original_text, PII_PARALLEL_THRESHOLD)
+    log.debug("redacted", correlation_id=envelope["correlation_id"], chars=len(redacted_text))
+    envelope["text"] = redacted_text
+    stamp(envelope, "pii_filter")
+
+    # Publish the redacted message to the next queue in the pipeline.
+    # The QueueManager acks the message once this returns, and rejects it if we raise;
+    # if the next queue is full the client is told the service is busy instead.
     try:
-        # Decode the message body from bytes to a string
-        original_text = body.decode('utf-8')
-        print(f" [x] Received from 'pii_redaction_queue': {original_text}")
-
-        # Redact PII
-        redacted_text = redact_pii(original_text)
-        print(f" [x] Redacted text: {redacted_text}")
-        
-        # Publish the redacted message to the next queue in the pipeline
-        queue_manager.send_message(queue_name='rag_core_queue', message=redacted_text)
-        
-    except Exception as e:
-        print(f"Error processing message: {e}", file=sys.stderr)
-    
-    # Acknowledge the message (auto_ack=True handles this for us, but this is a good pattern to remember)
-    ch.basic_ack(delivery_tag=method.delivery_tag)
+        queue_manager.send_message(queue_name='rag_core_queue', message=dumps(envelope), priority=priority)
+    except QueueFullError as e:
+        reply_busy(queue_manager, envelope, "pii_filter", e.queue_name)
+
+def bind_queue_manager(publisher):
+    """
+    Installs the publisher the callback uses to forward messages.
+    """
+    global queue_manager
+    queue_manager = publisher
 
 if __name__ == "__main__":
+    if QUEUE_MODE == "async":
+        # Run the same callback with QUEUE_CONCURRENCY messages in flight
+        try:
+            asyncio.run(serve_callback('pii_redaction_queue', pii_redact_callback, QUEUE_CONCURRENCY, bind_queue_manager))
+        except KeyboardInterrupt:
+            print('Interrupted. Exiting...')
+        sys.exit(0)
+
     # Initialize the QueueManager
     try:
-        queue_manager = QueueManager()
+        queue_manager = QueueManager(prefetch_count=QUEUE_PREFETCH)
     except Exception as e:
         print(f"Failed to initialize QueueManager: {e}", file=sys.stderr)
         sys.exit(1)
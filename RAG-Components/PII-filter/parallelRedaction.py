@@ -0,0 +1,132 @@
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional
+from redactionEngine import RedactionEngine, default_engine
+
+# Characters of left context handed to a worker so look-behinds and \b at the
+# start of its window see the same text as a serial scan would.
+LEFT_CONTEXT = 16
+SENTENCE_END = re.compile(r"[.!?]\s+")
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def get_pool(max_workers: Optional[int] = None) -> ProcessPoolExecutor:
+    """
+    Returns the process pool shared by all large-payload redactions, creating it on first use.
+    """
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=max_workers or os.cpu_count())
+    return _pool
+
+
+def split_points(text: str, segment_size: int) -> List[int]:
+    """
+    Picks split offsets roughly every `segment_size` characters, moved forward
+    to the start of the next sentence when one begins within a quarter segment.
+    """
+    points = []
+    target = segment_size
+    while target < len(text):
+        boundary = SENTENCE_END.search(text, target, min(len(text), target + segment_size // 4))
+        point = boundary.end() if boundary else target
+        if point >= len(text):
+            break
+        points.append(point)
+        target = point + segment_size
+    return points
+
+
+def _scan_segment(window: str, offset: int, scan_from: int, stop: int, window_is_tail: bool):
+    """
+    Worker: scans `window` (a slice of the text starting at `offset`) from
+    `scan_from` and returns (start, end, replacement) for every match starting
+    before `stop`, in absolute offsets. Also reports whether a match ran into
+    the end of a window that was cut short, in which case it may be truncated.
+    """
+    matches = []
+    truncated = False
+    for match in default_engine.pattern.finditer(window, scan_from - offset):
+        start = match.start() + offset
+        if start >= stop:
+            break
+        end = match.end() + offset
+        if match.end() == len(window) and not window_is_tail:
+            truncated = True
+        matches.append((start, end, default_engine._replace(match)))
+    return matches, truncated
+
+
+def _free_at(matches, position: int) -> bool:
+    return not any(start < position < end for start, end, _ in matches)
+
+
+def parallel_redact(text: str, segment_size: int = 16384, overlap: int = 512,
+                    max_tail: int = 4096, engine: RedactionEngine = default_engine) -> str:
+    """
+    Redacts a large text on the process pool and returns exactly what
+    engine.redact(text) would. The caller blocks until every segment is
+    done; the pool shortens that wait, it does not move it off the caller.
+
+    The text is split on sentence boundaries into segments; each worker scans
+    its segment plus `overlap` characters on either side. At each seam the two
+    neighbouring scans are stitched at a position where neither has a match in
+    progress: from such a position a regex scan proceeds identically no matter
+    where it started, so the stitched matches equal the serial ones. A PII span
+    crossing a split is therefore found whole by at least one side. If no such
+    position exists in the overlap, or a match may have been cut off at the end
+    of a worker's window, the text is redacted serially instead.
+
+    Args:
+        text (str): The text to redact.
+        segment_size (int): Approximate characters per worker task.
+        overlap (int): Characters each scan extends into its neighbours.
+        max_tail (int): Extra characters after a segment's stop offset shipped to
+            the worker so matches that start near the stop are seen whole.
+        engine (RedactionEngine): Must be the default engine, which the workers use.
+    """
+    if engine is not default_engine or len(text) <= segment_size:
+        return engine.redact(text)
+
+    bounds = [0] + split_points(text, segment_size) + [len(text)]
+    futures = []
+    for own_start, own_end in zip(bounds, bounds[1:]):
+        scan_from = max(0, own_start - overlap)
+        stop = min(len(text), own_end + overlap)
+        offset = max(0, scan_from - LEFT_CONTEXT)
+        window_end = min(len(text), stop + max_tail)
+        futures.append(get_pool().submit(_scan_segment, text[offset:window_end], offset, scan_from, stop,
+                                         window_end == len(text)))
+    results = [future.result() for future in futures]
+    if any(truncated for _, truncated in results):
+        return engine.redact(text)
+
+    accepted = results[0][0]
+    for split, (matches, _) in zip(bounds[1:-1], results[1:]):
+        # Candidate cut points: the split itself, then every match end in the overlap
+        candidates = [split] + [end for _, end, _ in matches if split < end < split + overlap]
+        cut = next((c for c in candidates if _free_at(accepted, c) and _free_at(matches, c)), None)
+        if cut is None:
+            return engine.redact(text)
+        accepted = [m for m in accepted if m[0] < cut] + [m for m in matches if m[0] >= cut]
+
+    pieces = []
+    position = 0
+    for start, end, replacement in accepted:
+        pieces.append(text[position:start])
+        pieces.append(replacement)
+        position = end
+    pieces.append(text[position:])
+    return "".join(pieces)
+
+
+def redact_text(text: str, threshold: int) -> str:
+    """
+    Redacts small texts inline and splits texts of at least `threshold`
+    characters across the process pool, waiting for the result either way.
+    """
+    if len(text) >= threshold:
+        return parallel_redact(text)
+    return default_engine.redact(text)
@@ -0,0 +1,81 @@
+import re
+from typing import List, Optional, Sequence, Tuple
+
+# (label, pattern, replacement). Order matters: when two rules could match at
+# the same position, the earlier one wins, e.g. an e-mail address is never
+# mistaken for a UPI ID and a 12-digit Aadhaar number is never split into a
+# mobile number.
+DEFAULT_RULES: List[Tuple[str, str, str]] = [
+    ("EMAIL", r"\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}\b", "[EMAIL]"),
+    # UPI handles look like e-mail addresses without a dotted domain: name@okbank
+    ("UPI", r"\b[A-Za-z0-9._-]{2,256}@[A-Za-z]{2,64}\b", "[UPI]"),
+    # Keep the "Order No." / "Invoice #" label and redact only the identifier, which
+    # must contain a digit so upper-case words ("Order CANCELLED") are left alone
+    ("ORDER", r"\b(?P<ORDER_LABEL>(?i:order|invoice|inv|bill)(?:\s*(?i:no|number|id)\.?|\s*#)?\s*[:#-]?\s*)"
+              r"(?=[A-Z/-]*\d)[A-Z0-9][A-Z0-9/-]{4,}\b", "[ORDER_ID]"),
+    ("PAN", r"\b[A-Z]{5}[0-9]{4}[A-Z]\b", "[PAN]"),
+    ("AADHAAR", r"\b[2-9][0-9]{3}[ -]?[0-9]{4}[ -]?[0-9]{4}\b", "[AADHAAR]"),
+    ("PHONE_IN", r"\b0?[6-9][0-9]{4}[ -]?[0-9]{5}\b", "[PHONE]"),
+    # The literal comes before the look-behind so most positions fail on the first character
+    ("PHONE_IN_INTL", r"\+(?<![\w+]\+)91[ -]?[6-9][0-9]{4}[ -]?[0-9]{5}\b", "[PHONE]"),
+    ("PHONE", r"\b\d{3}-\d{3}-\d{4}\b", "[PHONE]"),
+    ("PHONE_PAREN", r"\(\d{3}\)\s*\d{3}-\d{4}", "[PHONE]"),
+    # Two capitalised words, except when the first is an honorific
+    ("NAME", r"\b(?!(?:Mr|Ms|Mrs|Dr)\b)[A-Z][a-z]+\s+[A-Z][a-z]+\b", "[NAME]"),
+]
+
+
+class RedactionEngine:
+    """
+    Redacts every PII type in a single scan of the text.
+
+    All rules are compiled once into one alternation of named groups, so the
+    regex engine walks the text a single time instead of once per PII type.
+    Rules that start at a word boundary share a single leading \\b, so
+    positions inside a word are rejected by one check rather than one per rule.
+    """
+    def __init__(self, rules: Optional[Sequence[Tuple[str, str, str]]] = None):
+        """
+        Args:
+            rules: (label, pattern, replacement) triples; defaults to DEFAULT_RULES.
+        """
+        self.rules = list(rules if rules is not None else DEFAULT_RULES)
+        self.replacements = {label: replacement for label, _, replacement in self.rules}
+        self.pattern = re.compile(self._combine(self.rules))
+
+    @staticmethod
+    def _combine(rules: Sequence[Tuple[str, str, str]]) -> str:
+        word_start = [f"(?P<{label}>{pattern[2:]})" for label, pattern, _ in rules if pattern.startswith(r"\b")]
+        other = [f"(?P<{label}>{pattern})" for label, pattern, _ in rules if not pattern.startswith(r"\b")]
+        # (?=\w) keeps the word-start group from being tried at the end of every word
+        alternatives = ([r"\b(?=\w)(?:" + "|".join(word_start) + ")"] if word_start else []) + other
+        return "|".join(alternatives)
+
+    def _replace(self, match: "re.Match") -> str:
+        label = match.lastgroup
+        if label == "ORDER":
+            return match.group("ORDER_LABEL") + self.replacements[label]
+        return self.replacements[label]
+
+    def redact(self, text: str) -> str:
+        """
+        Returns the text with every PII match replaced by its placeholder.
+        """
+        return self.pattern.sub(self._replace, text)
+
+    def redact_batch(self, texts: Sequence[str]) -> List[str]:
+        """
+        Redacts a list of messages, returning the results in the same order.
+        """
+        sub = self.pattern.sub
+        replace = self._replace
+        return [sub(replace, text) for text in texts]
+
+    def find(self, text: str) -> List[Tuple[str, int, int]]:
+        """
+        Returns (label, start, end) for every PII match in the text.
+        """
+        return [(match.lastgroup, match.start(), match.end()) for match in self.pattern.finditer(text)]
+
+
+default_engine = RedactionEngine()
@@ -1,111 +1,287 @@
-import json
+import asyncio
 import sys
 import os
-import chromadb
-from sentence_transformers import SentenceTransformer
-from typing import List, Dict, Any
+from typing import Dict, Any, Tuple
 # Import the shared QueueManager class
 from shared.queueManager import QueueManager
+from shared.asyncQueueManager import serve_handler
+from shared.envelope import parse_envelope, stamp, dumps
+from shared.flowControl import QueueFullError, expired, mark_busy, message_priority, reply_busy
+from shared.instrumentation import get_logger
+from retriever import Retriever
+from queryCache import QueryCache
+from searchBackends import ChromaBackend, NumpyBackend, SearchBackend
+from hybridSearch import CrossEncoderReranker, HybridSearcher
+from promptBuilder import PromptBuilder, make_token_counter
 
 # IMPORTANT: Use an HttpClient to connect to a separate ChromaDB service
 # The host name 'chromadb-server' should match the service name in your docker-compose.yml file
 # The port '8000' is the default for the ChromaDB server
 CHROMA_HOST = os.getenv("CHROMA_HOST", "chromadb-server")
 CHROMA_PORT = os.getenv("CHROMA_PORT", 8000)
+# A local ChromaDB directory (e.g. data/chroma_data) to open with a
+# PersistentClient instead of the server; used by the load-test harness.
+CHROMA_PATH = os.getenv("CHROMA_PATH", "")
 
-def run_rag_query(user_query: str) -> str:
+# RAG_BACKEND=numpy searches an in-process index exported with
+# chunking/exportIndex.py from RAG_INDEX_DIR instead of the ChromaDB server.
+# RAG_INDEX_ANN=ivf|hnsw builds an approximate index over it for large corpora;
+# RAG_INDEX_NPROBE is the number of IVF clusters searched per query.
+RAG_BACKEND = os.getenv("RAG_BACKEND", "chroma")
+RAG_INDEX_DIR = os.getenv("RAG_INDEX_DIR", "./index")
+RAG_INDEX_ANN = os.getenv("RAG_INDEX_ANN", "")
+RAG_INDEX_NPROBE = int(os.getenv("RAG_INDEX_NPROBE", 8))
+
+# Query encoder: sentence-transformers (torch), or onnx / onnx-int8 to run the
+# export in RAG_ONNX_DIR (written by chunking/exportOnnx.py) on onnxruntime,
+# which starts faster and keeps a smaller resident set.
+RAG_ENCODER = os.getenv("RAG_ENCODER", "sentence-transformers")
+RAG_ONNX_DIR = os.getenv("RAG_ONNX_DIR", "./onnx")
+
+# Chunks per query placed in the prompt. Hybrid search finds the right chunks
+# with a smaller top-k, which keeps prompts short.
+RAG_TOP_K = int(os.getenv("RAG_TOP_K", 3))
+# Hybrid search: RAG_BM25_PATH points at the BM25 index (bm25.npz) written at
+# ingestion; empty keeps dense-only search. RAG_CANDIDATES chunks are taken
+# from each of BM25 and dense search and merged by reciprocal-rank fusion.
+RAG_BM25_PATH = os.getenv("RAG_BM25_PATH", "")
+RAG_CANDIDATES = int(os.getenv("RAG_CANDIDATES", 20))
+# Optional cross-encoder reranking of the fused candidates, e.g.
+# cross-encoder/ms-marco-MiniLM-L-6-v2; RAG_RERANK_MIN_SCORE drops weak chunks.
+RAG_RERANK_MODEL = os.getenv("RAG_RERANK_MODEL", "")
+RAG_RERANK_MIN_SCORE = os.getenv("RAG_RERANK_MIN_SCORE", "")
+
+# Prompt assembly: overlapping chunks are merged and the whole prompt is fit
+# to RAG_PROMPT_TOKENS (0 for no limit), counted with the LLM's Hugging Face
+# tokenizer RAG_PROMPT_TOKENIZER (empty approximates the count).
+# RAG_PROMPT_ORDER=score puts the best chunk first; position keeps document order.
+RAG_PROMPT_TOKENS = int(os.getenv("RAG_PROMPT_TOKENS", 1024))
+RAG_PROMPT_TOKENIZER = os.getenv("RAG_PROMPT_TOKENIZER", "")
+RAG_PROMPT_ORDER = os.getenv("RAG_PROMPT_ORDER", "score")
+
+# Batching consumer mode: pull up to RAG_BATCH_SIZE messages or wait up to
+# RAG_BATCH_WAIT_MS for them, then embed and search them together.
+# A batch size of 1 keeps the one-message-at-a-time consumer.
+RAG_BATCH_SIZE = int(os.getenv("RAG_BATCH_SIZE", 1))
+RAG_BATCH_WAIT_MS = int(os.getenv("RAG_BATCH_WAIT_MS", 50))
+
+# Query-result cache in front of ChromaDB. Set RAG_CACHE_SIZE=0 to disable it.
+RAG_CACHE_SIZE = int(os.getenv("RAG_CACHE_SIZE", 1024))
+RAG_CACHE_TTL_S = float(os.getenv("RAG_CACHE_TTL_S", 3600))
+# Cosine similarity at which a different query reuses a cached context. 0 (the
+# default) turns this semantic level off until a threshold has been validated
+# against the embedding model; queries with numbers or section references never use it.
+RAG_CACHE_SIMILARITY = float(os.getenv("RAG_CACHE_SIMILARITY", 0))
+
+# Number of unacknowledged messages RabbitMQ may push to this consumer at once
+QUEUE_PREFETCH = int(os.getenv("QUEUE_PREFETCH", 1))
+
+# QUEUE_MODE=async runs a native async handler under the asyncio QueueManager
+# with QUEUE_CONCURRENCY messages in flight instead of the blocking consumer.
+QUEUE_MODE = os.getenv("QUEUE_MODE", "blocking")
+QUEUE_CONCURRENCY = int(os.getenv("QUEUE_CONCURRENCY", 8))
+
+log = get_logger("rag_core")
+
+# The retriever is created once per process so the embedding model and the
+# ChromaDB collection handle (or the in-process index) stay warm between messages.
+retriever = None
+
+def get_backend() -> SearchBackend:
+    """
+    Returns the search backend selected by RAG_BACKEND.
+    """
+    if RAG_BACKEND == "numpy":
+        options = {"n_probe": RAG_INDEX_NPROBE} if RAG_INDEX_ANN == "ivf" else {}
+        return NumpyBackend(RAG_INDEX_DIR, ann=RAG_INDEX_ANN, **options)
+    if RAG_BACKEND != "chroma":
+        print(f"Error: Unknown RAG_BACKEND '{RAG_BACKEND}'; expected 'chroma' or 'numpy'.", file=sys.stderr)
+        sys.exit(1)
+    return ChromaBackend(CHROMA_HOST, CHROMA_PORT, chroma_path=CHROMA_PATH)
+
+def get_retriever() -> Retriever:
+    """
+    Returns the process-wide Retriever, creating it on first use.
+    """
+    global retriever
+    if retriever is None:
+        cache = None
+        if RAG_CACHE_SIZE > 0:
+            cache = QueryCache(max_entries=RAG_CACHE_SIZE, ttl_seconds=RAG_CACHE_TTL_S,
+                               similarity_threshold=RAG_CACHE_SIMILARITY or None)
+        backend = get_backend()
+        hybrid = None
+        if RAG_BM25_PATH:
+            reranker = None
+            if RAG_RERANK_MODEL:
+                min_score = float(RAG_RERANK_MIN_SCORE) if RAG_RERANK_MIN_SCORE else None
+                reranker = CrossEncoderReranker(RAG_RERANK_MODEL, min_score=min_score)
+            hybrid = HybridSearcher(backend, RAG_BM25_PATH, n_candidates=RAG_CANDIDATES, reranker=reranker)
+        prompt_builder = PromptBuilder(max_tokens=RAG_PROMPT_TOKENS, order=RAG_PROMPT_ORDER,
+                                       count_tokens=make_token_counter(RAG_PROMPT_TOKENIZER))
+        retriever = Retriever(n_results=RAG_TOP_K, cache=cache, backend=backend, hybrid=hybrid,
+                              prompt_builder=prompt_builder, encoder=RAG_ENCODER, onnx_dir=RAG_ONNX_DIR)
+    return retriever
+
+def run_rag_query(user_query: str) -> Tuple[str, Dict[str, Any]]:
     """
     Performs a RAG query by:
     1. Embedding the user's query.
     2. Searching a ChromaDB collection for relevant documents.
-    3. Constructing a final prompt with the retrieved context.
+    3. Constructing a final prompt with the retrieved context, fit to the token budget.
 
     Args:
         user_query (str): The PII-filtered query from the user.
 
     Returns:
-        str: A fully-formed prompt containing the context and the user's query.
+        Tuple[str, Dict[str, Any]]: A fully-formed prompt containing the context
+        and the user's query, and its token accounting, chunk IDs and index version.
     """
     try:
-        # Step 1: Initialize the ChromaDB client
-        client = chromadb.HttpClient(host=CHROMA_HOST, port=CHROMA_PORT)
-        
-        # Check if the collection exists before attempting to get it
-        collection_name = "document_embeddings"
-        try:
-            collection = client.get_collection(name=collection_name)
-        except Exception:
-            print(f"Collection '{collection_name}' not found. Please ensure your documents are ingested.", file=sys.stderr)
-            return "No relevant documents found in the knowledge base."
-
-        # Step 2: Load the same embedding model used for ingestion
-        model = SentenceTransformer('all-MiniLM-L6-v2')
-        query_embedding = model.encode(user_query, convert_to_tensor=False).tolist()
-
-        # Step 3: Perform a semantic search to find the most relevant documents
-        search_results = collection.query(
-            query_embeddings=[query_embedding],
-            n_results=3,
-        )
-
-        # Step 4: Extract the retrieved documents
-        retrieved_documents = search_results.get('documents', [])
-        
-        if not retrieved_documents or not retrieved_documents[0]:
-            context = "No relevant documents found in the knowledge base."
-        else:
-            context = " ".join(retrieved_documents[0])
-
-        # Step 5: Construct the final prompt for the LLM
-        prompt = (
-            "Given the following context, please answer the question. "
-            "If the answer is not present in the context, please state that "
-            "and do not try to make up an answer.\n\n"
-            f"Context:\n{context}\n\n"
-            f"Question:\n{user_query}\n"
-        )
-        
-        return prompt
-
+        prompts, prompt_stats = get_retriever().retrieve_prompts([user_query])
+        return prompts[0], prompt_stats[0]
     except Exception as e:
         print(f"An unexpected error occurred in the RAG core: {e}", file=sys.stderr)
-        return "" # Return an empty string or handle error gracefully
+        return "", {} # Return an empty string or handle error gracefully
+
+def add_context_fields(envelope: Dict[str, Any], prompt_stats: Dict[str, Any]):
+    """
+    Records the prompt's token accounting and the identity of its context
+    (retrieved chunk IDs and index version, which the LLM worker's answer
+    cache keys on) in the envelope.
+    """
+    envelope["prompt_tokens"] = prompt_stats["prompt_tokens"]
+    envelope["prompt_tokens_saved"] = prompt_stats["tokens_saved"]
+    envelope["context_ids"] = prompt_stats["chunk_ids"]
+    envelope["index_version"] = prompt_stats["index_version"]
 
 def rag_core_callback(ch, method, properties, body):
     """
     Callback function to handle incoming messages from the queue.
-    It performs the RAG query and publishes the final prompt.
+    It performs the RAG query and publishes the final prompt. Requests whose
+    deadline has passed are dropped before the search.
     """
+    # Decode the message envelope; its text has already been PII-filtered
+    envelope = parse_envelope(body)
+    if expired(envelope, 'rag_core_queue'):
+        return
+    pii_filtered_query = envelope["text"]
+    log.debug("received", correlation_id=envelope["correlation_id"], chars=len(pii_filtered_query))
+
+    # Run the RAG query with the PII-filtered text
+    final_prompt, prompt_stats = run_rag_query(pii_filtered_query)
+    if not final_prompt:
+        raise RuntimeError("RAG query failed; leaving the message for a retry.")
+    log.debug("prompt built", correlation_id=envelope["correlation_id"], prompt_tokens=prompt_stats["prompt_tokens"],
+              chunks=prompt_stats["chunks_used"])
+    envelope["prompt"] = final_prompt
+    add_context_fields(envelope, prompt_stats)
+    stamp(envelope, "rag_core")
+
+    # Publish the final prompt to the next queue in the pipeline (e.g., an LLM queue).
+    # The QueueManager acks the message once this returns, and rejects it if we raise;
+    # if the next queue is full the client is told the service is busy instead.
     try:
-        # Decode the message body from bytes to a string
-        pii_filtered_query = body.decode('utf-8')
-        print(f" [x] Received from 'rag_core_queue': {pii_filtered_query}")
-
-        # Run the RAG query with the PII-filtered text
-        final_prompt = run_rag_query(pii_filtered_query)
-        print(f" [x] Final prompt for LLM: {final_prompt}")
-        
-        # Publish the final prompt to the next queue in the pipeline (e.g., an LLM queue)
-        # Note: You can optionally add a header to identify the message type or sender
-        queue_manager.send_message(queue_name='llm_queue', message=final_prompt)
+        queue_manager.send_message(queue_name='llm_queue', message=dumps(envelope), priority=message_priority(envelope))
+    except QueueFullError as e:
+        reply_busy(queue_manager, envelope, "rag_core", e.queue_name)
 
-    except Exception as e:
-        print(f"Error processing message: {e}", file=sys.stderr)
-    
-    # Acknowledge the message so it's removed from the queue
-    ch.basic_ack(delivery_tag=method.delivery_tag)
+def rag_core_batch_callback(ch, deliveries):
+    """
+    Batch callback used when RAG_BATCH_SIZE > 1. Runs one batched encode and
+    one multi-query search for every message in the batch, then publishes
+    the prompts to the LLM queue, high-priority lane first and otherwise in
+    arrival order. Requests whose deadline has passed are left out, and those
+    the full LLM queue refuses are answered busy.
+    """
+    envelopes = [parse_envelope(body) for _, _, body in deliveries]
+    envelopes = [envelope for envelope in envelopes if not expired(envelope, 'rag_core_queue')]
+    if not envelopes:
+        return
+    queries = [envelope["text"] for envelope in envelopes]
+    log.debug("received batch", messages=len(queries))
+
+    final_prompts, prompt_stats = get_retriever().retrieve_prompts(queries)
+    for envelope, final_prompt, stats in zip(envelopes, final_prompts, prompt_stats):
+        envelope["prompt"] = final_prompt
+        add_context_fields(envelope, stats)
+        stamp(envelope, "rag_core")
+
+    # One publish per lane; the whole batch is acked once this returns. Refused
+    # messages are answered one by one rather than failing the batch, which
+    # would publish the lanes that did go through a second time on redelivery.
+    for priority in sorted({message_priority(envelope) for envelope in envelopes}, reverse=True):
+        lane = [envelope for envelope in envelopes if message_priority(envelope) == priority]
+        try:
+            queue_manager.send_messages(queue_name='llm_queue', messages=[dumps(envelope) for envelope in lane],
+                                        priority=priority)
+        except QueueFullError as e:
+            for index in e.unsent:
+                reply_busy(queue_manager, lane[index], "rag_core", e.queue_name)
+
+def make_async_handler(manager):
+    """
+    Returns the handler used when QUEUE_MODE=async. The encode and the
+    ChromaDB search are awaited on the manager's thread pool and the prompt is
+    published with an awaited confirm, so one event loop keeps
+    QUEUE_CONCURRENCY queries in flight. Errors propagate so the manager
+    rejects the message.
+    """
+    async def rag_core_handler(message):
+        envelope = parse_envelope(message.body)
+        if expired(envelope, 'rag_core_queue'):
+            return
+        log.debug("received", correlation_id=envelope["correlation_id"], chars=len(envelope["text"]))
+        final_prompts, prompt_stats = await get_retriever().retrieve_prompts_async([envelope["text"]],
+                                                                                   manager.run_blocking)
+        envelope["prompt"] = final_prompts[0]
+        add_context_fields(envelope, prompt_stats[0])
+        stamp(envelope, "rag_core")
+        try:
+            await manager.forward('llm_queue', dumps(envelope), priority=message_priority(envelope))
+        except QueueFullError as e:
+            if mark_busy(envelope, "rag_core", e.queue_name):
+                await manager.send_reply(envelope["reply_to"], dumps(envelope), envelope["correlation_id"])
+
+    return rag_core_handler
+
+def bind_queue_manager(publisher):
+    """
+    Installs the publisher the callback uses to forward messages.
+    """
+    global queue_manager
+    queue_manager = publisher
 
 if __name__ == "__main__":
+    # Load the model and connect to ChromaDB before taking any messages
+    try:
+        get_retriever()
+    except Exception as e:
+        print(f"Failed to initialize the retriever: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    if QUEUE_MODE == "async":
+        # Keep QUEUE_CONCURRENCY messages in flight on one event loop
+        try:
+            asyncio.run(serve_handler('rag_core_queue', make_async_handler, QUEUE_CONCURRENCY))
+        except KeyboardInterrupt:
+            print('Interrupted. Exiting...')
+        sys.exit(0)
+
     # Initialize the QueueManager
     try:
-        queue_manager = QueueManager()
+        queue_manager = QueueManager(prefetch_count=QUEUE_PREFETCH)
     except Exception as e:
         print(f"Failed to initialize QueueManager: {e}", file=sys.stderr)
         sys.exit(1)
 
     try:
         # Start listening for messages on the 'rag_core_queue'
-        queue_manager.start_listening(queue_name='rag_core_queue', callback=rag_core_callback)
+        if RAG_BATCH_SIZE > 1:
+            queue_manager.start_batch_listening(queue_name='rag_core_queue', batch_callback=rag_core_batch_callback,
+                                                batch_size=RAG_BATCH_SIZE, max_wait_ms=RAG_BATCH_WAIT_MS)
+        else:
+            queue_manager.start_listening(queue_name='rag_core_queue', callback=rag_core_callback)
     except KeyboardInterrupt:
         print('Interrupted. Exiting...')
     finally:
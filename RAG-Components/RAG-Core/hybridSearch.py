@@ -0,0 +1,171 @@
+import os
+import sys
+import time
+from typing import Any, Dict, List, Optional, Sequence
+from shared.bm25Index import BM25Index
+from searchBackends import SearchBackend
+
+DEFAULT_RERANK_MODEL = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[str]], k: int = 60) -> List[str]:
+    """
+    Merges several rankings of chunk IDs into one. Each ID scores
+    sum(1 / (k + rank)) over the rankings it appears in, so chunks that both
+    retrievers rank highly come first without calibrating BM25 scores against
+    cosine similarities.
+    """
+    fused: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, chunk_id in enumerate(ranking, start=1):
+            fused[chunk_id] = fused.get(chunk_id, 0.0) + 1.0 / (k + rank)
+    return sorted(fused, key=fused.get, reverse=True)
+
+
+class CrossEncoderReranker:
+    """
+    Scores (query, chunk) pairs jointly with a small cross-encoder, which
+    orders the fused candidates far better than either retriever's score.
+    """
+    def __init__(self, model_name: str = DEFAULT_RERANK_MODEL, min_score: Optional[float] = None):
+        """
+        Args:
+            model_name (str): A sentence-transformers CrossEncoder model.
+            min_score (float): Candidates scoring below this are dropped (the best one is always kept).
+        """
+        from sentence_transformers import CrossEncoder
+        start = time.perf_counter()
+        self.model = CrossEncoder(model_name)
+        self.min_score = min_score
+        print(f" [i] Loaded reranker '{model_name}' in {(time.perf_counter() - start) * 1000:.0f} ms", file=sys.stderr)
+
+    def rerank(self, queries: List[str], candidates: List[List[str]], n_results: int) -> List[List[int]]:
+        """
+        Scores every candidate of every query in one batched call.
+
+        Returns:
+            List[List[int]]: For each query, the positions of its kept candidates, best first.
+        """
+        pairs = [(query, text) for query, texts in zip(queries, candidates) for text in texts]
+        scores = list(self.model.predict(pairs)) if pairs else []
+        kept = []
+        for texts in candidates:
+            query_scores, scores = scores[:len(texts)], scores[len(texts):]
+            order = sorted(range(len(texts)), key=lambda i: query_scores[i], reverse=True)[:n_results]
+            if self.min_score is not None:
+                order = order[:1] + [i for i in order[1:] if query_scores[i] >= self.min_score]
+            kept.append(order)
+        return kept
+
+
+class HybridSearcher:
+    """
+    Hybrid retrieval: the dense backend and a BM25 index each return
+    `n_candidates` chunks, the two rankings are merged with reciprocal-rank
+    fusion, and an optional cross-encoder reranks the fused list before it
+    is cut to the final top-k. Dense search finds paraphrases; BM25 finds
+    section numbers and exact legal terms, so a small top-k is enough.
+    """
+    def __init__(self, backend: SearchBackend, sparse_path: str, n_candidates: int = 20, rrf_k: int = 60,
+                 reranker: Optional[CrossEncoderReranker] = None, version_check_seconds: float = 5.0):
+        """
+        Args:
+            backend (SearchBackend): The dense search backend.
+            sparse_path (str): The BM25 index (.npz) written at ingestion.
+            n_candidates (int): Chunks taken from each retriever before fusion.
+            rrf_k (int): Reciprocal-rank fusion constant.
+            reranker (CrossEncoderReranker): Optional reranking stage.
+            version_check_seconds (float): How often to check the BM25 index for a new version.
+        """
+        self.backend = backend
+        self.sparse_path = sparse_path
+        self.n_candidates = n_candidates
+        self.rrf_k = rrf_k
+        self.reranker = reranker
+        self.version_check_seconds = version_check_seconds
+        self.sparse: Optional[BM25Index] = None
+        self._sparse_mtime = None
+        self._version_checked_at = 0.0
+        self.last_timings: Dict[str, float] = {}
+
+    def connect(self) -> bool:
+        """
+        Connects the dense backend and loads the BM25 index. Without the BM25
+        index, search falls back to dense results only.
+        """
+        connected = self.backend.connect()
+        self.load_sparse()
+        return connected
+
+    def load_sparse(self) -> bool:
+        try:
+            mtime = os.stat(self.sparse_path).st_mtime
+            self.sparse = BM25Index.load(self.sparse_path)
+            self._sparse_mtime = mtime
+            print(f" [i] Loaded BM25 index of {len(self.sparse.ids)} chunks and {len(self.sparse.vocabulary)} terms.",
+                  file=sys.stderr)
+            return True
+        except (OSError, ValueError, KeyError) as e:
+            print(f"BM25 index '{self.sparse_path}' not available ({e}); using dense search only.", file=sys.stderr)
+            return False
+
+    def version(self) -> Any:
+        """
+        Returns the version stamps of both indexes, reloading the BM25 index
+        first if it has been rewritten.
+        """
+        now = time.monotonic()
+        if now - self._version_checked_at >= self.version_check_seconds:
+            self._version_checked_at = now
+            try:
+                if os.stat(self.sparse_path).st_mtime != self._sparse_mtime:
+                    self.load_sparse()
+            except OSError:
+                pass
+        return (self.backend.version(), self.sparse.version if self.sparse is not None else None)
+
+    def query(self, query_texts: List[str], query_embeddings: List[List[float]], n_results: int) -> Dict[str, Any]:
+        """
+        Runs both retrievers, fuses, optionally reranks and returns the top
+        n_results per query in ChromaDB's result shape ("ids", "documents" and
+        "metadatas"; chunks found by BM25 alone have no metadata).
+        Per-stage times are recorded in `last_timings`.
+        """
+        timings = {"dense_ms": 0.0, "sparse_ms": 0.0, "fuse_ms": 0.0, "rerank_ms": 0.0}
+        start = time.perf_counter()
+        dense = self.backend.query(query_embeddings, self.n_candidates)
+        timings["dense_ms"] = (time.perf_counter() - start) * 1000
+
+        texts: Dict[str, str] = {}
+        metadatas: Dict[str, Any] = {}
+        dense_ids = dense.get("ids") or [[] for _ in query_texts]
+        for row_ids, row_documents in zip(dense_ids, dense.get("documents") or []):
+            texts.update(zip(row_ids, row_documents))
+        for row_ids, row_metadatas in zip(dense_ids, dense.get("metadatas") or []):
+            metadatas.update(zip(row_ids, row_metadatas or []))
+
+        start = time.perf_counter()
+        sparse_ids: List[List[str]] = [[] for _ in query_texts]
+        sparse = self.sparse
+        if sparse is not None:
+            for i, query in enumerate(query_texts):
+                hits = sparse.search(query, self.n_candidates)
+                sparse_ids[i] = [sparse.ids[row] for row, _ in hits]
+                texts.update((sparse.ids[row], sparse.texts[row]) for row, _ in hits)
+        timings["sparse_ms"] = (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        fused = [reciprocal_rank_fusion([d, s], self.rrf_k) for d, s in zip(dense_ids, sparse_ids)]
+        timings["fuse_ms"] = (time.perf_counter() - start) * 1000
+
+        if self.reranker is not None:
+            start = time.perf_counter()
+            candidates = [ids[:self.n_candidates] for ids in fused]
+            kept = self.reranker.rerank(query_texts, [[texts[i] for i in ids] for ids in candidates], n_results)
+            fused = [[ids[position] for position in order] for ids, order in zip(candidates, kept)]
+            timings["rerank_ms"] = (time.perf_counter() - start) * 1000
+
+        ids = [row[:n_results] for row in fused]
+        self.last_timings = timings
+        return {"ids": ids, "documents": [[texts[i] for i in row] for row in ids],
+                "metadatas": [[metadatas.get(i) for i in row] for row in ids]}
@@ -0,0 +1,219 @@
+import re
+import sys
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+NO_CONTEXT_MESSAGE = "No relevant documents found in the knowledge base."
+TOKEN = re.compile(r"\w+|[^\w\s]")
+# Chunks without offsets are merged when one ends with at least this many
+# characters the next starts with (the fixed chunker overlaps by 50)
+MIN_TEXT_OVERLAP = 20
+MAX_TEXT_OVERLAP = 200
+# A chunk that does not fit the remaining budget is cut down rather than
+# dropped if at least this many tokens of it fit
+MIN_CHUNK_TOKENS = 32
+CONTEXT_SEPARATOR = "\n\n"
+
+
+class ContextChunk(NamedTuple):
+    text: str
+    rank: int                        # 0 for the best match of the search
+    source: Optional[str] = None     # document the chunk came from, if ingested with metadata
+    char_start: Optional[int] = None
+    char_end: Optional[int] = None
+    chunk_id: Optional[str] = None
+
+
+def build_prompt(context: str, user_query: str) -> str:
+    """
+    Constructs the final prompt for the LLM from the retrieved context.
+
+    Args:
+        context (str): The retrieved document text.
+        user_query (str): The PII-filtered query from the user.
+
+    Returns:
+        str: A fully-formed prompt containing the context and the user's query.
+    """
+    return (
+        "Given the following context, please answer the question. "
+        "If the answer is not present in the context, please state that "
+        "and do not try to make up an answer.\n\n"
+        f"Context:\n{context}\n\n"
+        f"Question:\n{user_query}\n"
+    )
+
+
+def approximate_token_count(text: str) -> int:
+    """
+    Counts words and punctuation marks, close to a BPE token count for English prose.
+    """
+    return len(TOKEN.findall(text))
+
+
+def make_token_counter(tokenizer_name: str = "") -> Callable[[str], int]:
+    """
+    Returns a function that counts tokens with the LLM's own tokenizer, or
+    the approximate count if no tokenizer is named or it cannot be loaded.
+
+    Args:
+        tokenizer_name (str): A Hugging Face tokenizer matching the Ollama model,
+            e.g. 'meta-llama/Meta-Llama-3-8B-Instruct'.
+    """
+    if not tokenizer_name:
+        return approximate_token_count
+    try:
+        from transformers import AutoTokenizer
+        tokenizer = AutoTokenizer.from_pretrained(tokenizer_name)
+    except Exception as e:
+        print(f" [!] Tokenizer '{tokenizer_name}' not available ({e}); approximating token counts.", file=sys.stderr)
+        return approximate_token_count
+    return lambda text: len(tokenizer(text, add_special_tokens=False)["input_ids"])
+
+
+def context_chunks(result: Dict[str, Any], row: int) -> List[ContextChunk]:
+    """
+    Returns the chunks of one query of a search result, in ChromaDB's shape,
+    with the offsets recorded at ingestion when the metadata has them.
+    """
+    document_rows = result.get("documents") or []
+    metadata_rows = result.get("metadatas") or []
+    id_rows = result.get("ids") or []
+    documents = document_rows[row] if row < len(document_rows) else []
+    metadatas = (metadata_rows[row] if row < len(metadata_rows) else None) or []
+    ids = id_rows[row] if row < len(id_rows) else []
+    chunks = []
+    for rank, text in enumerate(documents):
+        metadata = (metadatas[rank] if rank < len(metadatas) else None) or {}
+        chunk_id = ids[rank] if rank < len(ids) else None
+        start, end = metadata.get("char_start"), metadata.get("char_end")
+        if start is None or end is None:
+            chunks.append(ContextChunk(text, rank, chunk_id=chunk_id))
+        else:
+            chunks.append(ContextChunk(text, rank, metadata.get("source"), int(start), int(end), chunk_id))
+    return chunks
+
+
+def _text_overlap(first: str, second: str) -> int:
+    """
+    Returns the length of the longest suffix of `first` that `second` starts with.
+    """
+    for length in range(min(len(first), len(second), MAX_TEXT_OVERLAP), MIN_TEXT_OVERLAP - 1, -1):
+        if first.endswith(second[:length]):
+            return length
+    return 0
+
+
+def merge_chunks(chunks: List[ContextChunk]) -> List[ContextChunk]:
+    """
+    Merges overlapping and adjacent chunks and drops repeated text.
+
+    Chunks with offsets are merged by position within their document.
+    Chunks without offsets (ingested as plain strings) are merged when one
+    ends with text the next starts with, and dropped when another chunk
+    already contains them. A merged chunk keeps the best rank of its parts.
+    """
+    merged: List[ContextChunk] = []
+    positioned = sorted((c for c in chunks if c.char_start is not None), key=lambda c: (c.source or "", c.char_start))
+    for chunk in positioned:
+        last = merged[-1] if merged else None
+        if last is not None and last.source == chunk.source and chunk.char_start <= last.char_end:
+            if chunk.char_end > last.char_end:
+                text = last.text + chunk.text[last.char_end - chunk.char_start:]
+                merged[-1] = last._replace(text=text, char_end=chunk.char_end, rank=min(last.rank, chunk.rank))
+            else:
+                merged[-1] = last._replace(rank=min(last.rank, chunk.rank))
+        else:
+            merged.append(chunk)
+
+    loose: List[ContextChunk] = []
+    for chunk in sorted((c for c in chunks if c.char_start is None), key=lambda c: c.rank):
+        normalized = " ".join(chunk.text.split())
+        if any(normalized in " ".join(other.text.split()) for other in merged + loose):
+            continue
+        loose.append(chunk)
+    joined = True
+    while joined:
+        joined = False
+        for i, first in enumerate(loose):
+            for j, second in enumerate(loose):
+                overlap = _text_overlap(first.text, second.text) if i != j else 0
+                if overlap:
+                    loose[i] = first._replace(text=first.text + second.text[overlap:], rank=min(first.rank, second.rank))
+                    del loose[j]
+                    joined = True
+                    break
+            if joined:
+                break
+    return merged + loose
+
+
+def _truncate(text: str, count_tokens: Callable[[str], int], budget: int) -> str:
+    """
+    Returns the longest word-boundary prefix of the text, ending at a sentence
+    end if one is in the second half, that fits the token budget.
+    """
+    words = text.split(" ")
+    low, high = 0, len(words)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if count_tokens(" ".join(words[:middle])) <= budget:
+            low = middle
+        else:
+            high = middle - 1
+    prefix = " ".join(words[:low])
+    sentence_end = max(prefix.rfind(". "), prefix.rfind("; "))
+    return prefix[:sentence_end + 1] if sentence_end > len(prefix) // 2 else prefix
+
+
+class PromptBuilder:
+    """
+    Assembles the prompt from the retrieved chunks: merges overlapping
+    chunks, drops repeated text, fits the context to a token budget (best
+    chunks first, the last one cut down to fit) and orders it by search
+    rank or by position in the documents.
+    """
+    def __init__(self, max_tokens: int = 0, order: str = "score",
+                 count_tokens: Optional[Callable[[str], int]] = None, min_chunk_tokens: int = MIN_CHUNK_TOKENS):
+        """
+        Args:
+            max_tokens (int): Budget for the whole prompt; 0 for no limit.
+            order (str): "score" puts the best chunk first, "position" keeps document order.
+            count_tokens (Callable[[str], int]): Token counter; see make_token_counter().
+            min_chunk_tokens (int): Smallest part of a chunk worth keeping when cutting it to fit.
+        """
+        if order not in ("score", "position"):
+            raise ValueError(f"Unknown context order '{order}'; expected 'score' or 'position'.")
+        self.max_tokens = max_tokens
+        self.order = order
+        self.count_tokens = count_tokens or approximate_token_count
+        self.min_chunk_tokens = min_chunk_tokens
+
+    def build(self, user_query: str, chunks: List[ContextChunk]) -> Tuple[str, Dict[str, int]]:
+        """
+        Returns the prompt and its token accounting: prompt_tokens, and
+        tokens_saved compared with joining every retrieved chunk as is.
+        """
+        naive_context = " ".join(chunk.text for chunk in chunks) if chunks else NO_CONTEXT_MESSAGE
+        naive_tokens = self.count_tokens(build_prompt(naive_context, user_query))
+
+        selected: List[ContextChunk] = []
+        budget = self.max_tokens - self.count_tokens(build_prompt("", user_query)) if self.max_tokens else None
+        for chunk in sorted(merge_chunks(chunks), key=lambda c: c.rank):
+            if budget is None:
+                selected.append(chunk)
+                continue
+            tokens = self.count_tokens(chunk.text) + (1 if selected else 0)
+            if tokens <= budget:
+                selected.append(chunk)
+                budget -= tokens
+            elif budget >= self.min_chunk_tokens:
+                selected.append(chunk._replace(text=_truncate(chunk.text, self.count_tokens, budget - 1)))
+                budget = 0
+        if self.order == "position":
+            selected.sort(key=lambda c: (c.char_start is None, c.source or "", c.char_start or 0, c.rank))
+
+        context = CONTEXT_SEPARATOR.join(chunk.text for chunk in selected) if selected else NO_CONTEXT_MESSAGE
+        prompt = build_prompt(context, user_query)
+        prompt_tokens = self.count_tokens(prompt)
+        return prompt, {"chunks_retrieved": len(chunks), "chunks_used": len(selected),
+                        "prompt_tokens": prompt_tokens, "tokens_saved": naive_tokens - prompt_tokens}
@@ -0,0 +1,202 @@
+import heapq
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional
+import numpy as np
+from promptBuilder import ContextChunk
+
+
+def normalize_query(text: str) -> str:
+    """
+    Normalizes a query for exact-match lookups: lower-cased, punctuation
+    stripped and whitespace collapsed.
+    """
+    text = re.sub(r"[^\w\s\[\]]", " ", text.lower())
+    return re.sub(r"\s+", " ", text).strip()
+
+
+# Queries naming a specific provision: their embeddings barely change with the
+# number ("Section 2(9)" vs "Section 2(7)"), so they are only cached exactly
+SPECIFIC_REFERENCE = re.compile(r"\d|§|\b(?:sub-?)?(?:sections?|sec|clauses?|articles?)\b", re.IGNORECASE)
+
+
+def exact_only(query: str) -> bool:
+    """
+    Returns whether a query is kept out of the semantic level because it
+    contains digits or a section reference.
+    """
+    return SPECIFIC_REFERENCE.search(query) is not None
+
+
+class QueryCache:
+    """
+    A two-level cache of retrieval results placed in front of ChromaDB.
+
+    Level 1 is an exact-match LRU keyed on the normalized query text and skips
+    both the encode and the search. Level 2, enabled by giving a
+    `similarity_threshold`, matches on the cosine similarity of the query
+    embedding and skips the search; its unit embeddings live in rows of one
+    matrix allocated on first use, so a lookup is a single product over the
+    rows in use with no copying. A semantic hit serves another query's
+    context, so queries with digits or section references (see exact_only)
+    never use level 2. Both levels are size-bounded, expire entries after
+    `ttl_seconds`, and are cleared whenever the collection version stamp changes.
+    """
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 3600,
+                 similarity_threshold: Optional[float] = None, max_semantic_entries: Optional[int] = None):
+        """
+        Args:
+            max_entries (int): Capacity of the exact-match level.
+            ttl_seconds (float): Lifetime of an entry in either level.
+            similarity_threshold (float): Minimum cosine similarity for a semantic hit;
+                None (the default) disables the semantic level.
+            max_semantic_entries (int): Capacity of the semantic level (defaults to max_entries).
+        """
+        self.max_entries = max_entries
+        self.max_semantic_entries = max_semantic_entries or max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self.version = None
+        # Stages running under the async QueueManager call the cache from several threads
+        self._lock = threading.RLock()
+        self._exact: "OrderedDict[str, tuple]" = OrderedDict()
+        # Semantic level: key -> matrix row, in LRU order, plus per-row state
+        self._semantic: "OrderedDict[str, int]" = OrderedDict()
+        self._matrix: Optional[np.ndarray] = None
+        capacity = self.max_semantic_entries
+        self._row_keys: List[Optional[str]] = [None] * capacity
+        self._row_documents: List[Optional[List[ContextChunk]]] = [None] * capacity
+        self._row_stored_at = np.zeros(capacity)
+        self._row_used = np.zeros(capacity, dtype=bool)
+        self._free_rows: List[int] = list(range(capacity))
+        # Rows at or past this index are unused, so lookups only scan the rows before it
+        self._rows_end = 0
+        self.stats: Dict[str, int] = {
+            "exact_hits": 0, "semantic_hits": 0, "misses": 0, "evictions": 0, "invalidations": 0,
+        }
+
+    def check_version(self, version: Any):
+        """
+        Clears the cache if the collection version stamp differs from the one
+        the cached entries were computed against.
+        """
+        with self._lock:
+            if version != self.version:
+                if self._exact or self._semantic:
+                    self.stats["invalidations"] += 1
+                self.clear()
+                self.version = version
+
+    def clear(self):
+        with self._lock:
+            self._exact.clear()
+            self._clear_semantic()
+
+    def _clear_semantic(self):
+        # Keeps the matrix allocated; unused rows are masked out of lookups
+        self._semantic.clear()
+        self._row_keys = [None] * self.max_semantic_entries
+        self._row_documents = [None] * self.max_semantic_entries
+        self._row_used[:] = False
+        self._free_rows = list(range(self.max_semantic_entries))
+        self._rows_end = 0
+
+    def _expired(self, stored_at: float) -> bool:
+        return time.monotonic() - stored_at > self.ttl_seconds
+
+    def get_exact(self, query: str) -> Optional[List[ContextChunk]]:
+        """
+        Returns the cached documents for a query with the same normalized text, if any.
+        """
+        with self._lock:
+            key = normalize_query(query)
+            entry = self._exact.get(key)
+            if entry is None:
+                return None
+            documents, stored_at = entry
+            if self._expired(stored_at):
+                del self._exact[key]
+                return None
+            self._exact.move_to_end(key)
+            self.stats["exact_hits"] += 1
+            return documents
+
+    @property
+    def semantic(self) -> bool:
+        return self.similarity_threshold is not None
+
+    def get_similar(self, query: str, embedding: List[float]) -> Optional[List[ContextChunk]]:
+        """
+        Returns the cached documents of the most similar earlier query if its
+        cosine similarity is above the threshold, otherwise counts a miss.
+        """
+        with self._lock:
+            end = self._rows_end
+            if (self._semantic and len(embedding) == self._matrix.shape[1]
+                    and not exact_only(query)):
+                expired = self._row_used[:end] & (time.monotonic() - self._row_stored_at[:end] > self.ttl_seconds)
+                for row in np.flatnonzero(expired):
+                    self._release_row(int(row))
+                scores = self._matrix[:end] @ self._unit(embedding)
+                scores[~self._row_used[:end]] = -np.inf
+                best = int(np.argmax(scores))
+                if scores[best] >= self.similarity_threshold:
+                    self._semantic.move_to_end(self._row_keys[best])
+                    self.stats["semantic_hits"] += 1
+                    return self._row_documents[best]
+            self.stats["misses"] += 1
+            return None
+
+    def put(self, query: str, embedding: Optional[List[float]], documents: List[ContextChunk]):
+        """
+        Stores the retrieved documents for a query in the exact level and,
+        if it is enabled and the query may use it, the semantic level.
+        """
+        with self._lock:
+            key = normalize_query(query)
+            now = time.monotonic()
+            self._exact[key] = (documents, now)
+            self._exact.move_to_end(key)
+            self._evict(self._exact, self.max_entries)
+            if embedding is None or not self.semantic or exact_only(query):
+                return
+            if self._matrix is None or self._matrix.shape[1] != len(embedding):
+                # First use, or a different embedding model: size the matrix to it
+                self._matrix = np.zeros((self.max_semantic_entries, len(embedding)), dtype=np.float32)
+                self._clear_semantic()
+            row = self._semantic.get(key)
+            if row is None:
+                if not self._free_rows:
+                    self._release_row(self._semantic[next(iter(self._semantic))])
+                    self.stats["evictions"] += 1
+                row = heapq.heappop(self._free_rows)
+                self._semantic[key] = row
+                self._row_keys[row] = key
+                self._row_used[row] = True
+                self._rows_end = max(self._rows_end, row + 1)
+            self._semantic.move_to_end(key)
+            self._matrix[row] = self._unit(embedding)
+            self._row_documents[row] = documents
+            self._row_stored_at[row] = now
+
+    def _evict(self, level: OrderedDict, capacity: int):
+        while len(level) > capacity:
+            level.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def _release_row(self, row: int):
+        del self._semantic[self._row_keys[row]]
+        self._row_keys[row] = None
+        self._row_documents[row] = None
+        self._row_used[row] = False
+        heapq.heappush(self._free_rows, row)
+        while self._rows_end and not self._row_used[self._rows_end - 1]:
+            self._rows_end -= 1
+
+    @staticmethod
+    def _unit(embedding) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
@@ -0,0 +1,233 @@
+import sys
+import time
+from typing import Any, Awaitable, Callable, Dict, Generator, List, Optional, Tuple
+from shared.instrumentation import count_cache, get_logger, observe_substage
+from shared.onnxEncoder import load_encoder
+from queryCache import QueryCache
+from searchBackends import ChromaBackend, DEFAULT_COLLECTION, SearchBackend
+from hybridSearch import HybridSearcher
+from promptBuilder import ContextChunk, PromptBuilder, context_chunks
+
+DEFAULT_MODEL = "all-MiniLM-L6-v2"
+
+log = get_logger("retriever")
+
+
+class Retriever:
+    """
+    A process-resident retriever that keeps the embedding model and the
+    search backend (a ChromaDB collection handle or an in-process index)
+    warm between queries.
+    """
+    def __init__(self, chroma_host: str = "", chroma_port: int = 8000,
+                 collection_name: str = DEFAULT_COLLECTION,
+                 model_name: str = DEFAULT_MODEL,
+                 n_results: int = 3,
+                 cache: Optional[QueryCache] = None,
+                 version_check_seconds: float = 5.0,
+                 backend: Optional[SearchBackend] = None,
+                 hybrid: Optional[HybridSearcher] = None,
+                 prompt_builder: Optional[PromptBuilder] = None,
+                 encoder: str = "sentence-transformers",
+                 onnx_dir: str = ""):
+        """
+        Loads the embedding model once and connects to the search backend.
+
+        Args:
+            chroma_host (str): Host name of the ChromaDB server, used when no backend is given.
+            chroma_port (int): Port of the ChromaDB server, used when no backend is given.
+            collection_name (str): The collection to search, used when no backend is given.
+            model_name (str): The sentence-transformer model used for ingestion.
+            n_results (int): The number of documents to retrieve per query.
+            cache (QueryCache): Optional cache of retrieval results.
+            version_check_seconds (float): How often to re-read the collection
+                version stamp that invalidates the cache.
+            backend (SearchBackend): Where to search; defaults to the ChromaDB server.
+            hybrid (HybridSearcher): Optional BM25 + dense search with fusion and
+                reranking, wrapping the same backend.
+            prompt_builder (PromptBuilder): Assembles the prompts; by default
+                merges overlapping chunks without a token budget.
+            encoder (str): "sentence-transformers", or "onnx" / "onnx-int8" to run
+                the ONNX export of the model in onnx_dir without torch.
+            onnx_dir (str): Directory written by chunking/exportOnnx.py.
+        """
+        self.backend = backend or ChromaBackend(chroma_host, chroma_port, collection_name,
+                                                version_check_seconds=version_check_seconds)
+        self.hybrid = hybrid
+        self.prompt_builder = prompt_builder or PromptBuilder()
+        self.n_results = n_results
+        self.last_timings: Dict[str, float] = {}
+        self.cache = cache
+
+        self.model = load_encoder(encoder, model_name, onnx_dir)
+
+        self.warm_up()
+        self.connect()
+
+    def warm_up(self):
+        """
+        Runs a throwaway encode so the first real query doesn't pay for lazy initialisation.
+        """
+        start = time.perf_counter()
+        self.model.encode("warm-up", convert_to_tensor=False)
+        print(f" [i] Warm-up encode took {(time.perf_counter() - start) * 1000:.0f} ms", file=sys.stderr)
+
+    def connect(self) -> bool:
+        """
+        (Re)connects the search backend.
+
+        Returns:
+            bool: True if there is data to search, False otherwise.
+        """
+        return self.hybrid.connect() if self.hybrid is not None else self.backend.connect()
+
+    def collection_version(self) -> Any:
+        """
+        Returns the backend's ingestion version stamp, which invalidates the cache when it changes.
+        """
+        return self.hybrid.version() if self.hybrid is not None else self.backend.version()
+
+    def encode(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embeds a list of query strings with the resident model.
+        """
+        return self.model.encode(texts, convert_to_tensor=False).tolist()
+
+    def search(self, query_embeddings: List[List[float]], query_texts: Optional[List[str]] = None) -> Dict[str, Any]:
+        """
+        Searches the backend for the nearest documents to each query, or runs
+        hybrid search when it is configured and the query texts are given.
+
+        Args:
+            query_embeddings (List[List[float]]): One embedding per query.
+            query_texts (List[str]): The queries themselves, for BM25 and reranking.
+
+        Returns:
+            Dict[str, Any]: The query result, in ChromaDB's shape.
+        """
+        if self.hybrid is not None and query_texts is not None:
+            return self.hybrid.query(query_texts, query_embeddings, self.n_results)
+        return self.backend.query(query_embeddings, self.n_results)
+
+    def retrieve_prompts(self, user_queries: List[str]) -> Tuple[List[str], List[Dict[str, Any]]]:
+        """
+        Embeds a batch of queries with a single encode call, searches the
+        collection with a single multi-query request and builds one prompt
+        per query, recording the time spent in each stage in `last_timings`.
+
+        Args:
+            user_queries (List[str]): The PII-filtered queries, in arrival order.
+
+        Returns:
+            Tuple[List[str], List[Dict[str, Any]]]: One fully-formed prompt per
+            query, in the same order, and for each the prompt builder's token
+            accounting, the IDs of the retrieved chunks and the index version.
+        """
+        steps = self._retrieval(user_queries)
+        result = None
+        try:
+            while True:
+                func, args = steps.send(result)
+                result = func(*args)
+        except StopIteration as done:
+            return done.value
+
+    async def retrieve_prompts_async(self, user_queries: List[str],
+                                     run_blocking: Callable[..., Awaitable[Any]]) -> Tuple[List[str], List[Dict[str, Any]]]:
+        """
+        Like retrieve_prompts(), but the version check, the encode and the
+        search are handed to `run_blocking` (e.g. AsyncQueueManager.run_blocking)
+        and awaited, so the event loop keeps serving other messages meanwhile. The cache
+        lookups and prompt assembly run on the loop.
+        """
+        steps = self._retrieval(user_queries)
+        result = None
+        try:
+            while True:
+                func, args = steps.send(result)
+                result = await run_blocking(func, *args)
+        except StopIteration as done:
+            return done.value
+
+    def _retrieval(self, user_queries: List[str]) -> Generator[Tuple[Callable, tuple], Any,
+                                                                Tuple[List[str], List[Dict[str, Any]]]]:
+        """
+        The steps of retrieve_prompts(). The blocking calls (the version check,
+        which may ask the ChromaDB server, the encode and the search) are
+        yielded as (function, args) for the caller to run and send the result
+        back, so the sync and async drivers share one body.
+        """
+        if not user_queries:
+            return [], []
+        timings = {'encode_ms': 0.0, 'search_ms': 0.0}
+        documents: List[Optional[List[ContextChunk]]] = [None] * len(user_queries)
+        version = yield self.collection_version, ()
+
+        if self.cache is not None:
+            self.cache.check_version(version)
+            for i, user_query in enumerate(user_queries):
+                documents[i] = self.cache.get_exact(user_query)
+
+        pending = [i for i, docs in enumerate(documents) if docs is None]
+        if pending:
+            start = time.perf_counter()
+            query_embeddings = yield self.encode, ([user_queries[i] for i in pending],)
+            timings['encode_ms'] = (time.perf_counter() - start) * 1000
+            observe_substage("rag_core", "encode", timings['encode_ms'] / 1000)
+
+            if self.cache is not None:
+                for i, embedding in zip(pending, query_embeddings):
+                    documents[i] = self.cache.get_similar(user_queries[i], embedding)
+            to_search = [(i, embedding) for i, embedding in zip(pending, query_embeddings) if documents[i] is None]
+            if self.cache is not None:
+                count_cache("query", hit=True, amount=len(user_queries) - len(to_search))
+                count_cache("query", hit=False, amount=len(to_search))
+
+            if to_search:
+                start = time.perf_counter()
+                search_results = yield self.search, ([embedding for _, embedding in to_search],
+                                                     [user_queries[i] for i, _ in to_search])
+                timings['search_ms'] = (time.perf_counter() - start) * 1000
+                observe_substage("rag_core", "search", timings['search_ms'] / 1000)
+                if self.hybrid is not None:
+                    timings.update(self.hybrid.last_timings)
+
+                for j, (i, embedding) in enumerate(to_search):
+                    documents[i] = context_chunks(search_results, j)
+                    if self.cache is not None and documents[i]:
+                        self.cache.put(user_queries[i], embedding, documents[i])
+
+        start = time.perf_counter()
+        prompts, prompt_stats = [], []
+        for user_query, docs in zip(user_queries, documents):
+            prompt, stats = self.prompt_builder.build(user_query, docs or [])
+            # Identify the context for caches further down the pipeline
+            stats["chunk_ids"] = [chunk.chunk_id for chunk in docs or [] if chunk.chunk_id is not None]
+            stats["index_version"] = None if version is None else str(version)
+            prompts.append(prompt)
+            prompt_stats.append(stats)
+        timings['prompt_ms'] = (time.perf_counter() - start) * 1000
+
+        self.last_timings = timings
+        log.debug("retrieved", batch=len(user_queries), **{name: round(value, 1) for name, value in timings.items()},
+                  tokens=sum(s['prompt_tokens'] for s in prompt_stats),
+                  saved=sum(s['tokens_saved'] for s in prompt_stats))
+        return prompts, prompt_stats
+
+    def run_queries(self, user_queries: List[str]) -> List[str]:
+        """
+        Returns one fully-formed prompt per query; see retrieve_prompts().
+        """
+        return self.retrieve_prompts(user_queries)[0]
+
+    def run_query(self, user_query: str) -> str:
+        """
+        Embeds the query, searches the collection and builds the LLM prompt.
+
+        Args:
+            user_query (str): The PII-filtered query from the user.
+
+        Returns:
+            str: A fully-formed prompt containing the context and the user's query.
+        """
+        return self.run_queries([user_query])[0]
@@ -0,0 +1,282 @@
+import json
+import os
+import sys
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence
+import numpy as np
+
+DEFAULT_COLLECTION = "document_embeddings"
+
+
+class SearchBackend:
+    """
+    The interface the Retriever searches through. query() returns results in
+    ChromaDB's shape, one inner list per query:
+    {"ids": [[...]], "documents": [[...]], "metadatas": [[...]], "distances": [[...]]}.
+    """
+    def connect(self) -> bool:
+        """
+        Opens (or re-opens) the backend. Returns False if it has no data to search.
+        """
+        raise NotImplementedError
+
+    def version(self) -> Any:
+        """
+        Returns the ingestion version stamp, which changes whenever the indexed data does.
+        """
+        raise NotImplementedError
+
+    def query(self, query_embeddings: Sequence[Sequence[float]], n_results: int) -> Dict[str, Any]:
+        raise NotImplementedError
+
+
+class ChromaBackend(SearchBackend):
+    """
+    Searches a collection on a ChromaDB server over HTTP, or in a local
+    ChromaDB directory opened with a PersistentClient.
+    """
+    def __init__(self, chroma_host: str, chroma_port: int, collection_name: str = DEFAULT_COLLECTION,
+                 version_check_seconds: float = 5.0, chroma_path: str = ""):
+        """
+        Args:
+            chroma_host (str): Host name of the ChromaDB server.
+            chroma_port (int): Port of the ChromaDB server.
+            collection_name (str): The collection to search.
+            version_check_seconds (float): How often to re-read the collection's version stamp.
+            chroma_path (str): A local ChromaDB directory to open instead of the server.
+        """
+        self.chroma_path = chroma_path
+        self.chroma_host = chroma_host
+        self.chroma_port = int(chroma_port)
+        self.collection_name = collection_name
+        self.version_check_seconds = version_check_seconds
+        self.client = None
+        self.collection = None
+        self._version_checked_at = 0.0
+
+    def connect(self) -> bool:
+        """
+        (Re)creates the ChromaDB client and fetches the collection handle.
+
+        Returns:
+            bool: True if the collection is available, False otherwise.
+        """
+        import chromadb
+        try:
+            if self.chroma_path:
+                self.client = chromadb.PersistentClient(path=self.chroma_path)
+            else:
+                self.client = chromadb.HttpClient(host=self.chroma_host, port=self.chroma_port)
+            self.collection = self.client.get_collection(name=self.collection_name)
+            print(f" [i] Connected to ChromaDB collection '{self.collection_name}'.", file=sys.stderr)
+            return True
+        except Exception as e:
+            self.collection = None
+            print(f"Collection '{self.collection_name}' not available ({e}). Please ensure your documents are ingested.", file=sys.stderr)
+            return False
+
+    def version(self) -> Any:
+        """
+        Returns the version stamp that ingestion writes into the collection
+        metadata, re-reading it from the server at most every `version_check_seconds`.
+        """
+        now = time.monotonic()
+        if self.collection is not None and now - self._version_checked_at >= self.version_check_seconds:
+            self._version_checked_at = now
+            try:
+                self.collection = self.client.get_collection(name=self.collection_name)
+            except Exception as e:
+                print(f"Could not refresh collection metadata: {e}", file=sys.stderr)
+        metadata = (self.collection.metadata or {}) if self.collection is not None else {}
+        return metadata.get("version")
+
+    def query(self, query_embeddings: Sequence[Sequence[float]], n_results: int) -> Dict[str, Any]:
+        """
+        Queries the collection, reconnecting once if the ChromaDB server has gone away.
+        """
+        if self.collection is None and not self.connect():
+            return {}
+        try:
+            return self.collection.query(query_embeddings=query_embeddings, n_results=n_results)
+        except Exception as e:
+            print(f"ChromaDB query failed ({e}); reconnecting.", file=sys.stderr)
+            if not self.connect():
+                return {}
+            return self.collection.query(query_embeddings=query_embeddings, n_results=n_results)
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """
+    Returns the column indices of the k highest scores in each row, best first,
+    using a partial sort instead of sorting every row.
+    """
+    k = min(k, scores.shape[1])
+    if k <= 0:
+        return np.empty((scores.shape[0], 0), dtype=np.int64)
+    candidates = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    order = np.argsort(-np.take_along_axis(scores, candidates, axis=1), axis=1)
+    return np.take_along_axis(candidates, order, axis=1)
+
+
+class IVFIndex:
+    """
+    An inverted-file index over unit vectors: k-means splits the rows into
+    `n_lists` clusters, and a query is scored exactly against only the rows
+    of its `n_probe` nearest clusters.
+    """
+    def __init__(self, vectors: np.ndarray, n_lists: Optional[int] = None, n_probe: int = 8,
+                 iterations: int = 10, seed: int = 0):
+        count = vectors.shape[0]
+        self.n_lists = max(1, min(n_lists or int(np.sqrt(count)), count))
+        self.n_probe = min(n_probe, self.n_lists)
+        rng = np.random.default_rng(seed)
+        centroids = np.array(vectors[rng.choice(count, self.n_lists, replace=False)], dtype=np.float32)
+        for _ in range(iterations):
+            assignment = np.argmax(vectors @ centroids.T, axis=1)
+            for list_id in range(self.n_lists):
+                members = vectors[assignment == list_id]
+                if len(members):
+                    centroid = members.mean(axis=0)
+                    centroids[list_id] = centroid / (np.linalg.norm(centroid) or 1.0)
+        self.centroids = centroids
+        assignment = np.argmax(vectors @ centroids.T, axis=1)
+        self.lists = [np.flatnonzero(assignment == list_id) for list_id in range(self.n_lists)]
+        self.vectors = vectors
+
+    def search(self, queries: np.ndarray, k: int):
+        probes = top_k(queries @ self.centroids.T, self.n_probe)
+        all_rows, all_scores = [], []
+        for query, probe in zip(queries, probes):
+            rows = np.concatenate([self.lists[list_id] for list_id in probe])
+            scores = self.vectors[rows] @ query
+            best = top_k(scores[None, :], k)[0]
+            all_rows.append(rows[best])
+            all_scores.append(scores[best])
+        return all_rows, all_scores
+
+
+class HNSWIndex:
+    """
+    A graph index built with the optional hnswlib package.
+    """
+    def __init__(self, vectors: np.ndarray, ef_search: int = 64, m: int = 16, ef_construction: int = 200):
+        try:
+            import hnswlib
+        except ImportError:
+            raise RuntimeError("The HNSW index needs the hnswlib package: pip install hnswlib")
+        self.index = hnswlib.Index(space="ip", dim=vectors.shape[1])
+        self.index.init_index(max_elements=vectors.shape[0], M=m, ef_construction=ef_construction)
+        self.index.add_items(np.asarray(vectors), np.arange(vectors.shape[0]))
+        self.index.set_ef(ef_search)
+
+    def search(self, queries: np.ndarray, k: int):
+        labels, distances = self.index.knn_query(queries, k=min(k, self.index.get_current_count()))
+        # hnswlib's inner-product distance is 1 - dot product
+        return list(labels), [1.0 - row for row in distances]
+
+
+class NumpyBackend(SearchBackend):
+    """
+    Searches an in-process index: a memory-mapped float32 matrix of unit
+    vectors scored against the queries with one matrix product and a partial
+    sort, with no server round trip. For larger corpora an approximate
+    IVF or HNSW index can be built over the same matrix at load time.
+
+    The index directory is written by chunking/exportIndex.py from the same
+    chunks and embeddings that are ingested into ChromaDB. It is reloaded when
+    its version stamp changes.
+    """
+    def __init__(self, index_dir: str, ann: str = "", version_check_seconds: float = 5.0, **ann_options):
+        """
+        Args:
+            index_dir (str): Directory with vectors.npy, vectors.meta.json and documents.json.
+            ann (str): "" for exact search, "ivf" or "hnsw" for an approximate index.
+            version_check_seconds (float): How often to check the index for a new version.
+            **ann_options: Passed on to IVFIndex or HNSWIndex.
+        """
+        self.index_dir = index_dir
+        self.ann = ann
+        self.ann_options = ann_options
+        self.version_check_seconds = version_check_seconds
+        self._version_checked_at = 0.0
+        self._lock = threading.Lock()
+        self.vectors = None
+        self.meta: Dict[str, Any] = {}
+        self.documents: List[Dict[str, Any]] = []
+        self.index = None
+
+    def _meta_path(self) -> str:
+        return os.path.join(self.index_dir, "vectors.meta.json")
+
+    def connect(self) -> bool:
+        """
+        Loads the index: the matrix is memory-mapped, not read, so opening is
+        fast and the pages are shared between processes on the same host.
+        """
+        try:
+            with open(self._meta_path(), "r") as f:
+                meta = json.load(f)
+            vectors = np.load(os.path.join(self.index_dir, "vectors.npy"), mmap_mode="r")
+            with open(os.path.join(self.index_dir, "documents.json"), "r") as f:
+                documents = json.load(f)
+            if vectors.shape != (meta["count"], meta["dimension"]) or len(documents) != meta["count"]:
+                raise ValueError(f"index files disagree: {vectors.shape}, {len(documents)} documents, {meta['count']} rows")
+            start = time.perf_counter()
+            index = None
+            if self.ann == "ivf":
+                index = IVFIndex(vectors, **self.ann_options)
+            elif self.ann == "hnsw":
+                index = HNSWIndex(vectors, **self.ann_options)
+            elif self.ann:
+                raise ValueError(f"unknown ANN index '{self.ann}'")
+        except (OSError, ValueError, KeyError, RuntimeError) as e:
+            print(f"Index in '{self.index_dir}' not available ({e}). Please export it after ingestion.", file=sys.stderr)
+            return False
+        with self._lock:
+            self.vectors, self.meta, self.documents, self.index = vectors, meta, documents, index
+        build = f", {self.ann} index built in {(time.perf_counter() - start) * 1000:.0f} ms" if self.ann else ""
+        print(f" [i] Loaded in-process index of {meta['count']} vectors from '{self.index_dir}'{build}.", file=sys.stderr)
+        return True
+
+    def version(self) -> Any:
+        """
+        Returns the index's version stamp, reloading the index first if a newer one has been exported.
+        """
+        now = time.monotonic()
+        if now - self._version_checked_at >= self.version_check_seconds:
+            self._version_checked_at = now
+            try:
+                with open(self._meta_path(), "r") as f:
+                    on_disk = json.load(f).get("version")
+                if self.vectors is not None and on_disk != self.meta.get("version"):
+                    self.connect()
+            except (OSError, ValueError) as e:
+                print(f"Could not check the index version: {e}", file=sys.stderr)
+        return self.meta.get("version")
+
+    def query(self, query_embeddings: Sequence[Sequence[float]], n_results: int) -> Dict[str, Any]:
+        """
+        Returns the n_results rows with the highest cosine similarity to each query.
+        Distances are cosine distances (1 - similarity).
+        """
+        if self.vectors is None and not self.connect():
+            return {}
+        # One consistent snapshot: a reload in connect() may swap all of these meanwhile
+        with self._lock:
+            vectors, meta, documents, index = self.vectors, self.meta, self.documents, self.index
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        queries = queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+        if index is None:
+            scores = queries @ vectors.T
+            rows = top_k(scores, n_results)
+            row_scores = np.take_along_axis(scores, rows, axis=1)
+        else:
+            rows, row_scores = index.search(queries, n_results)
+        ids = meta["ids"]
+        return {
+            "ids": [[ids[i] for i in row] for row in rows],
+            "documents": [[documents[i]["text"] for i in row] for row in rows],
+            "metadatas": [[documents[i].get("metadata") for i in row] for row in rows],
+            "distances": [[float(1.0 - s) for s in row] for row in row_scores],
+        }
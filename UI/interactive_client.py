@@ -2,40 +2,97 @@ import sys
 import json
 import os
 
-# Add the parent directory to the system path to allow importing queue_manager.py
+# Add the parent directory to the system path to allow importing the shared package.
 # This is necessary because the script is in a subdirectory.
 current_dir = os.path.dirname(os.path.abspath(__file__))
-parent_dir = os.path.dirname(os.path.dirname(current_dir))
+parent_dir = os.path.dirname(current_dir)
 sys.path.append(parent_dir)
 
-from shared.queue_manager import QueueManager
+from shared.queueManager import QueueManager
+from shared.envelope import new_envelope, parse_envelope, stamp, dumps, hop_latencies, LatencyStats
+from shared.flowControl import QueueFullError
 
-def send_message(message_text):
+REPLY_TIMEOUT = float(os.getenv("REPLY_TIMEOUT", 120))
+
+def send_message(manager: QueueManager, reply_queue: str, message_text: str):
     """
-    Sends a message with the provided text to the pii_filtering_queue.
+    Sends the text to the pii_redaction_queue, prints the answer's tokens as
+    they stream in, and blocks until the final (guarded) answer for this
+    request's correlation ID comes back. The request carries a deadline of
+    REPLY_TIMEOUT, after which the stages drop it instead of working on an
+    answer nobody is waiting for.
+
+    Args:
+        manager (QueueManager): An open queue manager.
+        reply_queue (str): This client's private reply queue.
+        message_text (str): The user's question.
+
+    Returns:
+        dict: The completed envelope, or None if no reply arrived in time
+        or the pipeline was too busy to take the request.
     """
-    manager = QueueManager(rabbitmq_host='rabbitmq')
-    
-    # Create the message payload with the provided text
-    test_data = {
-        "text": message_text
-    }
-    
-    message = json.dumps(test_data)
-    
+    envelope = new_envelope(message_text, reply_to=reply_queue, deadline_s=REPLY_TIMEOUT)
     try:
-        manager.send_message(queue_name='pii_filtering_queue', message=message)
-        print(f" [✓] Message sent successfully: '{message_text}'")
-    finally:
-        manager.close()
+        manager.send_message(queue_name='pii_redaction_queue', message=dumps(envelope))
+    except QueueFullError:
+        print(" [!] The service is busy; please try again shortly.", file=sys.stderr)
+        return None
+    print(f" [✓] Message sent successfully: '{message_text}'")
+
+    # The LLM worker streams tokens ahead of the guarded final envelope
+    reply = None
+    for body in manager.iter_replies(reply_queue, envelope["correlation_id"], timeout=REPLY_TIMEOUT):
+        message = json.loads(body)
+        if message.get("type") == "token":
+            print(message["text"], end="", flush=True)
+            continue
+        if message.get("type") == "blocked":
+            # The streaming guardrail cut the answer off; the final envelope follows
+            print(f"\n [!] {message['text']}", flush=True)
+            continue
+        reply = body
+        break
+    print()
+    if reply is None:
+        print(f" [!] No reply within {REPLY_TIMEOUT:.0f}s for '{envelope['correlation_id']}'", file=sys.stderr)
+        return None
+
+    result = stamp(parse_envelope(reply), "client")
+    if result.get("busy"):
+        # A stage further down found its next queue full and turned the request away
+        print(f" [!] {result['response']}", file=sys.stderr)
+        return None
+    print(f" [✓] Response: {result.get('response', '')}")
+    for hop, latency_ms in hop_latencies(result).items():
+        print(f"     {hop:<28} {latency_ms:9.1f} ms")
+    return result
 
 if __name__ == '__main__':
-    if len(sys.argv) > 1:
-        # If arguments are provided, use them as the message
-        input_text = ' '.join(sys.argv[1:])
-        send_message(input_text)
-    else:
+    args = sys.argv[1:]
+    repeat = 1
+    if len(args) >= 2 and args[0] == '--repeat':
+        repeat = int(args[1])
+        args = args[2:]
+
+    if not args:
         # If no arguments, prompt the user for input
         print("Please provide text to send as a command-line argument.")
         print("Example: python interactive_client.py 'Hello my name is John Smith.'")
+        print("         python interactive_client.py --repeat 50 'How do I file a complaint?'")
         sys.exit(1)
+
+    # If arguments are provided, use them as the message
+    input_text = ' '.join(args)
+    manager = QueueManager(rabbitmq_host=os.getenv("RABBITMQ_HOST", "rabbitmq"))
+    stats = LatencyStats()
+    try:
+        reply_queue = manager.declare_reply_queue()
+        for _ in range(repeat):
+            result = send_message(manager, reply_queue, input_text)
+            if result is not None:
+                stats.record(result)
+    finally:
+        manager.close()
+
+    if repeat > 1:
+        print(stats.format_report())
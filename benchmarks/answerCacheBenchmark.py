@@ -0,0 +1,139 @@
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+# Add the LLM worker directory to the system path to allow importing llmWorker.py,
+# answerCache.py and mockOllama.py (llmWorker.py adds the project root and guardrail itself)
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(os.path.dirname(current_dir), "LLM", "v1"))
+
+from answerCache import AnswerCache, answer_key
+from mockOllama import DEFAULT_RESPONSE, serve
+
+SAMPLE_QUERIES = [
+    "How do I file a complaint with the District Commission?",
+    "Can I get a refund for a defective product?",
+    "What is the time limit for filing a consumer complaint?",
+    "What is product liability?",
+]
+
+
+class RecordingPublisher:
+    """
+    Stands in for the QueueManager: keeps what the worker sends instead of publishing it.
+    """
+    def __init__(self):
+        self.messages = []
+        self.replies = []
+
+    def send_message(self, queue_name: str, message: str):
+        self.messages.append((queue_name, json.loads(message)))
+
+    def send_reply(self, reply_to: str, message: str, correlation_id: str):
+        self.replies.append(json.loads(message))
+
+
+def envelope(query: str, context_ids, index_version: str = "1") -> bytes:
+    return json.dumps({"correlation_id": f"bench-{time.perf_counter_ns()}", "reply_to": "bench_replies",
+                       "text": query, "prompt": f"Context:\n...\n\nQuestion:\n{query}\n",
+                       "context_ids": context_ids, "index_version": index_version}).encode("utf-8")
+
+
+def self_check(cache_dir: str):
+    """
+    Checks the cache on its own: keys, LRU and TTL eviction, entries scoped
+    to their index version, and the on-disk level surviving a restart.
+    """
+    key = answer_key("What is  product liability?", ["doc_1", "doc_2"], "llama3")
+    assert key == answer_key("what is product liability?", ["doc_1", "doc_2"], "llama3")
+    assert key != answer_key("what is product liability?", ["doc_2", "doc_1"], "llama3")
+    assert key != answer_key("what is product liability?", ["doc_1", "doc_2"], "mistral")
+    assert key != answer_key("what is product liability?", ["doc_1", "doc_2"], "llama3", "2")
+
+    cache = AnswerCache(max_entries=2)
+    for name in ("a", "b", "c"):
+        cache.put(name, name.upper(), "1")
+    assert cache.get("a", "1") is None and cache.get("c", "1") == "C" and cache.stats["evictions"] == 1
+    assert cache.get("c", "2") is None
+
+    expiring = AnswerCache(ttl_seconds=0.05)
+    expiring.put("a", "A", "1")
+    time.sleep(0.1)
+    assert expiring.get("a", "1") is None
+
+    path = os.path.join(cache_dir, "answers.sqlite")
+    first = AnswerCache(disk_path=path)
+    first.put("a", "A", "1")
+    first.close()
+    restarted = AnswerCache(disk_path=path)
+    assert restarted.get("a", "1") == "A" and restarted.stats["disk_hits"] == 1
+    assert restarted.get("a", "2") is None
+    restarted.close()
+
+    # Replicas on different index versions share the file without wiping each other's entries
+    old, new = AnswerCache(disk_path=path), AnswerCache(disk_path=path)
+    new.put("b", "B2", "2")
+    for _ in range(3):
+        assert old.get("a", "1") == "A" and new.get("b", "2") == "B2"
+        old._memory.clear()
+        new._memory.clear()
+    old.close()
+    new.close()
+    print("Self-check passed: keys, eviction, version scoping and the on-disk level behave as expected.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="LLM worker latency on answer-cache misses and hits, "
+                                                 "against a local mock Ollama.")
+    parser.add_argument("--token-delay-ms", type=float, default=20.0)
+    parser.add_argument("--first-token-delay-ms", type=float, default=100.0)
+    parser.add_argument("--repeats", type=int, default=20, help="Hits measured per query.")
+    args = parser.parse_args()
+
+    server = serve(0, DEFAULT_RESPONSE, args.token_delay_ms, args.first_token_delay_ms)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    # llmWorker reads its configuration when it is imported
+    os.environ["OLLAMA_URL"] = f"http://127.0.0.1:{server.server_address[1]}/api/generate"
+    import llmWorker
+
+    with tempfile.TemporaryDirectory() as tmp:
+        self_check(tmp)
+
+    publisher = RecordingPublisher()
+    llmWorker.bind_queue_manager(publisher)
+    cache = llmWorker.answer_cache
+    if cache is None:
+        print("The answer cache is disabled (LLM_ANSWER_CACHE_SIZE=0).", file=sys.stderr)
+        sys.exit(1)
+
+    misses, hits = [], []
+    for i, query in enumerate(SAMPLE_QUERIES):
+        context_ids = [f"doc_{i}", f"doc_{i + 10}"]
+        start = time.perf_counter()
+        llmWorker.llm_callback(None, None, None, envelope(query, context_ids))
+        misses.append((time.perf_counter() - start) * 1000)
+        generated = publisher.messages[-1][1]["response"]
+        for _ in range(args.repeats):
+            start = time.perf_counter()
+            llmWorker.llm_callback(None, None, None, envelope(query, context_ids))
+            hits.append((time.perf_counter() - start) * 1000)
+            forwarded = publisher.messages[-1][1]
+            assert forwarded.get("answer_cache") == "hit" and forwarded["response"] == generated
+
+    # Re-ingestion changes the index version, so the next request generates again
+    before = cache.stats["misses"]
+    llmWorker.llm_callback(None, None, None, envelope(SAMPLE_QUERIES[0], ["doc_0", "doc_10"], index_version="2"))
+    assert cache.stats["misses"] == before + 1 and "answer_cache" not in publisher.messages[-1][1]
+
+    print(f"{len(SAMPLE_QUERIES)} queries, {args.repeats} repeats each, mock Ollama at "
+          f"{args.first_token_delay_ms:.0f} ms to first token + {args.token_delay_ms:.0f} ms per token")
+    print(f"{'':<8} {'count':>6} {'p50 ms':>10} {'max ms':>10}")
+    for name, samples in (("miss", misses), ("hit", hits)):
+        print(f"{name:<8} {len(samples):>6} {statistics.median(samples):>10.2f} {max(samples):>10.2f}")
+    print(f"cache stats: {cache.stats}")
+    server.shutdown()
@@ -0,0 +1,138 @@
+import argparse
+import json
+import os
+import re
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import fitz  # PyMuPDF library
+
+# Add the chunking directory to the system path to allow importing fixedSizeChunking.py
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+sys.path.append(os.path.join(project_root, "chunking"))
+
+from fixedSizeChunking import iter_chunks
+from sectionChunking import DEFAULT_MAX_TOKENS, approximate_token_count, iter_section_chunks, make_token_counter
+
+DEFAULT_PDF = os.path.join(project_root, "data", "eng201935.pdf")
+
+
+def legacy_chunk_document(file_path: str, chunk_size: int = 500, overlap: int = 50):
+    """
+    The original chunker: concatenates every page into one string, normalizes
+    it in one pass and builds the full list of chunks.
+    """
+    doc = fitz.open(file_path)
+    full_text = ""
+    for page in doc:
+        full_text += page.get_text()
+    full_text = re.sub(r'\s+', ' ', full_text).strip()
+    chunks = []
+    if len(full_text) <= chunk_size:
+        return [full_text]
+    start = 0
+    while start < len(full_text):
+        chunks.append(full_text[start:start + chunk_size])
+        start += chunk_size - overlap
+    return chunks
+
+
+def replicate_pdf(source: str, copies: int, output_path: str) -> int:
+    """
+    Writes a PDF made of `copies` back-to-back copies of the source and returns its page count.
+    """
+    with fitz.open(source) as src, fitz.open() as out:
+        for _ in range(copies):
+            out.insert_pdf(src)
+        out.save(output_path)
+        return len(out)
+
+
+def run_one(mode: str, pdf_path: str):
+    """
+    Runs one chunker in this (fresh) process and prints its time, chunk count
+    and peak RSS as JSON. Only the streaming chunker's chunks are consumed
+    one at a time, the way the ingestion writer uses them.
+    """
+    start = time.perf_counter()
+    if mode == "legacy":
+        count = len(legacy_chunk_document(pdf_path))
+    else:
+        count = sum(1 for _ in iter_chunks(pdf_path))
+    elapsed = time.perf_counter() - start
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(json.dumps({"mode": mode, "seconds": elapsed, "chunks": count, "peak_rss_mb": peak_kb / 1024}))
+
+
+def measure(mode: str, pdf_path: str) -> dict:
+    output = subprocess.run([sys.executable, os.path.abspath(__file__), "--run", mode, pdf_path],
+                            check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def self_check(pdf_path: str):
+    """
+    Checks that the streamed chunks equal the legacy ones, that the offsets
+    point into the normalized text, and that each chunk's page range is right.
+    """
+    with fitz.open(pdf_path) as doc:
+        pages = [page.get_text() for page in doc]
+    normalized = re.sub(r'\s+', ' ', "".join(pages)).strip()
+    # Offset in the normalized text at which each page's text ends
+    page_ends = []
+    for i in range(len(pages)):
+        page_ends.append(len(re.sub(r'\s+', ' ', "".join(pages[:i + 1])).strip()))
+
+    chunks = list(iter_chunks(pdf_path))
+    assert [c.text for c in chunks] == legacy_chunk_document(pdf_path)
+    for chunk in chunks:
+        assert normalized[chunk.char_start:chunk.char_end] == chunk.text
+        expected_start = next(i for i, end in enumerate(page_ends) if end > chunk.char_start) + 1
+        expected_end = next(i for i, end in enumerate(page_ends) if end >= chunk.char_end) + 1
+        assert (chunk.page_start, chunk.page_end) == (expected_start, expected_end), chunk[1:]
+    print(f" [i] Self-check passed on {len(chunks)} chunks")
+
+
+def compare_strategies(pdf_path: str, count_tokens):
+    """
+    Prints chunk count, token totals and how many sections each strategy keeps
+    whole. A section counts as kept whole if one chunk contains all of it.
+    """
+    fixed = list(iter_chunks(pdf_path))
+    section = list(iter_section_chunks(pdf_path, count_tokens=count_tokens))
+    whole_sections = [(c.char_start, c.char_end) for c in section if len(c.hierarchy) == 2]
+
+    print(f"{'strategy':>9} {'chunks':>7} {'tokens':>8} {'mean':>6} {'max':>5} {'over limit':>11} {'sections whole':>15}")
+    for name, chunks in (("fixed", fixed), ("section", section)):
+        tokens = [count_tokens(c.text) for c in chunks]
+        over = sum(1 for t in tokens if t > DEFAULT_MAX_TOKENS)
+        kept = sum(1 for start, end in whole_sections
+                   if any(c.char_start <= start and end <= c.char_end for c in chunks))
+        print(f"{name:>9} {len(chunks):>7} {sum(tokens):>8} {sum(tokens) / len(chunks):>6.0f} {max(tokens):>5} "
+              f"{over:>11} {kept:>7}/{len(whole_sections)}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 4 and sys.argv[1] == "--run":
+        run_one(sys.argv[2], sys.argv[3])
+        sys.exit(0)
+
+    parser = argparse.ArgumentParser(description="Time and peak RSS of the legacy and streaming PDF chunkers.")
+    parser.add_argument("--pdf", default=DEFAULT_PDF)
+    parser.add_argument("--copies", default="1,10,30", help="Comma-separated replication factors.")
+    parser.add_argument("--tokenizer", help="Count tokens with this Hugging Face tokenizer instead of approximately.")
+    args = parser.parse_args()
+
+    self_check(args.pdf)
+    compare_strategies(args.pdf, make_token_counter(args.tokenizer) if args.tokenizer else approximate_token_count)
+    print(f"{'pages':>6} {'mode':>8} {'seconds':>9} {'chunks':>8} {'peak RSS MB':>12}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for copies in (int(c) for c in args.copies.split(",")):
+            pdf_path = os.path.join(tmp, f"replicated_{copies}.pdf")
+            page_count = replicate_pdf(args.pdf, copies, pdf_path)
+            for mode in ("legacy", "stream"):
+                result = measure(mode, pdf_path)
+                print(f"{page_count:>6} {mode:>8} {result['seconds']:>9.2f} {result['chunks']:>8} {result['peak_rss_mb']:>12.1f}")
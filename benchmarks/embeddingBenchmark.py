@@ -0,0 +1,65 @@
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+# Add the chunking directory to the system path to allow importing embed.py
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+sys.path.append(os.path.join(project_root, "chunking"))
+
+from embed import Embedder, MODEL_NAME
+
+DEFAULT_CHUNKS = os.path.join(project_root, "data", "chunk.json")
+
+
+def load_texts(path: str, replicate: int):
+    with open(path, "r") as f:
+        chunks = json.load(f)
+    texts = [chunk["text"] if isinstance(chunk, dict) else chunk for chunk in chunks]
+    # Suffix each copy so replicated texts are distinct and never served from the cache
+    return [f"{text} [{copy}]" if copy else text for copy in range(replicate) for text in texts]
+
+
+def measure(embedder: Embedder, texts) -> float:
+    start = time.perf_counter()
+    embedder.embed(texts)
+    return len(texts) / (time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Embedding throughput per batch size, with and without length sorting.")
+    parser.add_argument("--chunks", default=DEFAULT_CHUNKS, help="Chunks JSON written by the chunker.")
+    parser.add_argument("--replicate", type=int, default=1)
+    parser.add_argument("--batch-sizes", default="8,16,32,64,128")
+    parser.add_argument("--threads", type=int, default=0, help="Torch threads; 0 keeps the default.")
+    parser.add_argument("--device", default="")
+    args = parser.parse_args()
+
+    texts = load_texts(args.chunks, args.replicate)
+    # One model instance shared by every run, loaded and warmed up once
+    base = Embedder(MODEL_NAME, num_threads=args.threads, device=args.device, cache_path="")
+    base.embed(texts[:8])
+
+    print(f"{len(texts)} chunks, model {MODEL_NAME}, threads {args.threads or 'default'}")
+    print(f"{'batch':>6} {'unsorted chunks/s':>18} {'sorted chunks/s':>16}")
+    for batch_size in (int(b) for b in args.batch_sizes.split(",")):
+        rates = []
+        for sort_by_length in (False, True):
+            embedder = Embedder(MODEL_NAME, batch_size=batch_size, sort_by_length=sort_by_length,
+                                cache_path="", model=base.model)
+            rates.append(measure(embedder, texts))
+        print(f"{batch_size:>6} {rates[0]:>18.1f} {rates[1]:>16.1f}")
+
+    # A second run over the same corpus is served from the on-disk cache
+    with tempfile.TemporaryDirectory() as tmp:
+        cache_path = os.path.join(tmp, "cache.sqlite")
+        cold = Embedder(MODEL_NAME, cache_path=cache_path, model=base.model)
+        cold_rate = measure(cold, texts)
+        cold.close()
+        warm = Embedder(MODEL_NAME, cache_path=cache_path, model=base.model)
+        warm_rate = measure(warm, texts)
+        print(f"cache: cold {cold_rate:.1f} chunks/s, warm {warm_rate:.1f} chunks/s ({warm.report()})")
+        warm.close()
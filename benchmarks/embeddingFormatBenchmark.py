@@ -0,0 +1,72 @@
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import numpy as np
+
+# Add the chunking directory to the system path to allow importing embeddingStore.py
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+sys.path.append(os.path.join(project_root, "chunking"))
+
+from embeddingStore import load_embeddings, save_embeddings, sidecar_path
+
+DEFAULT_EMBEDDINGS = os.path.join(project_root, "data", "embed.json")
+
+
+def best_of(repeat: int, load) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        load()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="File size and load time of JSON vs float32 .npy embeddings.")
+    parser.add_argument("--embeddings", default=DEFAULT_EMBEDDINGS, help="A JSON list of vectors written by embed.py.")
+    parser.add_argument("--replicate", type=int, default=1, help="Repeat the vectors to simulate a larger corpus.")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    with open(args.embeddings, "r") as f:
+        vectors = json.load(f) * args.replicate
+    ids = [f"chunk_{i}" for i in range(len(vectors))]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        json_path = os.path.join(tmp, "embed.json")
+        npy_path = os.path.join(tmp, "embed.npy")
+        with open(json_path, "w") as f:
+            json.dump(vectors, f, indent=4)
+        save_embeddings(npy_path, vectors, ids, "all-MiniLM-L6-v2")
+
+        # The float32 file holds the same vectors, rounded to float32
+        loaded, sidecar = load_embeddings(npy_path)
+        assert sidecar["ids"] == ids and loaded.shape == (len(vectors), len(vectors[0]))
+        assert np.allclose(loaded, np.asarray(vectors), atol=1e-7)
+
+        def load_json():
+            with open(json_path, "r") as f:
+                return json.load(f)
+
+        def load_npy_mmap_and_read():
+            array, _ = load_embeddings(npy_path)
+            return float(array.sum())
+
+        rows = [
+            ("JSON (json.load)", os.path.getsize(json_path), best_of(args.repeat, load_json)),
+            (".npy memory map, open only", os.path.getsize(npy_path) + os.path.getsize(sidecar_path(npy_path)),
+             best_of(args.repeat, lambda: load_embeddings(npy_path))),
+            (".npy memory map, read every row", os.path.getsize(npy_path) + os.path.getsize(sidecar_path(npy_path)),
+             best_of(args.repeat, load_npy_mmap_and_read)),
+            (".npy full load", os.path.getsize(npy_path) + os.path.getsize(sidecar_path(npy_path)),
+             best_of(args.repeat, lambda: load_embeddings(npy_path, mmap=False))),
+        ]
+
+    print(f"{len(vectors)} vectors x {len(vectors[0])} dimensions")
+    print(f"{'format':<34} {'size MB':>8} {'load ms':>9}")
+    for name, size, seconds in rows:
+        print(f"{name:<34} {size / 1e6:>8.2f} {seconds * 1000:>9.2f}")
@@ -0,0 +1,116 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+
+# Add the project root and chunking directories to the system path to allow
+# importing the shared package and exportOnnx.py
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+sys.path.append(project_root)
+sys.path.append(os.path.join(project_root, "chunking"))
+
+DEFAULT_CHUNKS = os.path.join(project_root, "data", "chunk.json")
+MODEL_NAME = "all-MiniLM-L6-v2"
+FIRST_QUERY = "How do I file a complaint with the District Commission?"
+
+
+def resident_set_mb() -> float:
+    """
+    Returns this process's current resident set size.
+    """
+    with open("/proc/self/status", "r") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def measure_backend(backend: str, onnx_dir: str, chunks_path: str, batch_size: int, vectors_path: str):
+    """
+    Runs in a fresh interpreter per backend, so import time and memory start
+    from nothing: imports the encoder, loads it, times the first query and
+    the chunk throughput, and saves the chunk vectors for the compatibility check.
+    """
+    started = time.perf_counter()
+    from shared.onnxEncoder import load_encoder
+    if backend == "sentence-transformers":
+        import sentence_transformers  # noqa: F401
+    else:
+        import onnxruntime  # noqa: F401
+        import tokenizers  # noqa: F401
+    import_ms = (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    encoder = load_encoder(backend, MODEL_NAME, onnx_dir)
+    load_ms = (time.perf_counter() - started) * 1000
+    started = time.perf_counter()
+    encoder.encode(FIRST_QUERY)
+    first_query_ms = (time.perf_counter() - started) * 1000
+
+    with open(chunks_path, "r") as f:
+        texts = [chunk["text"] if isinstance(chunk, dict) else chunk for chunk in json.load(f)]
+    started = time.perf_counter()
+    vectors = encoder.encode(texts, batch_size=batch_size, convert_to_numpy=True)
+    throughput = len(texts) / (time.perf_counter() - started)
+    np.save(vectors_path, np.asarray(vectors, dtype=np.float32))
+    print(json.dumps({"import_ms": import_ms, "load_ms": load_ms, "first_query_ms": first_query_ms,
+                      "rss_mb": resident_set_mb(), "chunks_per_s": throughput}))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cold start, memory and throughput of each query encoder backend, "
+                                                 "and the ONNX exports' agreement with the original model.")
+    parser.add_argument("--onnx-dir", default=os.path.join(project_root, "onnx"),
+                        help="Export written by chunking/exportOnnx.py; created there if missing.")
+    parser.add_argument("--chunks", default=DEFAULT_CHUNKS)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--measure", help=argparse.SUPPRESS)
+    parser.add_argument("--vectors", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        measure_backend(args.measure, args.onnx_dir, args.chunks, args.batch_size, args.vectors)
+        sys.exit(0)
+
+    from exportOnnx import MIN_COSINE, export_onnx
+    from shared.onnxEncoder import CONFIG_FILE
+    if not os.path.exists(os.path.join(args.onnx_dir, CONFIG_FILE)):
+        print(f" [i] Exporting '{MODEL_NAME}' to '{args.onnx_dir}'", file=sys.stderr)
+        export_onnx(MODEL_NAME, args.onnx_dir)
+
+    results, vectors = {}, {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for backend in ("sentence-transformers", "onnx", "onnx-int8"):
+            vectors_path = os.path.join(tmp, f"{backend}.npy")
+            child = subprocess.run([sys.executable, os.path.abspath(__file__), "--measure", backend,
+                                    "--onnx-dir", args.onnx_dir, "--chunks", args.chunks,
+                                    "--batch-size", str(args.batch_size), "--vectors", vectors_path],
+                                   capture_output=True, text=True)
+            if child.returncode != 0:
+                print(f" [!] {backend} failed:\n{child.stderr}", file=sys.stderr)
+                continue
+            results[backend] = json.loads(child.stdout.strip().splitlines()[-1])
+            vectors[backend] = np.load(vectors_path)
+
+    print(f"{'backend':<22} {'import ms':>10} {'load ms':>9} {'1st query ms':>13} {'RSS MB':>8} {'chunks/s':>9} "
+          f"{'min cos':>8} {'mean cos':>9}")
+    reference = vectors.get("sentence-transformers")
+    failed = False
+    for backend, r in results.items():
+        agreement = ""
+        if reference is not None and backend != "sentence-transformers":
+            cosines = (reference * vectors[backend]).sum(axis=1) / (
+                np.linalg.norm(reference, axis=1) * np.linalg.norm(vectors[backend], axis=1))
+            agreement = f" {cosines.min():>8.5f} {cosines.mean():>9.5f}"
+            failed = failed or cosines.min() < MIN_COSINE[backend]
+        print(f"{backend:<22} {r['import_ms']:>10.0f} {r['load_ms']:>9.0f} {r['first_query_ms']:>13.1f} "
+              f"{r['rss_mb']:>8.0f} {r['chunks_per_s']:>9.1f}{agreement}")
+    if failed:
+        print("Error: An ONNX backend is below its cosine tolerance "
+              f"({', '.join(f'{b} {c}' for b, c in MIN_COSINE.items())}).", file=sys.stderr)
+        sys.exit(1)
@@ -0,0 +1,162 @@
+import argparse
+import os
+import random
+import re
+import string
+import sys
+import time
+
+# Add the guardrail directory to the system path to allow importing guardrailEngine.py
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(os.path.dirname(current_dir), "external-guardtail", "v1"))
+
+from guardrailEngine import DEFAULT_RULES_PATH, CompiledRuleSet, Rule, load_rules
+
+RESPONSE_PARAGRAPH = (
+    "Under the Consumer Protection Act, 2019, a consumer may file a complaint with the District "
+    "Commission where the value of the goods or services paid as consideration does not exceed one "
+    "crore rupees. The complaint may be filed electronically and should describe the defect in the "
+    "goods or the deficiency in service, the relief sought, and include copies of the invoice. "
+)
+EMAIL_PATTERN = r"\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}\b"
+
+
+def make_keywords(count: int, rng: random.Random):
+    """
+    Generates banned phrases of one to three made-up words that never occur in the response.
+    """
+    words = ["".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(4, 9))) + "q"
+             for _ in range(max(50, count))]
+    return list({" ".join(rng.sample(words, rng.randint(1, 3))) for _ in range(count * 2)})[:count]
+
+
+def make_regex_rules(count: int, rng: random.Random):
+    """
+    Generates regex rules that start with a literal word (a made-up word
+    followed by a number), which never match the response.
+    """
+    words = {"".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(4, 9))) + "q"
+             for _ in range(count * 2)}
+    return [Rule(f"re-{i}", "regex", rf"\b{word}\s+(?:no\.?\s*)?\d{{2,}}\b", "block", "unsafe", "", True)
+            for i, word in enumerate(sorted(words)[:count])]
+
+
+def legacy_scanner(keywords, regexes=(EMAIL_PATTERN,)):
+    """
+    The original approach: one lowercase copy and substring search per keyword,
+    then a separate pass per regex.
+    """
+    patterns = [re.compile(pattern) for pattern in regexes]
+
+    def scan(text: str) -> bool:
+        for keyword in keywords:
+            if keyword in text.lower():
+                return True
+        return any(pattern.search(text) for pattern in patterns)
+
+    return scan
+
+
+def legacy_rule_scanner(rules):
+    """
+    legacy_scanner over a rule list.
+    """
+    keywords = [rule.pattern.lower() for rule in rules if rule.type == "keyword"]
+    regexes = [f"(?i:{rule.pattern})" if rule.ignore_case else rule.pattern for rule in rules if rule.type == "regex"]
+    return legacy_scanner(keywords, regexes)
+
+
+def engine_rule_scanner(rules):
+    compiled = CompiledRuleSet(rules)
+    return lambda text: bool(compiled.scan(text))
+
+
+def flat_alternation_scanner(keywords):
+    """
+    All keywords in one regex, but as a flat alternation without prefix sharing.
+    """
+    pattern = re.compile("|".join(re.escape(k) for k in keywords) + "|" + EMAIL_PATTERN, re.IGNORECASE)
+    return lambda text: pattern.search(text) is not None
+
+
+def engine_scanner(keywords):
+    rules = [Rule(f"kw-{i}", "keyword", k, "block", "unsafe", "", True) for i, k in enumerate(keywords)]
+    rules.append(Rule("pii-email", "regex", EMAIL_PATTERN, "block", "pii", "", False))
+    return engine_rule_scanner(rules)
+
+
+def self_check():
+    """
+    Checks that overlapping rules are all reported, so a block rule inside a
+    disclaimer or flag match still blocks.
+    """
+    rules = [
+        Rule("kw-illegal", "keyword", "illegal", "block", "unsafe", "blocked", True),
+        Rule("kw-dangerous", "keyword", "dangerous", "block", "unsafe", "blocked", True),
+        Rule("kw-illegal-practice", "keyword", "illegal practice", "disclaimer", "legal-advice", "note", True),
+        Rule("re-very-dangerous", "regex", r"\bvery\s+dangerous\b", "flag", "tone", "", True),
+        Rule("pii-email", "regex", EMAIL_PATTERN, "block", "pii", "blocked", False),
+    ]
+    compiled = CompiledRuleSet(rules)
+
+    found = {m.rule_id for m in compiled.scan("This is an illegal practice.")}
+    assert found == {"kw-illegal", "kw-illegal-practice"}, found
+    found = {m.rule_id for m in compiled.scan("That is very dangerous.")}
+    assert found == {"kw-dangerous", "re-very-dangerous"}, found
+
+    # Every rule still reports each of its own matches once
+    matches = compiled.scan("Mail a.b@shop.in or c@shop.in about the illegal, illegal sale.")
+    assert [m.rule_id for m in matches].count("pii-email") == 2, matches
+    assert [m.rule_id for m in matches].count("kw-illegal") == 2, matches
+
+    # Regex rules with a literal prefix are only tried where the prefix occurs,
+    # and still report what a scan of the rule on its own would
+    rules.append(Rule("re-section", "regex", r"\bsection\s+\d+(?:\(\d+\))?", "flag", "statute", "", True))
+    compiled = CompiledRuleSet(rules)
+    assert [rule.id for rule, _ in compiled.prefixed_rules["section"]] == ["re-section"]
+    text = "Under SECTION 2(9) and section 35, not subsection 4 or section seven."
+    found = [(m.start, m.text) for m in compiled.scan(text) if m.rule_id == "re-section"]
+    expected = [(m.start(), m.group()) for m in re.finditer(r"\bsection\s+\d+(?:\(\d+\))?", text, re.IGNORECASE)]
+    assert found == expected, found
+    print(" [i] Self-check passed")
+
+
+def measure(scan, text: str, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        scan(text)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Guardrail scan time as the number of rules grows.")
+    parser.add_argument("--rule-counts", default="10,100,500,1000,5000")
+    parser.add_argument("--regex-rule-counts", default="1,10,50,100,200")
+    parser.add_argument("--response-kb", type=int, default=4)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    self_check()
+    rng = random.Random(11)
+    response = (RESPONSE_PARAGRAPH * (args.response_kb * 1024 // len(RESPONSE_PARAGRAPH) + 1))[:args.response_kb * 1024]
+    scanners = {"legacy": legacy_scanner, "flat regex": flat_alternation_scanner, "trie engine": engine_scanner}
+
+    print(f"scan time (ms) of a {len(response) / 1024:.0f} KB safe response")
+    print(f"{'keyword rules':>13} " + " ".join(f"{name:>12}" for name in scanners))
+    for count in (int(c) for c in args.rule_counts.split(",")):
+        keywords = make_keywords(count, rng)
+        row = [measure(factory(keywords), response, args.repeat) * 1000 for factory in scanners.values()]
+        print(f"{count:>13} " + " ".join(f"{ms:>12.3f}" for ms in row))
+
+    rule_scanners = {"legacy": legacy_rule_scanner, "trie engine": engine_rule_scanner}
+    print(f"\n{'regex rules':>13} " + " ".join(f"{name:>12}" for name in rule_scanners))
+    for count in (int(c) for c in args.regex_rule_counts.split(",")):
+        rules = make_regex_rules(count, rng)
+        row = [measure(factory(rules), response, args.repeat) * 1000 for factory in rule_scanners.values()]
+        print(f"{count:>13} " + " ".join(f"{ms:>12.3f}" for ms in row))
+
+    shipped = load_rules(DEFAULT_RULES_PATH)
+    row = [measure(factory(shipped), response, args.repeat) * 1000 for factory in rule_scanners.values()]
+    print(f"{'rules.json':>13} " + " ".join(f"{ms:>12.3f}" for ms in row) + f"   ({len(shipped)} shipped rules)")
@@ -0,0 +1,159 @@
+import argparse
+import json
+import math
+import os
+import re
+import sys
+import tempfile
+import time
+from collections import Counter
+from typing import Dict, List, Tuple
+import numpy as np
+
+# Add the project root, chunking and RAG-Core directories to the system path to allow
+# importing the shared package, exportIndex.py, searchBackends.py and hybridSearch.py
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+sys.path.append(project_root)
+sys.path.append(os.path.join(project_root, "chunking"))
+sys.path.append(os.path.join(project_root, "RAG-Components", "RAG-Core"))
+
+from shared.bm25Index import BM25Index, document_terms, query_terms
+from exportIndex import BM25_NAME, write_index
+from searchBackends import NumpyBackend
+from hybridSearch import CrossEncoderReranker, HybridSearcher, reciprocal_rank_fusion
+from sectionChunking import SECTION
+
+DEFAULT_CHUNKS = os.path.join(project_root, "data", "chunk.json")
+DEFAULT_EMBEDDINGS = os.path.join(project_root, "data", "embed.json")
+DEFAULT_MODEL = "all-MiniLM-L6-v2"
+
+
+def labelled_queries(chunks: List[str]) -> List[Tuple[str, str, str]]:
+    """
+    Builds queries with known answers from the section headings in the
+    chunks: "what does section N say" and the section's title, each
+    answered by the chunk holding the heading.
+
+    Returns:
+        List[Tuple[str, str, str]]: (kind, query, relevant chunk ID).
+    """
+    queries = []
+    for i, text in enumerate(chunks):
+        for match in SECTION.finditer(text):
+            number = match.group("number") + match.group("suffix")
+            title = re.sub(r"\s+", " ", match.group("title")).strip()
+            queries.append(("section number", f"What does section {number} say?", f"doc_{i}"))
+            queries.append(("section title", title, f"doc_{i}"))
+    return queries
+
+
+def reference_bm25(texts: List[str], query: str, k1: float = 1.2, b: float = 0.75) -> np.ndarray:
+    """
+    Textbook BM25, one document at a time, to check the vectorized index against.
+    """
+    documents = [Counter(document_terms(text)) for text in texts]
+    average_length = sum(sum(d.values()) for d in documents) / len(documents)
+    scores = np.zeros(len(texts))
+    for term in query_terms(query):
+        frequency = sum(1 for d in documents if term in d)
+        idf = math.log(1 + (len(texts) - frequency + 0.5) / (frequency + 0.5))
+        for i, d in enumerate(documents):
+            if term in d:
+                length = sum(d.values())
+                scores[i] += idf * d[term] * (k1 + 1) / (d[term] + k1 * (1 - b + b * length / average_length))
+    return scores
+
+
+def self_check(index: BM25Index, texts: List[str], queries: List[str]):
+    for query in queries:
+        assert np.allclose(index.scores(query), reference_bm25(texts, query), rtol=1e-4, atol=1e-5), query
+    hits = index.search(queries[0], 5)
+    assert [score for _, score in hits] == sorted((score for _, score in hits), reverse=True)
+    assert reciprocal_rank_fusion([["a", "b", "c"], ["c", "a", "d"]], k=60) == ["a", "c", "b", "d"]
+    print("Self-check passed: BM25 scores match the reference implementation and fusion orders as expected.")
+
+
+def recall(found: List[List[str]], relevant: List[str], k: int) -> float:
+    return float(np.mean([answer in ids[:k] for ids, answer in zip(found, relevant)]))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Per-stage latency and recall@k of dense, BM25 and hybrid retrieval.")
+    parser.add_argument("--chunks", default=DEFAULT_CHUNKS)
+    parser.add_argument("--embeddings", default=DEFAULT_EMBEDDINGS, help="A JSON list of vectors written by embed.py.")
+    parser.add_argument("--model", default=DEFAULT_MODEL, help="The model the embeddings were made with.")
+    parser.add_argument("--candidates", type=int, default=20, help="Chunks taken from each retriever before fusion.")
+    parser.add_argument("--rerank-model", default="", help="Also measure a cross-encoder reranker, "
+                                                           "e.g. cross-encoder/ms-marco-MiniLM-L-6-v2.")
+    parser.add_argument("-k", type=int, nargs="+", default=[1, 2, 3, 5])
+    args = parser.parse_args()
+
+    with open(args.chunks, "r") as f:
+        chunks = [chunk["text"] if isinstance(chunk, dict) else chunk for chunk in json.load(f)]
+    with open(args.embeddings, "r") as f:
+        vectors = np.asarray(json.load(f), dtype=np.float32)
+    ids = [f"doc_{i}" for i in range(len(chunks))]
+    queries = labelled_queries(chunks)
+    texts = [query for _, query, _ in queries]
+    relevant = [answer for _, _, answer in queries]
+    max_k = max(args.k)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        write_index(tmp, len(ids), vectors.shape[1], iter([(ids, chunks, [None] * len(ids), vectors)]))
+        sparse = BM25Index.load(os.path.join(tmp, BM25_NAME))
+        self_check(sparse, chunks, texts[:20])
+
+        results: Dict[str, Tuple[List[List[str]], Dict[str, float]]] = {}
+        start = time.perf_counter()
+        bm25_found = [[sparse.ids[row] for row, _ in sparse.search(query, max_k)] for query in texts]
+        results["BM25 only"] = (bm25_found, {"sparse_ms": (time.perf_counter() - start) * 1000 / len(texts)})
+
+        try:
+            from sentence_transformers import SentenceTransformer
+            model = SentenceTransformer(args.model)
+        except Exception as e:
+            model = None
+            print(f" [!] Embedding model not available ({e}); skipping dense and hybrid retrieval.", file=sys.stderr)
+
+        if model is not None:
+            start = time.perf_counter()
+            embeddings = [model.encode(query, convert_to_tensor=False).tolist() for query in texts]
+            encode_ms = (time.perf_counter() - start) * 1000 / len(texts)
+            dense = NumpyBackend(tmp)
+            dense.connect()
+
+            start = time.perf_counter()
+            dense_found = [dense.query([embedding], max_k)["ids"][0] for embedding in embeddings]
+            results["dense only"] = (dense_found, {"encode_ms": encode_ms,
+                                                   "dense_ms": (time.perf_counter() - start) * 1000 / len(texts)})
+
+            configurations = [("hybrid RRF", None)]
+            if args.rerank_model:
+                configurations.append(("hybrid RRF + rerank", CrossEncoderReranker(args.rerank_model)))
+            for name, reranker in configurations:
+                hybrid = HybridSearcher(dense, os.path.join(tmp, BM25_NAME), n_candidates=args.candidates,
+                                        reranker=reranker)
+                hybrid.connect()
+                found, totals = [], Counter()
+                for query, embedding in zip(texts, embeddings):
+                    found.append(hybrid.query([query], [embedding], max_k)["ids"][0])
+                    totals.update(hybrid.last_timings)
+                stages = {stage: total / len(texts) for stage, total in totals.items()}
+                stages["encode_ms"] = encode_ms
+                results[name] = (found, stages)
+
+    kinds = sorted({kind for kind, _, _ in queries})
+    print(f"{len(chunks)} chunks, {len(queries)} labelled queries ({', '.join(kinds)})")
+    header = f"{'retriever':<22} {'query kind':<15}" + "".join(f" {'R@' + str(k):>6}" for k in args.k)
+    print(header)
+    for name, (found, _) in results.items():
+        for kind in kinds + ["all"]:
+            rows = [i for i, (query_kind, _, _) in enumerate(queries) if kind in ("all", query_kind)]
+            print(f"{name:<22} {kind:<15}" + "".join(
+                f" {recall([found[i] for i in rows], [relevant[i] for i in rows], k):>6.2f}" for k in args.k))
+    print()
+    stage_names = ["encode_ms", "dense_ms", "sparse_ms", "fuse_ms", "rerank_ms"]
+    print(f"{'retriever':<22}" + "".join(f" {name[:-3] + ' ms':>10}" for name in stage_names))
+    for name, (_, stages) in results.items():
+        print(f"{name:<22}" + "".join(f" {stages[s]:>10.3f}" if s in stages else f" {'-':>10}" for s in stage_names))
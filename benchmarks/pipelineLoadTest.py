@@ -0,0 +1,377 @@
+import argparse
+import contextlib
+import importlib.util
+import json
+import os
+import platform
+import random
+import sys
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+# Add the project root and each stage's directory to the system path to allow
+# importing the shared package and the stage modules
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+sys.path.append(project_root)
+sys.path.append(os.path.join(project_root, "RAG-Components", "PII-filter"))
+sys.path.append(os.path.join(project_root, "RAG-Components", "RAG-Core"))
+sys.path.append(os.path.join(project_root, "LLM", "v1"))
+sys.path.append(os.path.join(project_root, "external-guardtail", "v1"))
+
+from shared.envelope import LatencyStats, dumps, new_envelope, parse_envelope, percentile
+from shared.flowControl import PRIORITY_HIGH, UNLIMITED, FlowControl, QueueFullError
+from shared.instrumentation import EXPIRED
+from shared.memoryQueueManager import MemoryBroker, MemoryQueueManager
+from mockOllama import DEFAULT_RESPONSE, serve
+
+DEFAULT_CHROMA_PATH = os.path.join(project_root, "data", "chroma_data")
+DEFAULT_OUTPUT_DIR = os.path.join(current_dir, "results")
+STAGE_QUEUES = [("pii_filter", "pii_redaction_queue"), ("rag_core", "rag_core_queue"),
+                ("llm", "llm_queue"), ("guardrail", "guardrail_queue")]
+# "fifo" runs the pipeline as it was before flow control (unbounded FIFO
+# queues, no deadlines); "flow-control" bounds the queues, sends requests
+# with a deadline, and turns on priority lanes and backpressure.
+MODES = ("fifo", "flow-control")
+
+# Synthetic consumer complaints: a grievance about a product or service, a
+# question about the remedy, and the kind of personal details users paste in
+# (which the PII filter has to find)
+COMPLAINTS = [
+    "I bought a {product} from {seller} and it {defect} within {days} days.",
+    "{seller} charged me twice for a {product} and refuses to refund the second payment.",
+    "The {product} I ordered from {seller} was never delivered even though it shows delivered.",
+    "{seller} sold me a {product} at more than the MRP printed on the box.",
+    "My {product} from {seller} {defect} and the service centre says the warranty does not cover it.",
+]
+QUESTIONS = [
+    "How do I file a complaint with the District Commission?",
+    "Can I get a refund or a replacement?",
+    "What is the time limit for filing a consumer complaint?",
+    "Is this an unfair trade practice?",
+    "Can I claim compensation under product liability?",
+    "Which Commission should I approach for this amount?",
+]
+PRODUCTS = ["washing machine", "mobile phone", "laptop", "refrigerator", "air conditioner", "pair of shoes",
+            "television", "microwave oven"]
+SELLERS = ["an online marketplace", "a local electronics shop", "the brand's website", "a dealer"]
+DEFECTS = ["stopped working", "caught fire", "started leaking", "arrived broken", "overheats"]
+NAMES = ["Rahul Sharma", "Priya Nair", "Anil Kumar", "Sneha Reddy", "Vikram Singh"]
+# Follow-ups that turn a complaint into a long analysis of what happened
+TIMELINE = [
+    "I contacted customer care on {days} different occasions and each time they promised a call back that never came.",
+    "The seller first asked me to send photographs, then asked for the original invoice, then stopped replying.",
+    "I have the invoice, the warranty card, the courier receipt and screenshots of every chat with their support team.",
+    "A technician visited after {days} days, said a part had to be ordered, and nobody has come back since.",
+    "I also sent a written notice by registered post and the acknowledgement card came back signed.",
+]
+# Shares of quick questions and long analyses in the workload; the rest are single complaints
+SHORT_SHARE = 0.3
+LONG_SHARE = 0.3
+
+
+def synthetic_query(rng: random.Random) -> str:
+    """
+    Returns one complaint with a question and, most of the time, contact details.
+    """
+    complaint = rng.choice(COMPLAINTS).format(product=rng.choice(PRODUCTS), seller=rng.choice(SELLERS),
+                                              defect=rng.choice(DEFECTS), days=rng.randint(2, 90))
+    text = f"{complaint} {rng.choice(QUESTIONS)}"
+    if rng.random() < 0.7:
+        name = rng.choice(NAMES)
+        text += (f" My name is {name}, phone {rng.choice('6789')}{rng.randint(100000000, 999999999)}, "
+                 f"e-mail {name.split()[0].lower()}{rng.randint(1, 99)}@example.com, "
+                 f"order no. OD{rng.randint(10 ** 11, 10 ** 12 - 1)}.")
+    return text
+
+
+def long_analysis(rng: random.Random) -> str:
+    """
+    Returns a complaint followed by several paragraphs of history, as users
+    paste when they want their whole case analysed.
+    """
+    lines = rng.sample(TIMELINE, rng.randint(3, len(TIMELINE)))
+    history = " ".join(line.format(days=rng.randint(2, 9)) for line in lines)
+    return f"{synthetic_query(rng)} {history} Please analyse my case and tell me every remedy I have."
+
+
+def workload(seed: int, rate: float, count: int, arrival: str) -> List[Tuple[float, str]]:
+    """
+    Returns the (send offset in seconds, query) schedule for one run: a mix of
+    quick questions, single complaints and long analyses. The same seed, rate
+    and count always give the same schedule.
+    """
+    rng = random.Random(f"{seed}:{rate}:{count}")
+    schedule, offset = [], 0.0
+    for _ in range(count):
+        kind = rng.random()
+        if kind < SHORT_SHARE:
+            query = rng.choice(QUESTIONS)
+        elif kind < SHORT_SHARE + LONG_SHARE:
+            query = long_analysis(rng)
+        else:
+            query = synthetic_query(rng)
+        schedule.append((offset, query))
+        offset += rng.expovariate(rate) if arrival == "poisson" else 1.0 / rate
+    return schedule
+
+
+def load_module(name: str, path: str):
+    """
+    Imports a stage script by path; RAG-Core.py and PII-filtering.py are not valid module names.
+    """
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class ServiceTimes:
+    """
+    Records how long each stage's callback ran, and when, across all its consumer threads.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples: Dict[str, List[Tuple[float, float]]] = {stage: [] for stage, _ in STAGE_QUEUES}
+
+    def wrap(self, stage: str, callback):
+        def timed(ch, method, properties, body):
+            start = time.perf_counter()
+            try:
+                return callback(ch, method, properties, body)
+            finally:
+                end = time.perf_counter()
+                with self.lock:
+                    self.samples[stage].append((start, end))
+        return timed
+
+    def report(self) -> Dict[str, Dict[str, float]]:
+        report = {}
+        for stage, samples in self.samples.items():
+            durations = [(end - start) * 1000 for start, end in samples]
+            busy = max((end for _, end in samples), default=0.0) - min((start for start, _ in samples), default=0.0)
+            report[stage] = {"count": len(samples), "throughput_rps": len(samples) / busy if busy > 0 else 0.0,
+                             "service_p50_ms": percentile(durations, 50),
+                             "service_p99_ms": percentile(durations, 99)}
+        return report
+
+
+def expired_total() -> float:
+    return sum(EXPIRED.values.values())
+
+
+def lane_report(envelopes: List[Dict]) -> Dict[str, Dict[str, float]]:
+    """
+    Returns the end-to-end latency of the completed requests in each priority lane.
+    """
+    lanes: Dict[str, List[float]] = {"short": [], "long": []}
+    for envelope in envelopes:
+        stamps = envelope["timestamps"]
+        lane = "short" if envelope.get("priority") == PRIORITY_HIGH else "long"
+        lanes[lane].append((stamps[-1][1] - stamps[0][1]) * 1000)
+    return {lane: {"count": len(values), "p50": percentile(values, 50), "p99": percentile(values, 99)}
+            for lane, values in lanes.items()}
+
+
+def run_load(stages: Dict[str, Any], rate: float, schedule: List[Tuple[float, str]], workers: Dict[str, int],
+             timeout: float, mode: str = "fifo", flow_control: FlowControl = UNLIMITED,
+             deadline_s: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Runs the four stages on their own consumer threads over a fresh in-memory
+    broker, sends the schedule from a client, and collects every final reply.
+    A run ends when every request has been answered, turned away at the
+    ingress queue, answered busy by a stage whose next queue was full,
+    dropped past its deadline or dropped after failing.
+    """
+    broker = MemoryBroker()
+    service = ServiceTimes()
+    callbacks = {"pii_filter": stages["pii_filter"].pii_redact_callback,
+                 "rag_core": stages["rag_core"].rag_core_callback,
+                 "llm": stages["llm"].llm_callback,
+                 "guardrail": stages["guardrail"].guardrail_callback}
+    threads = []
+    for stage, queue_name in STAGE_QUEUES:
+        stages[stage].bind_queue_manager(MemoryQueueManager(broker, flow_control=flow_control))
+        MemoryQueueManager(broker, flow_control=flow_control).declare_queue(queue_name)
+    for stage, queue_name in STAGE_QUEUES:
+        for _ in range(workers[stage]):
+            consumer = MemoryQueueManager(broker, flow_control=flow_control)
+            thread = threading.Thread(target=consumer.start_listening,
+                                      args=(queue_name, service.wrap(stage, callbacks[stage])), daemon=True)
+            thread.start()
+            threads.append(thread)
+
+    client = MemoryQueueManager(broker, flow_control=flow_control)
+    reply_queue = client.declare_reply_queue()
+    latencies = LatencyStats()
+    completed: Dict[str, Dict] = {}
+    busy: Dict[str, Dict] = {}
+    max_depths: Dict[str, int] = {}
+    rejected = 0
+    expired_before = expired_total()
+
+    def accounted() -> float:
+        return len(completed) + len(busy) + (expired_total() - expired_before) + broker.stats["dropped"]
+
+    def collect():
+        while accounted() < len(schedule) - rejected and not broker.closed:
+            delivery = broker.get(reply_queue, timeout=0.1)
+            for queue_name, depth in broker.depths().items():
+                max_depths[queue_name] = max(max_depths.get(queue_name, 0), depth)
+            if delivery is None:
+                continue
+            envelope = parse_envelope(delivery[2])
+            # Streamed tokens carry a "type"; the guardrail's final reply is the whole envelope
+            if "type" in envelope:
+                continue
+            if envelope.get("busy"):
+                busy[envelope["correlation_id"]] = envelope
+            else:
+                completed[envelope["correlation_id"]] = envelope
+                latencies.record(envelope)
+
+    collector = threading.Thread(target=collect, daemon=True)
+    collector.start()
+    started = time.perf_counter()
+    for offset, query in schedule:
+        delay = started + offset - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        try:
+            client.send_message("pii_redaction_queue", dumps(new_envelope(query, reply_queue, deadline_s=deadline_s)))
+        except QueueFullError:
+            rejected += 1
+    collector.join(max(0.0, timeout - (time.perf_counter() - started)))
+    duration = time.perf_counter() - started
+    broker.shutdown()
+    for thread in threads:
+        thread.join(1.0)
+
+    late = sum(1 for envelope in completed.values()
+               if deadline_s is not None and envelope["timestamps"][-1][1] > envelope["deadline"])
+    return {
+        "mode": mode,
+        "rate_rps": rate,
+        "offered": len(schedule),
+        "completed": len(completed),
+        "rejected": rejected,
+        "busy": len(busy),
+        "expired": int(expired_total() - expired_before),
+        "late": late,
+        "duration_s": duration,
+        "throughput_rps": len(completed) / duration if duration else 0.0,
+        "stages": service.report(),
+        "hops": latencies.report(),
+        "lanes": lane_report(list(completed.values())),
+        "max_queue_depth": {name: depth for name, depth in max_depths.items() if not name.startswith("amq.gen")},
+        "broker": dict(broker.stats),
+    }
+
+
+def print_run(run: Dict[str, Any], previous: Dict[str, Any] = None):
+    end_to_end = run["hops"].get("end_to_end", {})
+    line = (f"{run['mode']}, rate {run['rate_rps']:g}/s: {run['completed']}/{run['offered']} completed in "
+            f"{run['duration_s']:.1f}s, {run['throughput_rps']:.2f} req/s, "
+            f"end-to-end p50 {end_to_end.get('p50', 0):.0f} ms p99 {end_to_end.get('p99', 0):.0f} ms")
+    if previous:
+        before = previous["hops"].get("end_to_end", {}).get("p99", 0)
+        line += f" (p99 {end_to_end.get('p99', 0) - before:+.0f} ms vs previous)"
+    print(line)
+    print(f"  rejected {run['rejected']}, answered busy {run['busy']}, expired {run['expired']}, "
+          f"answered after the deadline {run['late']}, dead-lettered {run['broker']['dead_lettered']}")
+    for lane, row in run["lanes"].items():
+        print(f"  {lane + ' queries':<14} {row['count']:>6} completed, end-to-end p50 {row['p50']:.0f} ms "
+              f"p99 {row['p99']:.0f} ms")
+    print(f"  {'stage':<12} {'count':>6} {'msg/s':>8} {'svc p50 ms':>11} {'svc p99 ms':>11} {'max depth':>10}")
+    for stage, queue_name in STAGE_QUEUES:
+        s = run["stages"][stage]
+        print(f"  {stage:<12} {s['count']:>6} {s['throughput_rps']:>8.2f} {s['service_p50_ms']:>11.1f} "
+              f"{s['service_p99_ms']:>11.1f} {run['max_queue_depth'].get(queue_name, 0):>10}")
+    print(f"  {'hop':<36} {'p50 ms':>9} {'p99 ms':>9}")
+    for hop, row in run["hops"].items():
+        print(f"  {hop:<36} {row['p50']:>9.1f} {row['p99']:>9.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="End-to-end load test of PII filter -> RAG-Core -> LLM -> guardrail "
+                                                 "with an in-memory broker, a local Chroma directory and a mock Ollama.")
+    parser.add_argument("--rates", type=float, nargs="+", default=[1.0, 2.0, 4.0], help="Arrival rates in requests/s.")
+    parser.add_argument("--requests", type=int, default=50, help="Requests sent per rate.")
+    parser.add_argument("--arrival", choices=("poisson", "uniform"), default="poisson")
+    parser.add_argument("--seed", type=int, default=2019)
+    parser.add_argument("--chroma-path", default=DEFAULT_CHROMA_PATH)
+    parser.add_argument("--token-delay-ms", type=float, default=20.0)
+    parser.add_argument("--first-token-delay-ms", type=float, default=100.0)
+    parser.add_argument("--llm-workers", type=int, default=4, help="Concurrent generations (LLM_CONCURRENCY).")
+    parser.add_argument("--rag-workers", type=int, default=1)
+    parser.add_argument("--caches", action="store_true",
+                        help="Keep RAG-Core's query cache and the LLM answer cache on (off by default so every "
+                             "request takes the full path).")
+    parser.add_argument("--modes", choices=MODES, nargs="+", default=list(MODES),
+                        help="Run each rate without flow control (fifo) and/or with it (flow-control).")
+    parser.add_argument("--deadline-s", type=float, default=10.0,
+                        help="Deadline sent with each request in flow-control mode.")
+    parser.add_argument("--max-length", type=int, default=64,
+                        help="Length limit of each pipeline queue in flow-control mode.")
+    parser.add_argument("--overflow", choices=("reject", "dead-letter"), default="reject")
+    parser.add_argument("--high-water", type=int, default=8,
+                        help="Backlog at which stages hold back publishes in flow-control mode.")
+    parser.add_argument("--timeout", type=float, default=300.0, help="Seconds to wait for each run to drain.")
+    parser.add_argument("--output", default="", help="Results JSON (default: benchmarks/results/pipeline-<time>.json).")
+    parser.add_argument("--compare", default="", help="A previous results JSON to compare p99 latency against.")
+    parser.add_argument("--verbose", action="store_true", help="Show the stages' own per-message output.")
+    args = parser.parse_args()
+
+    server = serve(0, DEFAULT_RESPONSE, args.token_delay_ms, args.first_token_delay_ms)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    # The stages read their configuration when they are imported
+    os.environ["OLLAMA_URL"] = f"http://127.0.0.1:{server.server_address[1]}/api/generate"
+    os.environ["CHROMA_PATH"] = args.chroma_path
+    os.environ["LLM_CONCURRENCY"] = str(args.llm_workers)
+    if not args.caches:
+        os.environ["RAG_CACHE_SIZE"] = "0"
+        os.environ["LLM_ANSWER_CACHE_SIZE"] = "0"
+
+    stages = {
+        "pii_filter": load_module("pii_filtering", os.path.join(project_root, "RAG-Components", "PII-filter", "PII-filtering.py")),
+        "rag_core": load_module("rag_core", os.path.join(project_root, "RAG-Components", "RAG-Core", "RAG-Core.py")),
+        "llm": load_module("llmWorker", os.path.join(project_root, "LLM", "v1", "llmWorker.py")),
+        "guardrail": load_module("guardtailv1", os.path.join(project_root, "external-guardtail", "v1", "guardtailv1.py")),
+    }
+    # Load the embedding model and open the collection before the clock starts
+    stages["rag_core"].get_retriever()
+    workers = {"pii_filter": 1, "rag_core": args.rag_workers, "llm": args.llm_workers, "guardrail": 1}
+
+    previous_runs = {}
+    if args.compare:
+        with open(args.compare, "r") as f:
+            previous_runs = {(run.get("mode", "fifo"), run["rate_rps"]): run for run in json.load(f)["runs"]}
+
+    flow_control = FlowControl(max_length=args.max_length, overflow=args.overflow, priorities=True,
+                               high_water=args.high_water, max_wait_s=args.deadline_s)
+    started_at = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+    runs = []
+    for rate in args.rates:
+        schedule = workload(args.seed, rate, args.requests, args.arrival)
+        for mode in args.modes:
+            options = {"flow_control": flow_control, "deadline_s": args.deadline_s} if mode == "flow-control" else {}
+            with contextlib.ExitStack() as stack:
+                if not args.verbose:
+                    stack.enter_context(contextlib.redirect_stdout(stack.enter_context(open(os.devnull, "w"))))
+                run = run_load(stages, rate, schedule, workers, args.timeout, mode=mode, **options)
+            runs.append(run)
+            print_run(run, previous_runs.get((mode, rate)))
+    server.shutdown()
+
+    results = {
+        "started_at": started_at,
+        "python": platform.python_version(),
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "compare", "verbose")},
+        "runs": runs,
+    }
+    output = args.output or os.path.join(DEFAULT_OUTPUT_DIR, time.strftime("pipeline-%Y%m%d-%H%M%S.json"))
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to '{output}'.")
@@ -0,0 +1,106 @@
+import argparse
+import os
+import sys
+from typing import List
+
+# Add the project root, chunking and RAG-Core directories to the system path to allow
+# importing the shared package, fixedSizeChunking.py and promptBuilder.py
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+sys.path.append(project_root)
+sys.path.append(os.path.join(project_root, "chunking"))
+sys.path.append(os.path.join(project_root, "RAG-Components", "RAG-Core"))
+
+from shared.bm25Index import BM25Index
+from fixedSizeChunking import iter_chunks
+from promptBuilder import ContextChunk, PromptBuilder, make_token_counter, merge_chunks
+
+DEFAULT_PDF = os.path.join(project_root, "data", "eng201935.pdf")
+SAMPLE_QUERIES = [
+    "How do I file a complaint with the District Commission?",
+    "Can I get a refund for a defective product?",
+    "What is the time limit for filing a consumer complaint?",
+    "What are the objects of the Central Consumer Protection Council?",
+    "Who can file a complaint under the Consumer Protection Act?",
+    "What is product liability?",
+    "Can I appeal against an order of the State Commission?",
+    "What are unfair trade practices?",
+    "What does section 35 say?",
+    "What does section 2 say about defects and deficiency?",
+]
+
+
+def retrieve(index: BM25Index, chunks, query: str, k: int, with_offsets: bool) -> List[ContextChunk]:
+    """
+    Retrieves with BM25, which needs no embedding model, and returns the hits
+    the way the Retriever hands them to the prompt builder.
+    """
+    hits = []
+    for rank, (row, _) in enumerate(index.search(query, k)):
+        chunk = chunks[row]
+        if with_offsets:
+            hits.append(ContextChunk(chunk.text, rank, chunk.source, chunk.char_start, chunk.char_end))
+        else:
+            hits.append(ContextChunk(chunk.text, rank))
+    return hits
+
+
+def self_check(chunks, count_tokens):
+    """
+    Merging neighbouring chunks must reproduce the document text exactly,
+    from offsets and from the overlapping text alike, and a budgeted prompt
+    must stay within its budget.
+    """
+    document = chunks[0].text
+    for chunk in chunks[1:40]:
+        document = document[:chunk.char_start] + chunk.text
+    window = chunks[10:16]
+    by_offsets = merge_chunks([ContextChunk(c.text, i, c.source, c.char_start, c.char_end) for i, c in enumerate(window)])
+    by_text = merge_chunks([ContextChunk(c.text, i) for i, c in enumerate(reversed(window))])
+    expected = document[window[0].char_start:window[-1].char_end]
+    assert len(by_offsets) == 1 and by_offsets[0].text == expected
+    assert len(by_text) == 1 and by_text[0].text == expected
+    duplicated = [ContextChunk(window[0].text, 0), ContextChunk(window[0].text, 1)]
+    assert len(merge_chunks(duplicated)) == 1
+    for budget in (128, 256, 512):
+        prompt, stats = PromptBuilder(budget, count_tokens=count_tokens).build(
+            "What is product liability?", [ContextChunk(c.text, i) for i, c in enumerate(chunks[::7][:10])])
+        assert count_tokens(prompt) <= budget and stats["prompt_tokens"] <= budget
+    print("Self-check passed: merged chunks match the document text and prompts stay within budget.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Tokens saved per query by merging, deduplication and a token budget.")
+    parser.add_argument("--pdf", default=DEFAULT_PDF)
+    parser.add_argument("-k", type=int, default=5, help="Chunks retrieved per query.")
+    parser.add_argument("--budgets", type=int, nargs="+", default=[0, 512, 256], help="Prompt budgets; 0 is no limit.")
+    parser.add_argument("--tokenizer", default="", help="Hugging Face tokenizer of the LLM (default: approximate).")
+    parser.add_argument("--order", choices=("score", "position"), default="score")
+    args = parser.parse_args()
+
+    count_tokens = make_token_counter(args.tokenizer)
+    chunks = list(iter_chunks(args.pdf))
+    index = BM25Index.build([str(i) for i in range(len(chunks))], [chunk.text for chunk in chunks])
+    self_check(chunks, count_tokens)
+
+    print(f"{len(chunks)} chunks, {args.k} retrieved per query, tokens counted with "
+          f"{args.tokenizer or 'the approximate counter'}")
+    header = f"{'query':<46} {'offsets':>7} {'naive':>6}" + "".join(f" {'saved@' + (str(b) if b else 'inf'):>10}" for b in args.budgets)
+    print(header)
+    totals = {}
+    for with_offsets in (True, False):
+        for query in SAMPLE_QUERIES:
+            hits = retrieve(index, chunks, query, args.k, with_offsets)
+            row = []
+            naive = None
+            for budget in args.budgets:
+                _, stats = PromptBuilder(budget, args.order, count_tokens).build(query, hits)
+                naive = stats["prompt_tokens"] + stats["tokens_saved"]
+                row.append(stats["tokens_saved"])
+                key = (with_offsets, budget)
+                totals[key] = totals.get(key, 0) + stats["tokens_saved"]
+            print(f"{query[:46]:<46} {'yes' if with_offsets else 'no':>7} {naive:>6}" + "".join(f" {saved:>10}" for saved in row))
+    print()
+    for with_offsets in (True, False):
+        print(f"mean tokens saved per query ({'with' if with_offsets else 'without'} offsets): " + ", ".join(
+            f"{totals[(with_offsets, b)] / len(SAMPLE_QUERIES):.0f} at budget {b or 'none'}" for b in args.budgets))
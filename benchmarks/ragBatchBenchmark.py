@@ -0,0 +1,59 @@
+import argparse
+import os
+import sys
+import time
+
+# Add the RAG-Core directory to the system path to allow importing retriever.py,
+# and the project root for the shared package it uses
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(current_dir))
+sys.path.append(os.path.join(os.path.dirname(current_dir), "RAG-Components", "RAG-Core"))
+
+from retriever import Retriever
+
+SAMPLE_QUERIES = [
+    "How do I file a complaint with the District Commission?",
+    "Can I get a refund for a defective product?",
+    "What is the time limit for filing a consumer complaint?",
+    "What are the objects of the Central Consumer Protection Council?",
+    "Who can file a complaint under the Consumer Protection Act?",
+    "What is product liability?",
+    "Can I appeal against an order of the State Commission?",
+    "What are unfair trade practices?",
+]
+
+
+def run_benchmark(retriever: Retriever, batch_sizes, total_queries: int):
+    """
+    Measures end-to-end RAG throughput (encode + search + prompt build) for
+    each batch size over the same workload.
+
+    Args:
+        retriever (Retriever): A warm retriever.
+        batch_sizes: The batch sizes to compare.
+        total_queries (int): The number of queries to run per batch size.
+    """
+    queries = [SAMPLE_QUERIES[i % len(SAMPLE_QUERIES)] for i in range(total_queries)]
+    print(f"{'batch':>6} {'queries/s':>10} {'ms/query':>9} {'encode ms':>10} {'search ms':>10}")
+    for batch_size in batch_sizes:
+        encode_ms = search_ms = 0.0
+        start = time.perf_counter()
+        for i in range(0, len(queries), batch_size):
+            retriever.run_queries(queries[i:i + batch_size])
+            encode_ms += retriever.last_timings['encode_ms']
+            search_ms += retriever.last_timings['search_ms']
+        elapsed = time.perf_counter() - start
+        print(f"{batch_size:>6} {len(queries) / elapsed:>10.1f} {elapsed * 1000 / len(queries):>9.2f} "
+              f"{encode_ms:>10.0f} {search_ms:>10.0f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Throughput of batched RAG retrieval against batch size.")
+    parser.add_argument("--host", default=os.getenv("CHROMA_HOST", "localhost"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("CHROMA_PORT", 8000)))
+    parser.add_argument("--queries", type=int, default=256, help="Queries per batch size.")
+    parser.add_argument("--batch-sizes", default="1,2,4,8,16,32,64")
+    args = parser.parse_args()
+
+    retriever = Retriever(chroma_host=args.host, chroma_port=args.port)
+    run_benchmark(retriever, [int(b) for b in args.batch_sizes.split(",")], args.queries)
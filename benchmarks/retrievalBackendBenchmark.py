@@ -0,0 +1,186 @@
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from typing import Dict, List
+import numpy as np
+
+# Add the chunking and RAG-Core directories to the system path to allow importing
+# exportIndex.py, chromaWriter.py and searchBackends.py
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+sys.path.append(os.path.join(project_root, "chunking"))
+sys.path.append(os.path.join(project_root, "RAG-Components", "RAG-Core"))
+
+from exportIndex import write_index
+from searchBackends import NumpyBackend, SearchBackend
+
+DEFAULT_CHUNKS = os.path.join(project_root, "data", "chunk.json")
+DEFAULT_EMBEDDINGS = os.path.join(project_root, "data", "embed.json")
+
+
+def load_corpus(chunks_path: str, embeddings_path: str, replicate: int, seed: int = 0):
+    """
+    Loads the chunks and their embeddings. With `replicate` > 1 the corpus is
+    repeated with a little noise on each copy, so a larger corpus can be
+    simulated without every copy tying with the original.
+    """
+    with open(chunks_path, "r") as f:
+        chunks = [chunk["text"] if isinstance(chunk, dict) else chunk for chunk in json.load(f)]
+    with open(embeddings_path, "r") as f:
+        vectors = np.asarray(json.load(f), dtype=np.float32)
+    rng = np.random.default_rng(seed)
+    copies = [vectors] + [vectors + rng.normal(0, 0.02, vectors.shape).astype(np.float32) for _ in range(replicate - 1)]
+    vectors = np.concatenate(copies)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return [f"doc_{i}" for i in range(len(vectors))], chunks * replicate, vectors
+
+
+def make_queries(vectors: np.ndarray, count: int, noise: float, seed: int = 1) -> np.ndarray:
+    """
+    Builds query vectors near random corpus rows. The repository ships
+    embeddings but no query log, and this keeps the benchmark free of the
+    embedding model; recall is measured against exact search either way.
+    """
+    rng = np.random.default_rng(seed)
+    queries = vectors[rng.integers(0, len(vectors), count)] + rng.normal(0, noise, (count, vectors.shape[1]))
+    return (queries / np.linalg.norm(queries, axis=1, keepdims=True)).astype(np.float32)
+
+
+def exact_ids(ids: List[str], vectors: np.ndarray, queries: np.ndarray, k: int) -> List[List[str]]:
+    scores = queries.astype(np.float64) @ vectors.astype(np.float64).T
+    return [[ids[i] for i in np.argsort(-row, kind="stable")[:k]] for row in scores]
+
+
+def recall_at_k(found: List[List[str]], truth: List[List[str]]) -> float:
+    return float(np.mean([len(set(f) & set(t)) / len(t) for f, t in zip(found, truth)]))
+
+
+def measure(backend: SearchBackend, queries: np.ndarray, k: int, batch_size: int) -> Dict[str, float]:
+    """
+    Returns single-query latency percentiles, batched throughput and the
+    IDs found for each query.
+    """
+    backend.query(queries[:1].tolist(), k)
+    latencies = []
+    found: List[List[str]] = []
+    for query in queries:
+        start = time.perf_counter()
+        result = backend.query([query.tolist()], k)
+        latencies.append((time.perf_counter() - start) * 1000)
+        found.extend(result["ids"])
+    start = time.perf_counter()
+    for i in range(0, len(queries), batch_size):
+        backend.query(queries[i:i + batch_size].tolist(), k)
+    batch_seconds = time.perf_counter() - start
+    return {"p50_ms": float(np.percentile(latencies, 50)), "p99_ms": float(np.percentile(latencies, 99)),
+            "queries_per_second": len(queries) / batch_seconds, "found": found}
+
+
+class _ChromaCollectionBackend(SearchBackend):
+    """
+    Benchmark adapter for an already open collection, such as a temporary
+    PersistentClient; RAG-Core's ChromaBackend connects over HTTP only.
+    """
+    def __init__(self, collection):
+        self.collection = collection
+
+    def query(self, query_embeddings, n_results):
+        return self.collection.query(query_embeddings=query_embeddings, n_results=n_results)
+
+
+def chroma_backend(target: str, ids: List[str], documents: List[str], vectors: np.ndarray, tmp: str):
+    """
+    Returns a backend for ChromaDB: the server at an http:// target through
+    RAG-Core's ChromaBackend, or, without a target, a temporary local
+    collection loaded with the benchmark corpus. None if chromadb is not installed.
+    """
+    try:
+        import chromadb
+    except ImportError:
+        print(" [!] chromadb is not installed; skipping the ChromaDB backend.", file=sys.stderr)
+        return None
+    if target:
+        from urllib.parse import urlparse
+        from searchBackends import ChromaBackend
+        url = urlparse(target)
+        backend = ChromaBackend(url.hostname, url.port or 8000)
+        return backend if backend.connect() else None
+    from chromaWriter import BatchedUpserter, array_batches
+    client = chromadb.PersistentClient(path=os.path.join(tmp, "chroma"))
+    collection = client.create_collection(name="benchmark", metadata={"hnsw:space": "cosine"})
+    BatchedUpserter(collection).write(len(ids), array_batches(ids, documents, None, vectors))
+    return _ChromaCollectionBackend(collection)
+
+
+def self_check(backend: NumpyBackend, ids: List[str], vectors: np.ndarray, queries: np.ndarray, k: int):
+    """
+    The exact in-process backend must return exactly the float64 brute-force
+    top-k, with matching texts and cosine distances, in ChromaDB's result shape.
+    """
+    result = backend.query(queries[:20].tolist(), k)
+    assert set(result) >= {"ids", "documents", "metadatas", "distances"}
+    assert result["ids"] == exact_ids(ids, vectors, queries[:20], k), "exact search disagrees with brute force"
+    for row_ids, distances, query in zip(result["ids"], result["distances"], queries[:20]):
+        expected = [1.0 - float(vectors[int(row_id[4:])] @ query) for row_id in row_ids]
+        assert np.allclose(distances, expected, atol=1e-5) and distances == sorted(distances)
+    print("Self-check passed: exact in-process search matches brute force.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Latency and recall@k of the ChromaDB and in-process retrieval backends.")
+    parser.add_argument("--chunks", default=DEFAULT_CHUNKS)
+    parser.add_argument("--embeddings", default=DEFAULT_EMBEDDINGS, help="A JSON list of vectors written by embed.py.")
+    parser.add_argument("--replicate", type=int, default=1, help="Repeat the corpus to simulate a larger one.")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--noise", type=float, default=0.05, help="Distance of the queries from their corpus rows.")
+    parser.add_argument("-k", type=int, default=3, help="Results per query (RAG-Core uses 3).")
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 8], help="IVF clusters searched per query.")
+    parser.add_argument("--chroma", default="", help="http://host:port of a ChromaDB server holding the same "
+                                                    "rows; default is a temporary local collection.")
+    args = parser.parse_args()
+
+    ids, documents, vectors = load_corpus(args.chunks, args.embeddings, args.replicate)
+    queries = make_queries(vectors, args.queries, args.noise)
+    truth = exact_ids(ids, vectors, queries, args.k)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        index_dir = os.path.join(tmp, "index")
+        write_index(index_dir, len(ids), vectors.shape[1],
+                    iter([(ids, documents, [None] * len(ids), vectors)]))
+
+        backends = []
+        exact = NumpyBackend(index_dir)
+        start = time.perf_counter()
+        exact.connect()
+        backends.append(("numpy exact (mmap)", exact, (time.perf_counter() - start) * 1000))
+        self_check(exact, ids, vectors, queries, args.k)
+        for n_probe in args.nprobe:
+            ivf = NumpyBackend(index_dir, ann="ivf", n_probe=n_probe)
+            start = time.perf_counter()
+            ivf.connect()
+            backends.append((f"numpy IVF nprobe={ivf.index.n_probe}/{ivf.index.n_lists}", ivf,
+                             (time.perf_counter() - start) * 1000))
+        try:
+            import hnswlib  # noqa: F401
+            hnsw = NumpyBackend(index_dir, ann="hnsw")
+            start = time.perf_counter()
+            hnsw.connect()
+            backends.append(("numpy HNSW (hnswlib)", hnsw, (time.perf_counter() - start) * 1000))
+        except ImportError:
+            print(" [!] hnswlib is not installed; skipping the HNSW index.", file=sys.stderr)
+        start = time.perf_counter()
+        chroma = chroma_backend(args.chroma, ids, documents, vectors, tmp)
+        if chroma is not None:
+            backends.append(("chromadb" + (" (server)" if args.chroma else " (local)"), chroma,
+                             (time.perf_counter() - start) * 1000))
+
+        print(f"{len(ids)} vectors x {vectors.shape[1]} dimensions, {len(queries)} queries, k={args.k}")
+        print(f"{'backend':<30} {'load ms':>9} {'p50 ms':>8} {'p99 ms':>8} {'q/s batched':>12} {'recall@k':>9}")
+        for name, backend, load_ms in backends:
+            stats = measure(backend, queries, args.k, args.batch_size)
+            print(f"{name:<30} {load_ms:>9.1f} {stats['p50_ms']:>8.3f} {stats['p99_ms']:>8.3f} "
+                  f"{stats['queries_per_second']:>12.0f} {recall_at_k(stats['found'], truth):>9.3f}")
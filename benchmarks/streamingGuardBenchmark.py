@@ -0,0 +1,61 @@
+import argparse
+import os
+import re
+import sys
+import time
+
+# Add the guardrail directory to the system path to allow importing the guardrail modules
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(os.path.dirname(current_dir), "external-guardtail", "v1"))
+
+from streamingGuard import StreamingGuard
+
+RESPONSE_PARAGRAPH = (
+    "Under the Consumer Protection Act, 2019, a consumer may file a complaint with the District "
+    "Commission where the value of the goods or services paid as consideration does not exceed one "
+    "crore rupees. The complaint may be filed electronically and should describe the defect in the "
+    "goods or the deficiency in service, the relief sought, and include copies of the invoice. "
+)
+
+
+def tokenize(text: str):
+    """
+    Splits text into pieces shaped like LLM tokens: a word with its leading space.
+    """
+    return re.findall(r"\s*\S+", text)
+
+
+def measure(tokens, token_delay_ms: float, window: int):
+    """
+    Replays tokens as if one arrived every `token_delay_ms` and returns
+    (time until the first text is shown, guard cost per token in microseconds)
+    for streaming, and the time a whole-response check would show text.
+    """
+    guard = StreamingGuard(window=window)
+    first_shown_ms = None
+    start = time.perf_counter()
+    for index, token in enumerate(tokens):
+        if guard.feed(token) and first_shown_ms is None:
+            first_shown_ms = (index + 1) * token_delay_ms
+    guard.finish()
+    cost_us = (time.perf_counter() - start) / len(tokens) * 1e6
+    if first_shown_ms is None:
+        first_shown_ms = len(tokens) * token_delay_ms
+    whole_response_ms = len(tokens) * token_delay_ms
+    return first_shown_ms, cost_us, whole_response_ms
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time to first shown text with the streaming guardrail.")
+    parser.add_argument("--response-kb", type=int, default=2)
+    parser.add_argument("--token-delay-ms", type=float, default=20.0)
+    parser.add_argument("--windows", default="32,64,128,256")
+    args = parser.parse_args()
+
+    text = (RESPONSE_PARAGRAPH * (args.response_kb * 1024 // len(RESPONSE_PARAGRAPH) + 1))[:args.response_kb * 1024]
+    tokens = tokenize(text)
+    print(f"{len(tokens)} tokens, one every {args.token_delay_ms:.0f} ms")
+    print(f"{'window':>7} {'first text (ms)':>16} {'whole check (ms)':>17} {'guard us/token':>15}")
+    for window in (int(w) for w in args.windows.split(",")):
+        first_ms, cost_us, whole_ms = measure(tokens, args.token_delay_ms, window)
+        print(f"{window:>7} {first_ms:>16.0f} {whole_ms:>17.0f} {cost_us:>15.1f}")
@@ -0,0 +1,160 @@
+import hashlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+from urllib.parse import urlparse
+import numpy as np
+
+DEFAULT_BATCH_SIZE = 1000
+
+# (ids, documents, metadatas, embeddings) for one upsert call
+Batch = Tuple[List[str], List[str], Optional[List[Dict[str, Any]]], np.ndarray]
+
+
+def get_client(target: str):
+    """
+    Returns a Chroma client for a target: an http(s)://host:port URL for a
+    Chroma server, or a directory path for a local PersistentClient.
+    """
+    import chromadb
+    if target.startswith(("http://", "https://")):
+        url = urlparse(target)
+        return chromadb.HttpClient(host=url.hostname, port=url.port or 8000, ssl=url.scheme == "https")
+    return chromadb.PersistentClient(path=target)
+
+
+def max_batch_size(client, requested: Optional[int] = None) -> int:
+    """
+    Returns the requested batch size, capped at the largest batch the client accepts.
+    """
+    limit = getattr(client, "get_max_batch_size", None)
+    limit = limit() if callable(limit) else getattr(client, "max_batch_size", None)
+    size = requested or DEFAULT_BATCH_SIZE
+    return min(size, limit) if limit else size
+
+
+def fingerprint(ids: Sequence[str], collection_name: str) -> str:
+    """
+    Identifies an ingestion job by its target collection and the IDs it writes,
+    so a checkpoint is only resumed by the same job.
+    """
+    digest = hashlib.sha256(collection_name.encode("utf-8"))
+    for row_id in ids:
+        digest.update(b"\0" + row_id.encode("utf-8"))
+    return digest.hexdigest()
+
+
+class BatchedUpserter:
+    """
+    Upserts rows into a Chroma collection in sized batches and records its
+    progress in a checkpoint file after every batch.
+
+    Upserts are idempotent, so a run that crashed mid-batch can be repeated:
+    it skips the rows the checkpoint says were written and re-upserts at most
+    one batch. While one batch is being written, the next one is prepared
+    (sliced, copied out of a memory map, metadata built) on a helper thread.
+    """
+    def __init__(self, collection, batch_size: int = DEFAULT_BATCH_SIZE, checkpoint_path: Optional[str] = None,
+                 pipeline: bool = True):
+        """
+        Args:
+            collection: The Chroma collection to write to.
+            batch_size (int): Rows per upsert call.
+            checkpoint_path (str): File recording progress; None disables resuming.
+            pipeline (bool): Prepare the next batch while the current one is written.
+        """
+        self.collection = collection
+        self.batch_size = batch_size
+        self.checkpoint_path = checkpoint_path
+        self.pipeline = pipeline
+
+    def _load_checkpoint(self, job: str) -> int:
+        if not self.checkpoint_path or not os.path.exists(self.checkpoint_path):
+            return 0
+        try:
+            with open(self.checkpoint_path, "r") as f:
+                checkpoint = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f" [!] Ignoring unreadable checkpoint '{self.checkpoint_path}': {e}", file=sys.stderr)
+            return 0
+        if checkpoint.get("job") != job:
+            print(f" [!] Checkpoint '{self.checkpoint_path}' belongs to a different job; starting over.",
+                  file=sys.stderr)
+            return 0
+        return int(checkpoint.get("rows_written", 0))
+
+    def _save_checkpoint(self, job: str, rows_written: int):
+        if not self.checkpoint_path:
+            return
+        temp_path = self.checkpoint_path + ".tmp"
+        with open(temp_path, "w") as f:
+            json.dump({"job": job, "rows_written": rows_written}, f)
+        os.replace(temp_path, self.checkpoint_path)
+
+    def write(self, total: int, prepare: Callable[[int, int], Batch], job: str = "") -> Dict[str, float]:
+        """
+        Writes rows [0, total) batch by batch.
+
+        Args:
+            total (int): Number of rows.
+            prepare (Callable[[int, int], Batch]): Returns the batch for rows [start, end).
+            job (str): Job fingerprint stored in the checkpoint; see fingerprint().
+
+        Returns:
+            Dict[str, float]: Rows written in this run, elapsed seconds and rows/s.
+        """
+        resume_from = self._load_checkpoint(job)
+        if resume_from:
+            print(f" [i] Resuming after {resume_from} of {total} rows.", file=sys.stderr)
+        bounds = [(start, min(start + self.batch_size, total)) for start in range(resume_from, total, self.batch_size)]
+        started = time.perf_counter()
+        executor = ThreadPoolExecutor(max_workers=1) if self.pipeline else None
+        try:
+            upcoming = executor.submit(prepare, *bounds[0]) if executor and bounds else None
+            for index, (start, end) in enumerate(bounds):
+                batch = upcoming.result() if executor else prepare(start, end)
+                if executor and index + 1 < len(bounds):
+                    upcoming = executor.submit(prepare, *bounds[index + 1])
+                ids, documents, metadatas, embeddings = batch
+                batch_started = time.perf_counter()
+                self.collection.upsert(ids=ids, documents=documents, metadatas=metadatas, embeddings=embeddings)
+                batch_seconds = time.perf_counter() - batch_started
+                self._save_checkpoint(job, end)
+                print(f" [x] Upserted rows {start}-{end} of {total} in {batch_seconds * 1000:.0f} ms "
+                      f"({(end - start) / max(batch_seconds, 1e-9):.0f} rows/s)", file=sys.stderr)
+        finally:
+            if executor:
+                executor.shutdown(wait=True)
+
+        elapsed = time.perf_counter() - started
+        written = total - resume_from
+        rate = written / elapsed if elapsed else 0.0
+        print(f" [i] Upserted {written} rows in {elapsed:.1f}s ({rate:.0f} rows/s).", file=sys.stderr)
+        if self.checkpoint_path and os.path.exists(self.checkpoint_path):
+            os.remove(self.checkpoint_path)
+        return {"rows": written, "seconds": elapsed, "rows_per_second": rate}
+
+
+def iter_collection(collection, include: List[str], batch_size: int = DEFAULT_BATCH_SIZE):
+    """
+    Yields the rows of a collection as get() results of at most batch_size rows each.
+    """
+    for offset in range(0, collection.count(), batch_size):
+        yield collection.get(limit=batch_size, offset=offset, include=include)
+
+
+def array_batches(ids: Sequence[str], documents: Sequence[str], metadatas: Optional[Sequence[Dict[str, Any]]],
+                  embeddings) -> Callable[[int, int], Batch]:
+    """
+    Returns a prepare function for BatchedUpserter.write over parallel
+    sequences. Rows of a memory-mapped embeddings array are copied into a
+    contiguous float32 block only when their batch is prepared.
+    """
+    def prepare(start: int, end: int) -> Batch:
+        return (list(ids[start:end]), list(documents[start:end]),
+                list(metadatas[start:end]) if metadatas else None,
+                np.ascontiguousarray(embeddings[start:end], dtype=np.float32))
+    return prepare
@@ -0,0 +1,10 @@
+import hashlib
+
+
+def chunk_id(source: str, text: str, occurrence: int) -> str:
+    """
+    Returns a stable ID for a chunk: a hash of the document's path in the
+    corpus, the chunk text, and how many identical chunks came before it in
+    the same document. Unchanged chunks keep their ID across runs.
+    """
+    return hashlib.sha256(f"{source}\0{occurrence}\0{text}".encode("utf-8")).hexdigest()[:32]
@@ -1,8 +1,186 @@
 import json
 import os
 import sys
-from typing import List, Dict, Any
-from sentence_transformers import SentenceTransformer
+import time
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence
+import numpy as np
+
+# Add the project root to the system path to allow importing the shared package
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(current_dir))
+
+from shared.onnxEncoder import encoder_key, load_encoder
+from embeddingCache import EmbeddingCache, text_hash
+from embeddingStore import open_for_write, write_sidecar
+from chunkIds import chunk_id
+
+MODEL_NAME = 'all-MiniLM-L6-v2'
+# Chunks per model.encode call
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", 64))
+# Torch intra-op threads; 0 keeps torch's default (one per core)
+EMBED_THREADS = int(os.getenv("EMBED_THREADS", 0))
+# "cpu", "cuda", ...; empty lets sentence-transformers choose
+EMBED_DEVICE = os.getenv("EMBED_DEVICE", "")
+# Encoder backend: sentence-transformers (torch), or onnx / onnx-int8 to run
+# the export in EMBED_ONNX_DIR (written by exportOnnx.py) on onnxruntime
+EMBED_BACKEND = os.getenv("EMBED_BACKEND", "sentence-transformers")
+EMBED_ONNX_DIR = os.getenv("EMBED_ONNX_DIR", "")
+# Encode chunks of similar length together so batches carry less padding
+EMBED_SORT_BY_LENGTH = os.getenv("EMBED_SORT_BY_LENGTH", "1") == "1"
+# SQLite file caching embeddings by (model and backend, text hash); empty disables the cache
+EMBED_CACHE_PATH = os.getenv("EMBED_CACHE_PATH", "embedding_cache.sqlite")
+# Batches read ahead per window; bounds how many texts and vectors are held at once
+WINDOW_BATCHES = 16
+
+class Embedder:
+    """
+    Encodes chunks in fixed-size batches with a bounded amount of text and
+    vectors in memory at a time.
+
+    Texts are taken a window of WINDOW_BATCHES batches at a time. Within a
+    window, texts already in the on-disk cache are looked up, the rest are
+    sorted by length (so each batch pads to a similar length) and encoded
+    batch by batch, and the new vectors are written to the cache.
+    """
+    def __init__(self, model_name: str = MODEL_NAME, batch_size: int = EMBED_BATCH_SIZE,
+                 num_threads: int = EMBED_THREADS, device: str = EMBED_DEVICE,
+                 sort_by_length: bool = EMBED_SORT_BY_LENGTH, cache_path: str = EMBED_CACHE_PATH,
+                 model: Optional[Any] = None, backend: str = EMBED_BACKEND, onnx_dir: str = EMBED_ONNX_DIR):
+        """
+        Args:
+            model_name (str): The sentence-transformers model.
+            batch_size (int): Chunks per encode call.
+            num_threads (int): Torch (or onnxruntime) intra-op threads; 0 keeps the default.
+            device (str): Torch device; empty lets sentence-transformers choose.
+            sort_by_length (bool): Group chunks of similar length into the same batch.
+            cache_path (str): SQLite embedding cache; empty disables it.
+            model (SentenceTransformer): An already loaded model (or OnnxEncoder) to use instead of loading one.
+            backend (str): "sentence-transformers", "onnx" or "onnx-int8".
+            onnx_dir (str): The ONNX export used by the onnx backends.
+        """
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.num_threads = num_threads
+        self.device = device or None
+        self.sort_by_length = sort_by_length
+        self.model = model
+        self.backend = backend
+        self.onnx_dir = onnx_dir
+        # Vectors of one backend must not be served to another
+        self.cache = EmbeddingCache(cache_path, encoder_key(backend, model_name)) if cache_path else None
+        self.stats = {"encoded": 0, "cached": 0, "encode_seconds": 0.0}
+
+    def load(self) -> Any:
+        """
+        Loads the encoder on first use, after applying the thread setting.
+        """
+        if self.model is None:
+            # The sentence-transformers backend downloads the model the first time it is run.
+            self.model = load_encoder(self.backend, self.model_name, self.onnx_dir, self.num_threads, self.device)
+            print("Model loaded successfully.", file=sys.stderr)
+        return self.model
+
+    @property
+    def dimension(self) -> int:
+        return self.load().get_sentence_embedding_dimension()
+
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        model = self.load()
+        vectors = np.empty((len(texts), self.dimension), dtype=np.float32)
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i])) if self.sort_by_length else list(range(len(texts)))
+        started = time.perf_counter()
+        for start in range(0, len(order), self.batch_size):
+            rows = order[start:start + self.batch_size]
+            vectors[rows] = model.encode([texts[i] for i in rows], batch_size=len(rows),
+                                         convert_to_numpy=True, show_progress_bar=False)
+        self.stats["encode_seconds"] += time.perf_counter() - started
+        self.stats["encoded"] += len(texts)
+        return vectors
+
+    def _embed_window(self, texts: List[str]) -> np.ndarray:
+        if self.cache is None:
+            return self._encode(texts)
+        hashes = [text_hash(text) for text in texts]
+        found = self.cache.get_many(hashes)
+        # Encode each missing text once, even if it occurs several times in the window
+        missing = list(dict.fromkeys(key for key in hashes if key not in found))
+        if missing:
+            text_by_hash = dict(zip(hashes, texts))
+            encoded = self._encode([text_by_hash[key] for key in missing])
+            self.cache.put_many(missing, encoded)
+            found.update(zip(missing, encoded))
+        self.stats["cached"] += len(texts) - len(missing)
+        return np.stack([found[key] for key in hashes]) if texts else np.empty((0, self.dimension), np.float32)
+
+    def iter_embeddings(self, texts: Iterable[str]) -> Iterator[np.ndarray]:
+        """
+        Yields the embeddings of the texts, in order, one window-sized float32 array at a time.
+        """
+        window: List[str] = []
+        for text in texts:
+            window.append(text)
+            if len(window) == self.batch_size * WINDOW_BATCHES:
+                yield self._embed_window(window)
+                window = []
+        if window:
+            yield self._embed_window(window)
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        """
+        Returns the embeddings of the texts as one (len(texts), dimension) float32 array.
+        """
+        vectors = np.empty((len(texts), self.dimension), dtype=np.float32)
+        position = 0
+        for block in self.iter_embeddings(texts):
+            vectors[position:position + len(block)] = block
+            position += len(block)
+        return vectors
+
+    def embed_to_file(self, texts: Sequence[str], ids: Sequence[str], vectors_path: str):
+        """
+        Writes the embeddings straight into a float32 .npy file with its
+        sidecar, one window at a time.
+        """
+        vectors = open_for_write(vectors_path, len(texts), self.dimension)
+        position = 0
+        for block in self.iter_embeddings(texts):
+            vectors[position:position + len(block)] = block
+            position += len(block)
+        vectors.flush()
+        del vectors
+        write_sidecar(vectors_path, ids, self.dimension, self.model_name)
+
+    def report(self) -> str:
+        seconds = self.stats["encode_seconds"]
+        rate = self.stats["encoded"] / seconds if seconds else 0.0
+        return (f"{self.stats['encoded']} chunks encoded in {seconds:.1f}s ({rate:.1f} chunks/s), "
+                f"{self.stats['cached']} from cache")
+
+    def close(self):
+        if self.cache is not None:
+            self.cache.close()
+
+def encode_chunks(chunks: List[str]) -> np.ndarray:
+    """
+    Takes a list of text chunks and returns their vector embeddings as a
+    float32 array of shape (len(chunks), dimension).
+
+    Args:
+        chunks (List[str]): A list of text strings to be embedded.
+
+    Returns:
+        np.ndarray: One embedding per row, or an empty array on failure.
+    """
+    embedder = Embedder()
+    try:
+        vectors = embedder.embed(chunks)
+        print(embedder.report(), file=sys.stderr)
+        return vectors
+    except Exception as e:
+        print(f"An unexpected error occurred during embedding: {e}", file=sys.stderr)
+        return np.empty((0, 0), dtype=np.float32)
+    finally:
+        embedder.close()
 
 def get_embeddings(chunks: List[str]) -> List[List[float]]:
     """
@@ -15,29 +193,33 @@ def get_embeddings(chunks: List[str]) -> List[List[float]]:
     Returns:
         List[List[float]]: A list of embedding vectors.
     """
-    try:
-        # Load the sentence-transformer model.
-        # This will download the model the first time it is run.
-        model = SentenceTransformer('all-MiniLM-L6-v2')
-        print("Model loaded successfully.", file=sys.stderr)
-        
-        # Generate the embeddings for the chunks
-        embeddings = model.encode(chunks, convert_to_tensor=False).tolist()
-        
-        return embeddings
-        
-    except Exception as e:
-        print(f"An unexpected error occurred during embedding: {e}", file=sys.stderr)
-        return []
+    return encode_chunks(chunks).tolist()
+
+def chunk_texts_and_ids(chunks: List[Any]):
+    """
+    Accepts the chunker's output, either plain strings or objects written with
+    --metadata, and returns the texts and their stable content-hash IDs.
+    """
+    texts, ids = [], []
+    seen: Dict[Any, int] = {}
+    for chunk in chunks:
+        text = chunk["text"] if isinstance(chunk, dict) else chunk
+        source = chunk.get("source", "") if isinstance(chunk, dict) else ""
+        occurrence = seen.get((source, text), 0)
+        seen[(source, text)] = occurrence + 1
+        texts.append(text)
+        ids.append(chunk_id(source, text, occurrence))
+    return texts, ids
 
 if __name__ == "__main__":
     if len(sys.argv) < 3:
         print("Error: Both a chunks JSON file and an output file path must be provided.", file=sys.stderr)
-        print("Usage: python embedder.py <path_to_chunks_json> <path_to_output_json>", file=sys.stderr)
+        print("Usage: python embedder.py <path_to_chunks_json> <path_to_output.npy|path_to_output_json>", file=sys.stderr)
+        print("       A .npy output is written as float32 with a .meta.json sidecar; any other name as JSON.", file=sys.stderr)
         sys.exit(1)
         
     input_json_path: str = sys.argv[1]
-    output_json_path: str = sys.argv[2]
+    output_path: str = sys.argv[2]
     
     if not os.path.exists(input_json_path):
         print(f"Error: The input file at '{input_json_path}' was not found.", file=sys.stderr)
@@ -46,24 +228,33 @@ if __name__ == "__main__":
     try:
         # Read the chunks from the provided JSON file
         with open(input_json_path, 'r') as f:
-            chunks: List[str] = json.load(f)
+            chunks: List[Any] = json.load(f)
 
         print(f"Loaded {len(chunks)} chunks from {input_json_path}", file=sys.stderr)
-        
-        vectors: List[List[float]] = get_embeddings(chunks)
-
-        if vectors:
-            with open(output_json_path, 'w') as f:
-                json.dump(vectors, f, indent=4)
-            print(f"Successfully generated {len(vectors)} embeddings and saved them to '{output_json_path}'.", file=sys.stderr)
-            sys.exit(0)
-        else:
+        texts, ids = chunk_texts_and_ids(chunks)
+
+        if not texts:
             print("Embedding failed.", file=sys.stderr)
             sys.exit(1)
 
+        embedder = Embedder()
+        try:
+            if output_path.endswith(".npy"):
+                # Stream the vectors into the file instead of building them in memory first
+                embedder.embed_to_file(texts, ids, output_path)
+            else:
+                vectors = embedder.embed(texts)
+                with open(output_path, 'w') as f:
+                    json.dump(vectors.tolist(), f, indent=4)
+            print(embedder.report(), file=sys.stderr)
+        finally:
+            embedder.close()
+        print(f"Successfully generated {len(texts)} embeddings and saved them to '{output_path}'.", file=sys.stderr)
+        sys.exit(0)
+
     except json.JSONDecodeError:
         print(f"Error: The file at '{input_json_path}' is not a valid JSON file.", file=sys.stderr)
         sys.exit(1)
     except Exception as e:
         print(f"An unexpected error occurred: {e}", file=sys.stderr)
-        sys.exit(1)
\ No newline at end of file
+        sys.exit(1)
@@ -0,0 +1,68 @@
+import hashlib
+import sqlite3
+from typing import Dict, List, Sequence
+import numpy as np
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    A persistent cache of embeddings keyed by (model name, SHA-256 of the text),
+    stored in SQLite as raw float32 bytes. Unchanged chunks are looked up
+    instead of being encoded again, across runs and across documents.
+    """
+    def __init__(self, path: str, model_name: str):
+        """
+        Args:
+            path (str): Path of the SQLite file; created if missing.
+            model_name (str): Embeddings from other models (or backends, see
+                onnxEncoder.encoder_key) in the same file are ignored.
+        """
+        self.path = path
+        self.model_name = model_name
+        self.connection = sqlite3.connect(path)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " model TEXT NOT NULL, text_hash TEXT NOT NULL, vector BLOB NOT NULL,"
+            " PRIMARY KEY (model, text_hash))"
+        )
+        self.connection.commit()
+        self.hits = 0
+        self.misses = 0
+
+    def get_many(self, hashes: Sequence[str]) -> Dict[str, np.ndarray]:
+        """
+        Returns {text hash: vector} for the hashes that are in the cache.
+        """
+        found: Dict[str, np.ndarray] = {}
+        unique = list(dict.fromkeys(hashes))
+        # SQLite limits the number of bound parameters per statement
+        for start in range(0, len(unique), 500):
+            batch = unique[start:start + 500]
+            placeholders = ",".join("?" * len(batch))
+            rows = self.connection.execute(
+                f"SELECT text_hash, vector FROM embeddings WHERE model = ? AND text_hash IN ({placeholders})",
+                [self.model_name] + batch,
+            )
+            for key, blob in rows:
+                found[key] = np.frombuffer(blob, dtype=np.float32)
+        self.hits += sum(1 for key in hashes if key in found)
+        self.misses += sum(1 for key in hashes if key not in found)
+        return found
+
+    def put_many(self, hashes: List[str], vectors: np.ndarray):
+        """
+        Stores one float32 vector per text hash.
+        """
+        vectors = np.asarray(vectors, dtype=np.float32)
+        self.connection.executemany(
+            "INSERT OR REPLACE INTO embeddings (model, text_hash, vector) VALUES (?, ?, ?)",
+            [(self.model_name, key, vector.tobytes()) for key, vector in zip(hashes, vectors)],
+        )
+        self.connection.commit()
+
+    def close(self):
+        self.connection.close()
@@ -0,0 +1,92 @@
+import json
+import os
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import numpy as np
+
+FORMAT_VERSION = 1
+
+
+def sidecar_path(vectors_path: str) -> str:
+    """
+    Returns the path of the metadata file that accompanies a .npy vectors file:
+    data/embed.npy -> data/embed.meta.json.
+    """
+    return os.path.splitext(vectors_path)[0] + ".meta.json"
+
+
+def write_sidecar(vectors_path: str, ids: Sequence[str], dimension: int, model_name: str,
+                  extra: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Writes the sidecar for a float32 .npy vectors file and returns it.
+    """
+    sidecar = {"format": FORMAT_VERSION, "vectors": os.path.basename(vectors_path), "dtype": "float32",
+               "count": len(ids), "dimension": int(dimension), "model": model_name, "ids": list(ids)}
+    sidecar.update(extra or {})
+    with open(sidecar_path(vectors_path), "w") as f:
+        json.dump(sidecar, f)
+    return sidecar
+
+
+def open_for_write(vectors_path: str, count: int, dimension: int) -> np.ndarray:
+    """
+    Creates a float32 .npy file of the given shape and returns it as a
+    writable memory map, so vectors can be written batch by batch without
+    holding them all in memory. Call flush() on it when done.
+    """
+    return np.lib.format.open_memmap(vectors_path, mode="w+", dtype=np.float32, shape=(count, dimension))
+
+
+def save_embeddings(vectors_path: str, embeddings, ids: Sequence[str], model_name: str,
+                    extra: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Writes embeddings as a float32 .npy file plus a JSON sidecar holding the
+    chunk IDs, model name and dimension.
+
+    Args:
+        vectors_path (str): Path of the .npy file to write.
+        embeddings: A 2-D array or list of equal-length vectors, one per ID.
+        ids (Sequence[str]): The chunk ID of each row.
+        model_name (str): The model that produced the vectors.
+        extra (Dict[str, Any]): Additional sidecar fields.
+
+    Returns:
+        Dict[str, Any]: The sidecar that was written.
+    """
+    vectors = np.asarray(embeddings, dtype=np.float32)
+    if vectors.ndim != 2 or vectors.shape[0] != len(ids):
+        raise ValueError(f"Expected {len(ids)} vectors, got an array of shape {vectors.shape}.")
+    np.save(vectors_path, vectors, allow_pickle=False)
+    return write_sidecar(vectors_path, ids, vectors.shape[1], model_name, extra)
+
+
+def load_embeddings(vectors_path: str, mmap: bool = True) -> Tuple[np.ndarray, Dict[str, Any]]:
+    """
+    Opens a .npy vectors file and its sidecar. With `mmap` the array is a
+    read-only memory map of the file, so nothing is parsed or copied up
+    front and rows are paged in as they are used.
+
+    Returns:
+        Tuple[np.ndarray, Dict[str, Any]]: The (count, dimension) float32 array and the sidecar.
+    """
+    with open(sidecar_path(vectors_path), "r") as f:
+        sidecar = json.load(f)
+    vectors = np.load(vectors_path, mmap_mode="r" if mmap else None, allow_pickle=False)
+    if vectors.dtype != np.float32 or vectors.shape != (sidecar["count"], sidecar["dimension"]):
+        raise ValueError(f"'{vectors_path}' does not match its sidecar: {vectors.dtype} {vectors.shape}.")
+    return vectors, sidecar
+
+
+def is_binary(path: str) -> bool:
+    return path.endswith(".npy")
+
+
+def load_any(path: str) -> Tuple[Any, Optional[Dict[str, Any]]]:
+    """
+    Loads embeddings from either format: a .npy file with its sidecar, or the
+    JSON list of lists written by embed.py's JSON mode (which has no sidecar).
+    """
+    if is_binary(path):
+        return load_embeddings(path)
+    with open(path, "r") as f:
+        vectors: List[List[float]] = json.load(f)
+    return vectors, None
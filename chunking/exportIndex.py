@@ -0,0 +1,188 @@
+import argparse
+import json
+import os
+import sys
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+import numpy as np
+
+# Add the project root to the system path to allow importing the shared package
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(current_dir))
+
+from shared.bm25Index import BM25Index
+from embeddingStore import load_any, open_for_write, write_sidecar
+from chromaWriter import get_client, iter_collection
+
+COLLECTION_NAME = "document_embeddings"
+MODEL_NAME = "all-MiniLM-L6-v2"
+# Rows read from a Chroma collection per get() call
+EXPORT_BATCH_SIZE = 1000
+# The BM25 index RAG-Core's hybrid search loads (RAG_BM25_PATH)
+BM25_NAME = "bm25.npz"
+
+# (ids, documents, metadatas, embeddings) for a block of rows
+Rows = Tuple[List[str], List[str], List[Optional[Dict[str, Any]]], np.ndarray]
+
+
+def write_bm25(path: str, ids: List[str], texts: List[str], version: Optional[str] = None) -> BM25Index:
+    """
+    Builds the BM25 index over the chunk texts and saves it, stamped with the
+    same version as the dense vectors it sits next to.
+    """
+    start = time.perf_counter()
+    index = BM25Index.build(ids, texts, version=version)
+    index.save(path)
+    print(f" [x] Wrote BM25 index of {len(ids)} chunks and {len(index.vocabulary)} terms to '{path}' "
+          f"in {(time.perf_counter() - start) * 1000:.0f} ms.", file=sys.stderr)
+    return index
+
+
+def write_bm25_from_collection(collection, path: str) -> BM25Index:
+    """
+    Builds the BM25 index from every row of a Chroma collection, e.g. after
+    an incremental ingestion changed some of them.
+    """
+    ids: List[str] = []
+    texts: List[str] = []
+    for rows in iter_collection(collection, ["documents"], EXPORT_BATCH_SIZE):
+        ids.extend(rows["ids"])
+        texts.extend(rows["documents"])
+    return write_bm25(path, ids, texts, (collection.metadata or {}).get("version"))
+
+
+def write_index(index_dir: str, count: int, dimension: int, blocks: Iterator[Rows], model_name: str = MODEL_NAME,
+                version: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Writes the index RAG-Core's NumpyBackend searches: vectors.npy with the
+    rows scaled to unit length (so cosine similarity is a dot product),
+    documents.json with each row's text and metadata, and the
+    vectors.meta.json sidecar carrying the IDs and a version stamp. The BM25
+    index for hybrid search is written next to them as bm25.npz.
+
+    Each file is written under a temporary name and renamed into place,
+    sidecar last, so a RAG-Core process that has the previous index mapped
+    keeps reading it intact until it sees the new version.
+
+    Args:
+        index_dir (str): Output directory; created if missing.
+        count (int): Total number of rows.
+        dimension (int): Embedding dimension.
+        blocks (Iterator[Rows]): The rows, a block at a time.
+        model_name (str): The model that produced the vectors.
+        version (str): Version stamp; defaults to the current time.
+
+    Returns:
+        Dict[str, Any]: The sidecar that was written.
+    """
+    os.makedirs(index_dir, exist_ok=True)
+    vectors_path = os.path.join(index_dir, "vectors.npy")
+    temp_vectors_path = os.path.join(index_dir, "vectors.tmp.npy")
+    vectors = open_for_write(temp_vectors_path, count, dimension)
+    all_ids: List[str] = []
+    documents: List[Dict[str, Any]] = []
+    position = 0
+    for ids, texts, metadatas, embeddings in blocks:
+        block = np.asarray(embeddings, dtype=np.float32)
+        norms = np.linalg.norm(block, axis=1, keepdims=True)
+        vectors[position:position + len(block)] = block / np.maximum(norms, 1e-12)
+        position += len(block)
+        all_ids.extend(ids)
+        documents.extend({"text": text, "metadata": metadata} for text, metadata in zip(texts, metadatas))
+    if position != count:
+        raise ValueError(f"Expected {count} rows, got {position}.")
+    vectors.flush()
+    del vectors
+    os.replace(temp_vectors_path, vectors_path)
+
+    temp_documents_path = os.path.join(index_dir, "documents.tmp.json")
+    with open(temp_documents_path, "w") as f:
+        json.dump(documents, f)
+    os.replace(temp_documents_path, os.path.join(index_dir, "documents.json"))
+
+    version = version or str(time.time_ns())
+    write_bm25(os.path.join(index_dir, BM25_NAME), all_ids, [document["text"] for document in documents], version)
+    sidecar = write_sidecar(temp_vectors_path, all_ids, dimension, model_name,
+                            {"vectors": "vectors.npy", "normalized": True, "version": version})
+    os.replace(os.path.join(index_dir, "vectors.tmp.meta.json"), os.path.join(index_dir, "vectors.meta.json"))
+    return sidecar
+
+
+def export_files(chunks_path: str, embeddings_path: str, index_dir: str) -> Dict[str, Any]:
+    """
+    Builds the index from the chunks and embeddings files that ingestionVDB.py
+    loads into ChromaDB, so both backends serve the same rows.
+    """
+    with open(chunks_path, "r") as f:
+        chunks: List[Any] = json.load(f)
+    metadatas: List[Optional[Dict[str, Any]]] = [None] * len(chunks)
+    if chunks and isinstance(chunks[0], dict):
+        metadatas = [{k: v for k, v in chunk.items() if k not in ("text", "hierarchy")} for chunk in chunks]
+        for metadata, chunk in zip(metadatas, chunks):
+            if chunk.get("hierarchy"):
+                metadata["hierarchy"] = " > ".join(chunk["hierarchy"])
+        chunks = [chunk["text"] for chunk in chunks]
+
+    embeddings, sidecar = load_any(embeddings_path)
+    if len(chunks) != len(embeddings):
+        raise ValueError(f"{len(chunks)} chunks but {len(embeddings)} embeddings.")
+    # Same ID fallback as ingestionVDB.py for JSON embeddings, which carry no IDs
+    ids = sidecar["ids"] if sidecar else [f"doc_{i}" for i in range(len(chunks))]
+    model_name = sidecar["model"] if sidecar else MODEL_NAME
+    dimension = len(embeddings[0]) if len(chunks) else 0
+
+    def blocks() -> Iterator[Rows]:
+        for start in range(0, len(chunks), EXPORT_BATCH_SIZE):
+            end = start + EXPORT_BATCH_SIZE
+            yield ids[start:end], chunks[start:end], metadatas[start:end], np.asarray(embeddings[start:end])
+
+    return write_index(index_dir, len(chunks), dimension, blocks(), model_name)
+
+
+def export_collection(target: str, index_dir: str, collection_name: str = COLLECTION_NAME) -> Dict[str, Any]:
+    """
+    Builds the index from a ChromaDB collection, e.g. one maintained by
+    ingestPipeline.py, keeping the collection's version stamp.
+    """
+    collection = get_client(target).get_collection(name=collection_name)
+    count = collection.count()
+    first = collection.get(limit=1, include=["embeddings"])
+    dimension = len(first["embeddings"][0]) if count else 0
+
+    def blocks() -> Iterator[Rows]:
+        for rows in iter_collection(collection, ["embeddings", "documents", "metadatas"], EXPORT_BATCH_SIZE):
+            yield rows["ids"], rows["documents"], rows["metadatas"], np.asarray(rows["embeddings"])
+
+    version = (collection.metadata or {}).get("version")
+    return write_index(index_dir, count, dimension, blocks(), version=version)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Export ingested chunks and embeddings as an in-process search index for RAG-Core.")
+    parser.add_argument("index_dir", help="Directory to write the index to (RAG_INDEX_DIR).")
+    parser.add_argument("--chunks", help="Chunks JSON written by the chunker.")
+    parser.add_argument("--embeddings", help="Embeddings written by embed.py (.npy or JSON).")
+    parser.add_argument("--from-chroma", metavar="TARGET",
+                        help="Export a collection instead: a Chroma directory or http://host:port.")
+    parser.add_argument("--collection", default=COLLECTION_NAME)
+    args = parser.parse_args()
+
+    if not args.from_chroma and not (args.chunks and args.embeddings):
+        print("Error: Pass either --chunks and --embeddings, or --from-chroma.", file=sys.stderr)
+        sys.exit(1)
+
+    started = time.perf_counter()
+    try:
+        if args.from_chroma:
+            sidecar = export_collection(args.from_chroma, args.index_dir, args.collection)
+        else:
+            sidecar = export_files(args.chunks, args.embeddings, args.index_dir)
+    except FileNotFoundError as e:
+        print(f"Error: Input not found: {e}", file=sys.stderr)
+        sys.exit(1)
+    except Exception as e:
+        print(f"An unexpected error occurred during export: {e}", file=sys.stderr)
+        sys.exit(1)
+    print(f"Exported {sidecar['count']} vectors of dimension {sidecar['dimension']} to '{args.index_dir}' "
+          f"in {time.perf_counter() - started:.1f}s (version {sidecar['version']}).", file=sys.stderr)
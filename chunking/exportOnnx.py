@@ -0,0 +1,142 @@
+import argparse
+import json
+import os
+import sys
+import time
+from typing import Any, Dict, List
+
+# Add the project root to the system path to allow importing the shared package
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(current_dir))
+
+from shared.onnxEncoder import (CONFIG_FILE, MODEL_FILE, QUANTIZED_MODEL_FILE, TOKENIZER_FILE, OnnxEncoder,
+                                cosine_agreement)
+
+MODEL_NAME = "all-MiniLM-L6-v2"
+DEFAULT_CHUNKS = os.path.join(os.path.dirname(current_dir), "data", "chunk.json")
+# Lowest per-text cosine similarity to the original model's vectors that
+# keeps an export compatible with a collection ingested with that model
+MIN_COSINE = {"onnx": 0.999, "onnx-int8": 0.98}
+SAMPLE_TEXTS = [
+    "How do I file a complaint with the District Commission?",
+    "Can I get a refund for a defective product?",
+    "What does section 35 say?",
+    "Every complaint shall be filed within two years from the date on which the cause of action has arisen.",
+]
+
+
+def export_onnx(model_name: str, model_dir: str, quantize: bool = True, opset: int = 14) -> Dict[str, Any]:
+    """
+    Exports a sentence-transformers model for OnnxEncoder: the transformer as
+    an ONNX graph with dynamic batch and sequence axes, optionally an int8
+    dynamically-quantized copy, the fast tokenizer as tokenizer.json, and the
+    pooling settings as encoder.json (written last).
+
+    Returns:
+        Dict[str, Any]: The encoder.json contents.
+    """
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    model = SentenceTransformer(model_name, device="cpu")
+    transformer, pooling = model[0], model[1]
+    if not getattr(pooling, "pooling_mode_mean_tokens", False):
+        raise ValueError(f"'{model_name}' does not use mean pooling, which is all OnnxEncoder implements.")
+    tokenizer = transformer.tokenizer
+    os.makedirs(model_dir, exist_ok=True)
+
+    sample = tokenizer(SAMPLE_TEXTS[:2], padding=True, return_tensors="pt")
+    input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+
+    class LastHiddenState(torch.nn.Module):
+        def __init__(self, auto_model):
+            super().__init__()
+            self.auto_model = auto_model
+
+        def forward(self, *inputs):
+            return self.auto_model(**dict(zip(input_names, inputs)))[0]
+
+    axes = {0: "batch", 1: "sequence"}
+    with torch.no_grad():
+        torch.onnx.export(LastHiddenState(transformer.auto_model.eval()), tuple(sample[name] for name in input_names),
+                          os.path.join(model_dir, MODEL_FILE), input_names=input_names,
+                          output_names=["last_hidden_state"],
+                          dynamic_axes={name: axes for name in input_names + ["last_hidden_state"]},
+                          opset_version=opset, do_constant_folding=True)
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        quantize_dynamic(os.path.join(model_dir, MODEL_FILE), os.path.join(model_dir, QUANTIZED_MODEL_FILE),
+                         weight_type=QuantType.QInt8)
+    tokenizer.backend_tokenizer.save(os.path.join(model_dir, TOKENIZER_FILE))
+
+    config = {
+        "model_name": model_name,
+        "dimension": model.get_sentence_embedding_dimension(),
+        "max_seq_length": model.max_seq_length,
+        "normalize": any(type(module).__name__ == "Normalize" for module in model),
+        "pad_token": tokenizer.pad_token,
+        "pad_token_id": tokenizer.pad_token_id,
+        "quantized": quantize,
+    }
+    with open(os.path.join(model_dir, CONFIG_FILE), "w") as f:
+        json.dump(config, f, indent=2)
+    return config
+
+
+def check_export(model_name: str, model_dir: str, texts: List[str]) -> Dict[str, float]:
+    """
+    Encodes the texts with the original model and with each exported graph
+    and returns the lowest cosine similarity per backend.
+    """
+    from sentence_transformers import SentenceTransformer
+    reference = SentenceTransformer(model_name, device="cpu")
+    lowest = {}
+    for backend, file_name in (("onnx", MODEL_FILE), ("onnx-int8", QUANTIZED_MODEL_FILE)):
+        if os.path.exists(os.path.join(model_dir, file_name)):
+            encoder = OnnxEncoder(model_dir, quantized=backend == "onnx-int8")
+            lowest[backend] = float(cosine_agreement(reference, encoder, texts).min())
+    return lowest
+
+
+def sample_texts(chunks_path: str, limit: int) -> List[str]:
+    """
+    Returns the built-in queries plus up to `limit` chunks, when the chunks file exists.
+    """
+    texts = list(SAMPLE_TEXTS)
+    if chunks_path and os.path.exists(chunks_path):
+        with open(chunks_path, "r") as f:
+            chunks = json.load(f)
+        texts += [chunk["text"] if isinstance(chunk, dict) else chunk for chunk in chunks[:limit]]
+    return texts
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the embedding model to ONNX for the onnx encoder backends "
+                                                 "(EMBED_BACKEND / RAG_ENCODER) and check it against the original.")
+    parser.add_argument("model_dir", help="Directory to write the export to (EMBED_ONNX_DIR / RAG_ONNX_DIR).")
+    parser.add_argument("--model", default=MODEL_NAME)
+    parser.add_argument("--no-quantize", action="store_true", help="Skip the int8-quantized graph.")
+    parser.add_argument("--chunks", default=DEFAULT_CHUNKS, help="Chunks JSON to draw check texts from.")
+    parser.add_argument("--check-texts", type=int, default=200, help="Chunks encoded by the compatibility check.")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    try:
+        config = export_onnx(args.model, args.model_dir, quantize=not args.no_quantize)
+        print(f"Exported '{args.model}' ({config['dimension']} dimensions) to '{args.model_dir}' "
+              f"in {time.perf_counter() - started:.1f}s.", file=sys.stderr)
+        lowest = check_export(args.model, args.model_dir, sample_texts(args.chunks, args.check_texts))
+    except Exception as e:
+        print(f"An unexpected error occurred during export: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    failed = False
+    for backend, cosine in lowest.items():
+        passed = cosine >= MIN_COSINE[backend]
+        failed = failed or not passed
+        print(f"{backend}: lowest cosine similarity to '{args.model}' {cosine:.5f} "
+              f"({'ok' if passed else 'below'} the {MIN_COSINE[backend]} tolerance)", file=sys.stderr)
+    if failed:
+        print("Error: The export does not reproduce the original model's vectors; "
+              "do not use it with the existing collection.", file=sys.stderr)
+        sys.exit(1)
@@ -3,7 +3,113 @@ import re
 import sys
 import os
 import json
-from typing import List
+from typing import Iterable, Iterator, List, NamedTuple, Tuple
+
+WHITESPACE = re.compile(r'\s+')
+# MuPDF caches parsed page resources for the life of the document; emptying
+# the cache every this many pages keeps memory flat on very long PDFs.
+STORE_SHRINK_PAGES = 50
+
+
+class Chunk(NamedTuple):
+    text: str
+    source: str
+    page_start: int     # 1-based page the chunk starts on
+    page_end: int       # 1-based page the chunk ends on
+    char_start: int     # offset in the document's whitespace-normalized text
+    char_end: int
+    hierarchy: Tuple[str, ...] = ()   # chapter/section/clause path, for structure-aware chunks
+
+
+def page_range(page_marks: List[Tuple[int, int]], start: int, end: int) -> Tuple[int, int]:
+    """
+    Returns the pages on which the text between two document offsets starts
+    and ends, given (offset, page number) marks for each page's first character.
+    """
+    page_start = page_end = page_marks[0][1]
+    for offset, page_number in page_marks:
+        if offset <= start:
+            page_start = page_number
+        if offset < end:
+            page_end = page_number
+    return page_start, page_end
+
+
+def iter_normalized_pages(doc) -> Iterator[Tuple[int, str]]:
+    """
+    Yields (page_number, text) for each page with whitespace collapsed to
+    single spaces across page boundaries, so that joining the pieces gives
+    exactly re.sub(r'\s+', ' ', full_text).strip(). Only one page is held in
+    memory at a time.
+    """
+    emitted = False
+    pending_space = False
+    for page_number, page in enumerate(doc, start=1):
+        if page_number % STORE_SHRINK_PAGES == 0:
+            fitz.TOOLS.store_shrink(100)
+        normalized = WHITESPACE.sub(' ', page.get_text())
+        core = normalized.strip(' ')
+        if not core:
+            pending_space = pending_space or bool(normalized)
+            continue
+        if emitted and (pending_space or normalized.startswith(' ')):
+            core = ' ' + core
+        pending_space = normalized.endswith(' ')
+        emitted = True
+        yield page_number, core
+
+
+def iter_chunks(file_path: str, chunk_size: int = 500, overlap: int = 50) -> Iterator[Chunk]:
+    """
+    Streams fixed-size chunks of a PDF with their source metadata.
+
+    Pages are read one at a time and only the text not yet covered by a
+    chunk is kept, so memory stays flat however long the document is. The
+    chunk texts are the same as chunk_document's.
+
+    Args:
+        file_path (str): The path to the PDF document.
+        chunk_size (int): The maximum number of characters per chunk.
+        overlap (int): The number of characters to overlap between chunks to maintain context.
+
+    Yields:
+        Chunk: Each chunk's text, source file, page range and character offsets.
+    """
+    if overlap >= chunk_size:
+        raise ValueError("overlap must be smaller than chunk_size.")
+    step = chunk_size - overlap
+    buffer = ""
+    buffer_start = 0        # document offset of buffer[0]
+    next_start = 0          # document offset of the next chunk
+    page_marks = []         # (document offset, page number) of each page's first character
+
+    def make_chunk(start: int, end: int) -> Chunk:
+        page_start, page_end = page_range(page_marks, start, end)
+        return Chunk(buffer[start - buffer_start:end - buffer_start], file_path, page_start, page_end, start, end)
+
+    with fitz.open(file_path) as doc:
+        for page_number, text in iter_normalized_pages(doc):
+            page_marks.append((buffer_start + len(buffer) + (1 if text.startswith(' ') else 0), page_number))
+            buffer += text
+            while next_start + chunk_size < buffer_start + len(buffer):
+                yield make_chunk(next_start, next_start + chunk_size)
+                next_start += step
+                # Drop text and page marks that no later chunk can reach
+                buffer = buffer[next_start - buffer_start:]
+                buffer_start = next_start
+                while len(page_marks) > 1 and page_marks[1][0] <= next_start:
+                    page_marks.pop(0)
+
+    end_of_text = buffer_start + len(buffer)
+    if end_of_text == 0:
+        return
+    if end_of_text <= chunk_size:
+        yield make_chunk(0, end_of_text)
+        return
+    while next_start < end_of_text:
+        yield make_chunk(next_start, min(next_start + chunk_size, end_of_text))
+        next_start += step
+
 
 def chunk_document(file_path: str, chunk_size: int = 500, overlap: int = 50) -> List[str]:
     """
@@ -23,52 +129,86 @@ def chunk_document(file_path: str, chunk_size: int = 500, overlap: int = 50) ->
         return []
 
     try:
-        # Open the PDF document
-        doc = fitz.open(file_path)
-        full_text = ""
-        for page in doc:
-            full_text += page.get_text()
-
-        # Clean up the text by replacing multiple newlines and spaces
-        full_text = re.sub(r'\s+', ' ', full_text).strip()
-
-        # A simple fixed-size chunking strategy
-        chunks = []
-        if len(full_text) <= chunk_size:
-            return [full_text]
-
-        start = 0
-        while start < len(full_text):
-            end = start + chunk_size
-            chunks.append(full_text[start:end])
-            start += chunk_size - overlap
-
-        return chunks
+        return [chunk.text for chunk in iter_chunks(file_path, chunk_size, overlap)]
     except Exception as e:
         print(f"An unexpected error occurred during chunking: {e}", file=sys.stderr)
         return []
 
+
+def write_chunks_json(chunks: Iterable[Chunk], output_path: str, with_metadata: bool = False) -> int:
+    """
+    Writes chunks to a JSON array one at a time instead of building the list first.
+
+    Args:
+        chunks (Iterable[Chunk]): The chunks to write.
+        output_path (str): The path of the JSON file.
+        with_metadata (bool): Write objects with the chunk metadata instead of plain strings.
+
+    Returns:
+        int: The number of chunks written.
+    """
+    count = 0
+    with open(output_path, 'w') as f:
+        f.write("[")
+        for chunk in chunks:
+            item = chunk._asdict() if with_metadata else chunk.text
+            f.write(("," if count else "") + "\n    " + json.dumps(item))
+            count += 1
+        f.write("\n]\n")
+    return count
+
+def iter_document_chunks(file_path: str, strategy: str = "fixed", **options) -> Iterator[Chunk]:
+    """
+    Streams the chunks of a PDF with the named strategy: "fixed" for fixed-size
+    character windows, or "section" for chapter/section-aligned chunks of a statute.
+
+    Args:
+        file_path (str): The path to the PDF document.
+        strategy (str): "fixed" or "section".
+        **options: Passed on to iter_chunks or sectionChunking.iter_section_chunks.
+    """
+    if strategy == "fixed":
+        return iter_chunks(file_path, **options)
+    if strategy == "section":
+        from sectionChunking import iter_section_chunks
+        return iter_section_chunks(file_path, **options)
+    raise ValueError(f"Unknown chunking strategy '{strategy}'.")
+
 if __name__ == "__main__":
-    if len(sys.argv) < 3:
+    args = sys.argv[1:]
+    with_metadata = "--metadata" in args
+    args = [arg for arg in args if arg != "--metadata"]
+    strategy = "fixed"
+    if "--strategy" in args:
+        index = args.index("--strategy")
+        strategy = args[index + 1] if index + 1 < len(args) else ""
+        del args[index:index + 2]
+    if len(args) < 2 or strategy not in ("fixed", "section"):
         print("Error: Both a PDF file path and an output file path must be provided.", file=sys.stderr)
-        print("Usage: python chunker.py <path_to_pdf> <path_to_output_json>", file=sys.stderr)
+        print("Usage: python chunker.py <path_to_pdf> <path_to_output_json> [--metadata] [--strategy fixed|section]", file=sys.stderr)
+        sys.exit(1)
+
+    pdf_path = args[0]
+    output_path = args[1]
+
+    if not os.path.exists(pdf_path):
+        print(f"Error: The file at '{pdf_path}' was not found.", file=sys.stderr)
+        sys.exit(1)
+
+    # Stream the chunks straight into the output file
+    try:
+        options = {"chunk_size": 500, "overlap": 50} if strategy == "fixed" else {}
+        count = write_chunks_json(iter_document_chunks(pdf_path, strategy, **options), output_path, with_metadata)
+    except IOError as e:
+        print(f"Error writing to file '{output_path}': {e}", file=sys.stderr)
+        sys.exit(1)
+    except Exception as e:
+        print(f"An unexpected error occurred during chunking: {e}", file=sys.stderr)
         sys.exit(1)
 
-    pdf_path = sys.argv[1]
-    output_path = sys.argv[2]
-    
-    # Chunk the document from the provided path
-    chunks_list = chunk_document(pdf_path, chunk_size=500, overlap=50)
-
-    if chunks_list:
-        try:
-            with open(output_path, 'w') as f:
-                json.dump(chunks_list, f, indent=4)
-            print(f"Successfully created {len(chunks_list)} chunks and wrote them to '{output_path}'.", file=sys.stderr)
-            sys.exit(0)
-        except IOError as e:
-            print(f"Error writing to file '{output_path}': {e}", file=sys.stderr)
-            sys.exit(1)
+    if count:
+        print(f"Successfully created {count} chunks and wrote them to '{output_path}'.", file=sys.stderr)
+        sys.exit(0)
     else:
         print("Chunking failed. No output generated.", file=sys.stderr)
         sys.exit(1)
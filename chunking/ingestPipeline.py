@@ -0,0 +1,261 @@
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Tuple
+from chunkIds import chunk_id
+from fixedSizeChunking import iter_document_chunks
+from chromaWriter import BatchedUpserter, array_batches, get_client, max_batch_size
+from exportIndex import BM25_NAME, write_bm25_from_collection
+
+COLLECTION_NAME = "document_embeddings"
+MANIFEST_NAME = "ingest_manifest.json"
+# Chroma rejects very large add/delete calls, so writes are sent in batches of this many rows
+WRITE_BATCH_SIZE = 1000
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def find_pdfs(pdf_dir: str) -> Dict[str, str]:
+    """
+    Returns {path relative to pdf_dir: absolute path} for every PDF under the directory.
+    """
+    pdfs = {}
+    for root, _, files in os.walk(pdf_dir):
+        for name in sorted(files):
+            if name.lower().endswith(".pdf"):
+                path = os.path.join(root, name)
+                pdfs[os.path.relpath(path, pdf_dir).replace(os.sep, "/")] = os.path.abspath(path)
+    return pdfs
+
+
+def chunk_pdf(job: Tuple[str, str, str, Dict[str, Any]]) -> Tuple[str, List[Dict[str, Any]]]:
+    """
+    Process-pool worker: chunks one PDF and returns its chunks as records
+    ready for the vector store.
+
+    Args:
+        job: (relative path, absolute path, chunking strategy, strategy options).
+
+    Returns:
+        Tuple[str, List[Dict[str, Any]]]: The relative path and a list of
+        {"id", "text", "metadata"} records.
+    """
+    source, path, strategy, options = job
+    records = []
+    seen: Dict[str, int] = {}
+    for chunk in iter_document_chunks(path, strategy, **options):
+        occurrence = seen.get(chunk.text, 0)
+        seen[chunk.text] = occurrence + 1
+        metadata = {"source": source, "page_start": chunk.page_start, "page_end": chunk.page_end,
+                    "char_start": chunk.char_start, "char_end": chunk.char_end}
+        if chunk.hierarchy:
+            # Chroma metadata values must be scalars
+            metadata["hierarchy"] = " > ".join(chunk.hierarchy)
+        records.append({"id": chunk_id(source, chunk.text, occurrence), "text": chunk.text, "metadata": metadata})
+    return source, records
+
+
+def load_manifest(path: str) -> Dict[str, Any]:
+    if not os.path.exists(path):
+        return {"documents": {}}
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def save_manifest(path: str, manifest: Dict[str, Any]):
+    # Write to a temporary file first so an interrupted run never leaves a truncated manifest
+    temp_path = path + ".tmp"
+    with open(temp_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(temp_path, path)
+
+
+def plan_ingestion(pdfs: Dict[str, str], manifest: Dict[str, Any], settings: Dict[str, Any]):
+    """
+    Compares the PDFs on disk with the manifest of the last run.
+
+    A document is unchanged if its size and modification time match the
+    manifest, or failing that, its SHA-256 does. Changing the chunking
+    settings re-chunks every document.
+
+    Returns:
+        Tuple[List[str], List[str], List[str]]: Documents to chunk, unchanged
+        documents, and documents that were removed from the directory.
+    """
+    known = manifest.get("documents", {}) if manifest.get("settings") == settings else {}
+    to_chunk, unchanged = [], []
+    for source, path in pdfs.items():
+        entry = known.get(source)
+        stat = os.stat(path)
+        if entry and entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime:
+            unchanged.append(source)
+        elif entry and entry["size"] == stat.st_size and entry["sha256"] == file_sha256(path):
+            entry["mtime"] = stat.st_mtime
+            unchanged.append(source)
+        else:
+            to_chunk.append(source)
+    removed = [source for source in manifest.get("documents", {}) if source not in pdfs]
+    return to_chunk, unchanged, removed
+
+
+def in_batches(items: List[Any], size: int = WRITE_BATCH_SIZE):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def run_ingestion(pdf_dir: str, target: str, strategy: str = "fixed", workers: int = None,
+                  collection_name: str = COLLECTION_NAME, manifest_path: str = None,
+                  bm25_path: str = None) -> Dict[str, int]:
+    """
+    Brings the Chroma collection in line with a directory of PDFs.
+
+    New and changed PDFs are chunked in a process pool. Only chunks whose
+    content-hash ID is not already in the collection are embedded and added;
+    chunks that a changed document no longer contains, and every chunk of a
+    removed document, are deleted. A manifest of file sizes, modification
+    times, hashes and chunk IDs is kept next to the database, so an unchanged
+    corpus is detected without opening a single PDF. After any change the
+    BM25 index for hybrid search is rebuilt from the collection.
+
+    Args:
+        pdf_dir (str): Directory searched recursively for PDFs.
+        target (str): Chroma directory (PersistentClient) or http://host:port (HttpClient).
+        strategy (str): Chunking strategy, "fixed" or "section".
+        workers (int): Chunking processes; defaults to the number of CPUs.
+        collection_name (str): The collection to write to.
+        manifest_path (str): Defaults to ingest_manifest.json in the Chroma
+            directory, or in the working directory for a server target.
+        bm25_path (str): The BM25 index; defaults to bm25.npz in the Chroma
+            directory, and is not written for a server target unless given.
+
+    Returns:
+        Dict[str, int]: Counts of documents and chunks chunked, added, deleted and kept.
+    """
+    is_server = target.startswith(("http://", "https://"))
+    if manifest_path is None:
+        manifest_path = MANIFEST_NAME if is_server else os.path.join(target, MANIFEST_NAME)
+    if bm25_path is None and not is_server:
+        bm25_path = os.path.join(target, BM25_NAME)
+    manifest = load_manifest(manifest_path)
+    settings = {"strategy": strategy, "collection": collection_name}
+    pdfs = find_pdfs(pdf_dir)
+    to_chunk, unchanged, removed = plan_ingestion(pdfs, manifest, settings)
+    stats = {"documents": len(pdfs), "chunked": len(to_chunk), "unchanged": len(unchanged),
+             "removed": len(removed), "chunks_added": 0, "chunks_deleted": 0}
+    print(f" [i] {len(pdfs)} PDFs: {len(to_chunk)} new or changed, {len(unchanged)} unchanged, "
+          f"{len(removed)} removed.", file=sys.stderr)
+
+    client = get_client(target)
+    collection = client.get_or_create_collection(name=collection_name, embedding_function=None,
+                                                  metadata={"dimension": 384})
+    documents = {source: manifest["documents"][source] for source in unchanged}
+    expected_rows = sum(len(entry["chunk_ids"]) for entry in documents.values())
+    if collection.count() != expected_rows + sum(len(manifest["documents"].get(s, {}).get("chunk_ids", []))
+                                                 for s in to_chunk + removed):
+        # The database does not match the manifest (e.g. it was wiped); re-chunk
+        # everything and let the ID lookup below skip chunks that are still there.
+        print(" [!] Collection does not match the manifest; re-checking every document.", file=sys.stderr)
+        to_chunk, unchanged, documents = to_chunk + unchanged, [], {}
+        stats.update(chunked=len(to_chunk), unchanged=0)
+        resync = True
+    elif not to_chunk and not removed:
+        save_manifest(manifest_path, {"settings": settings, "documents": documents})
+        if bm25_path and not os.path.exists(bm25_path):
+            write_bm25_from_collection(collection, bm25_path)
+        return stats
+    else:
+        resync = False
+
+    # Chunk new and changed documents in parallel
+    chunked: Dict[str, List[Dict[str, Any]]] = {}
+    if to_chunk:
+        options = {"chunk_size": 500, "overlap": 50} if strategy == "fixed" else {}
+        jobs = [(source, pdfs[source], strategy, options) for source in to_chunk]
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for source, records in pool.map(chunk_pdf, jobs):
+                chunked[source] = records
+                print(f" [x] Chunked '{source}' into {len(records)} chunks.", file=sys.stderr)
+
+    # Work out which chunk IDs have to be deleted and which have to be embedded
+    if resync:
+        # Rows no document produces any more, including ones written by the old doc_{i} ingestion
+        kept_ids = {record["id"] for records in chunked.values() for record in records}
+        stale_ids = [row_id for row_id in collection.get(include=[])["ids"] if row_id not in kept_ids]
+    else:
+        stale_ids = []
+        for source in removed + to_chunk:
+            old_ids = set(manifest["documents"].get(source, {}).get("chunk_ids", []))
+            new_ids = {record["id"] for record in chunked.get(source, [])}
+            stale_ids.extend(old_ids - new_ids)
+    new_records = [record for records in chunked.values() for record in records]
+    existing_ids = set()
+    for batch in in_batches([record["id"] for record in new_records]):
+        existing_ids.update(collection.get(ids=batch, include=[])["ids"])
+    to_embed = [record for record in new_records if record["id"] not in existing_ids]
+
+    for batch in in_batches(stale_ids):
+        collection.delete(ids=batch)
+    stats["chunks_deleted"] = len(stale_ids)
+
+    if to_embed:
+        from embed import encode_chunks
+        print(f" [x] Embedding {len(to_embed)} new chunks ({len(existing_ids)} already indexed).", file=sys.stderr)
+        embeddings = encode_chunks([record["text"] for record in to_embed])
+        if len(embeddings) != len(to_embed):
+            raise RuntimeError("Embedding failed; the collection was left without the new chunks.")
+        # No checkpoint needed: a failed run is resumed by the ID lookup above
+        upserter = BatchedUpserter(collection, max_batch_size(client, WRITE_BATCH_SIZE))
+        upserter.write(len(to_embed), array_batches([record["id"] for record in to_embed],
+                                                    [record["text"] for record in to_embed],
+                                                    [record["metadata"] for record in to_embed], embeddings))
+        stats["chunks_added"] = len(to_embed)
+
+    # Stamp the collection with a new version so RAG-Core drops cached results
+    collection.modify(metadata={"dimension": 384, "version": str(time.time_ns())})
+    if bm25_path:
+        write_bm25_from_collection(collection, bm25_path)
+
+    for source, records in chunked.items():
+        stat = os.stat(pdfs[source])
+        documents[source] = {"size": stat.st_size, "mtime": stat.st_mtime, "sha256": file_sha256(pdfs[source]),
+                             "chunk_ids": [record["id"] for record in records]}
+    save_manifest(manifest_path, {"settings": settings, "documents": documents})
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Chunk, embed and index a directory of PDFs incrementally.")
+    parser.add_argument("pdf_dir", help="Directory searched recursively for PDFs.")
+    parser.add_argument("--target", default="./chroma_data",
+                        help="Chroma directory (PersistentClient) or http://host:port (HttpClient).")
+    parser.add_argument("--manifest", default=None, help="Path of the ingestion manifest.")
+    parser.add_argument("--strategy", choices=("fixed", "section"), default="fixed")
+    parser.add_argument("--workers", type=int, default=None, help="Chunking processes (default: CPU count).")
+    parser.add_argument("--collection", default=COLLECTION_NAME)
+    parser.add_argument("--bm25", default=None,
+                        help="Path of the BM25 index for hybrid search (default: bm25.npz in a local --target).")
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.pdf_dir):
+        print(f"Error: The directory '{args.pdf_dir}' was not found.", file=sys.stderr)
+        sys.exit(1)
+
+    started = time.perf_counter()
+    try:
+        stats = run_ingestion(args.pdf_dir, args.target, args.strategy, args.workers, args.collection,
+                              args.manifest, args.bm25)
+    except Exception as e:
+        print(f"An unexpected error occurred during ingestion: {e}", file=sys.stderr)
+        sys.exit(1)
+    print(f"Ingestion finished in {time.perf_counter() - started:.1f}s: {stats['chunks_added']} chunks added, "
+          f"{stats['chunks_deleted']} deleted, {stats['unchanged']} documents unchanged.", file=sys.stderr)
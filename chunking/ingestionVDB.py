@@ -1,25 +1,55 @@
+import argparse
 import json
 import os
 import sys
-from typing import List, Dict, Any
-import chromadb
+import time
+from typing import List, Dict, Any, Optional
+from embeddingStore import load_any
+from chromaWriter import BatchedUpserter, array_batches, fingerprint, get_client, max_batch_size
+from exportIndex import BM25_NAME, write_bm25
 
-def ingest_data(chunks_path: str, embeddings_path: str):
+def default_bm25_path(target: str) -> Optional[str]:
     """
-    Reads chunks and embeddings from JSON files and writes them to a ChromaDB collection.
+    Returns where the BM25 index goes by default: inside a local Chroma
+    directory, next to the dense vectors. A Chroma server has no local
+    directory, so the path must then be given explicitly.
+    """
+    return None if target.startswith(("http://", "https://")) else os.path.join(target, BM25_NAME)
+
+def ingest_data(chunks_path: str, embeddings_path: str, target: str = "./chroma_data",
+                batch_size: Optional[int] = None, pipeline: bool = True, bm25_path: Optional[str] = None):
+    """
+    Reads chunks and embeddings and writes them to a ChromaDB collection.
+
+    Embeddings are read either from a float32 .npy file, memory-mapped rather
+    than parsed, with its .meta.json sidecar supplying the chunk IDs, or from
+    the JSON list written by embed.py's JSON mode.
+
+    Rows are upserted in batches with progress recorded in a checkpoint file
+    next to the embeddings, so a run that fails partway resumes where it
+    stopped when started again.
 
     Args:
         chunks_path (str): The path to the JSON file containing text chunks.
-        embeddings_path (str): The path to the JSON file containing embedding vectors.
+        embeddings_path (str): The path to the .npy or JSON file containing embedding vectors.
+        target (str): A Chroma directory for a PersistentClient, or an http://host:port URL for an HttpClient.
+        batch_size (int): Rows per upsert; capped at the client's maximum batch size.
+        pipeline (bool): Prepare the next batch while the current one is written.
+        bm25_path (str): Where to write the BM25 index for hybrid search; see default_bm25_path().
     """
     try:
-        # Load chunks from the JSON file
+        # Load chunks from the JSON file; with --metadata they are objects rather than strings
         with open(chunks_path, 'r') as f:
-            chunks: List[str] = json.load(f)
+            chunks: List[Any] = json.load(f)
+        metadatas = None
+        if chunks and isinstance(chunks[0], dict):
+            metadatas = [{k: v for k, v in chunk.items() if k not in ("text", "hierarchy")} for chunk in chunks]
+            for metadata, chunk in zip(metadatas, chunks):
+                if chunk.get("hierarchy"):
+                    metadata["hierarchy"] = " > ".join(chunk["hierarchy"])
+            chunks = [chunk["text"] for chunk in chunks]
 
-        # Load embeddings from the JSON file
-        with open(embeddings_path, 'r') as f:
-            embeddings: List[List[float]] = json.load(f)
+        embeddings, sidecar = load_any(embeddings_path)
 
         if len(chunks) != len(embeddings):
             print("Error: The number of chunks and embeddings do not match.", file=sys.stderr)
@@ -27,9 +57,9 @@ def ingest_data(chunks_path: str, embeddings_path: str):
 
         print(f"Loaded {len(chunks)} chunks and embeddings. Preparing to ingest into ChromaDB.", file=sys.stderr)
 
-        # Use a persistent client to ensure the data is saved to disk.
-        # This needs to be the same path as your collection lister script.
-        client = chromadb.PersistentClient(path="./chroma_data")
+        # A directory keeps the data on local disk; a URL writes through a Chroma server.
+        # The default needs to be the same path as your collection lister script.
+        client = get_client(target)
 
         # We'll create a collection to store our document data.
         # The Sentence-Transformers model has an output dimension of 384.
@@ -45,15 +75,20 @@ def ingest_data(chunks_path: str, embeddings_path: str):
             collection = client.get_collection(name="document_embeddings")
             print("Connected to existing ChromaDB collection: 'document_embeddings'", file=sys.stderr)
 
-        # Generate unique IDs for each document based on a simple counter
-        ids = [f"doc_{i}" for i in range(len(chunks))]
-        
-        # Add the documents to the collection
-        collection.add(
-            embeddings=embeddings,
-            documents=chunks,
-            ids=ids
-        )
+        # The binary format carries stable content-hash IDs; JSON embeddings fall back to a counter
+        ids = sidecar["ids"] if sidecar else [f"doc_{i}" for i in range(len(chunks))]
+
+        # Upsert in batches; re-running after a failure skips the batches already written
+        upserter = BatchedUpserter(collection, max_batch_size(client, batch_size),
+                                   checkpoint_path=embeddings_path + ".checkpoint.json", pipeline=pipeline)
+        upserter.write(len(chunks), array_batches(ids, chunks, metadatas, embeddings),
+                       job=fingerprint(ids, collection.name))
+        # Stamp the collection with a new version so RAG-Core drops cached results
+        version = str(time.time_ns())
+        collection.modify(metadata={"dimension": 384, "version": version})
+        bm25_path = bm25_path or default_bm25_path(target)
+        if bm25_path:
+            write_bm25(bm25_path, ids, chunks, version)
         print("Successfully ingested all documents into ChromaDB.", file=sys.stderr)
 
     except json.JSONDecodeError:
@@ -67,12 +102,15 @@ def ingest_data(chunks_path: str, embeddings_path: str):
         sys.exit(1)
 
 if __name__ == "__main__":
-    if len(sys.argv) < 3:
-        print("Error: Both a chunks JSON file and an embeddings JSON file must be provided.", file=sys.stderr)
-        print("Usage: python vector_db_writer.py <path_to_chunks_json> <path_to_embeddings_json>", file=sys.stderr)
-        sys.exit(1)
+    parser = argparse.ArgumentParser(description="Upsert chunks and their embeddings into ChromaDB.")
+    parser.add_argument("chunks_file", help="Chunks JSON written by the chunker.")
+    parser.add_argument("embeddings_file", help="Embeddings written by embed.py (.npy or JSON).")
+    parser.add_argument("--target", default="./chroma_data",
+                        help="Chroma directory (PersistentClient) or http://host:port (HttpClient).")
+    parser.add_argument("--batch-size", type=int, default=None, help="Rows per upsert (default 1000).")
+    parser.add_argument("--bm25", default=None,
+                        help="Path of the BM25 index for hybrid search (default: bm25.npz in a local --target).")
+    parser.add_argument("--no-pipeline", action="store_true", help="Prepare each batch only after the previous one is written.")
+    args = parser.parse_args()
 
-    chunks_file = sys.argv[1]
-    embeddings_file = sys.argv[2]
-    
-    ingest_data(chunks_file, embeddings_file)
\ No newline at end of file
+    ingest_data(args.chunks_file, args.embeddings_file, args.target, args.batch_size, not args.no_pipeline, args.bm25)
@@ -0,0 +1,232 @@
+import re
+from typing import Callable, Iterator, List, Optional, Tuple
+import fitz  # PyMuPDF library
+from fixedSizeChunking import Chunk, iter_normalized_pages, page_range
+
+# all-MiniLM-L6-v2 truncates its input at 256 word pieces
+DEFAULT_MAX_TOKENS = 256
+# Whole sections shorter than this are packed together with the next ones in the same chapter
+DEFAULT_MIN_TOKENS = 64
+# A heading this close to the end of the text read so far may continue on the next page
+HEADING_LOOKAHEAD = 320
+
+CHAPTER = re.compile(r"CHAPTER (?P<number>[IVXLC]+) (?P<title>(?:[A-Z][A-Z,’'&-]*\s?)*)")
+# "12. Title of the section.—". The dash tells a section heading apart from
+# the arrangement of sections at the top of an Act and from footnotes. A
+# title may contain "etc.," but no other full stop.
+SECTION = re.compile(r"(?<![\w(])(?P<number>\d{1,3})(?P<suffix>[A-Z]?)\. (?P<title>[A-Z](?:[^.—]|\.(?=[,;)])){1,200}?)\.\s?(?:—|--|-)")
+# "(1)" sub-sections and "(a)" clauses that start a new provision, not references like "sub-section (1)"
+SUBSECTION = re.compile(r"(?:(?<=[.;:—] )|(?<=[.;:—]))\((?P<label>\d{1,3}[A-Z]?)\) ")
+CLAUSE = re.compile(r"(?:(?<=[.;:—] )|(?<=[.;:—])|(?<= or )|(?<= and ))\((?P<label>[a-z]{1,4})\) ")
+SENTENCE = re.compile(r"(?<=[.;:]) ")
+TOKEN = re.compile(r"\w+|[^\w\s]")
+
+Piece = Tuple[int, int, Optional[str]]
+
+
+def approximate_token_count(text: str) -> int:
+    """
+    Counts words and punctuation marks, a close lower bound of a WordPiece token count.
+    """
+    return len(TOKEN.findall(text))
+
+
+def make_token_counter(model_name: str) -> Callable[[str], int]:
+    """
+    Returns a function that counts tokens with the model's own tokenizer.
+
+    Args:
+        model_name (str): A Hugging Face model name, e.g. 'sentence-transformers/all-MiniLM-L6-v2'.
+    """
+    from transformers import AutoTokenizer
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    return lambda text: len(tokenizer(text, add_special_tokens=False)["input_ids"])
+
+
+def _label_range(labels: List[str]) -> Optional[str]:
+    if not labels:
+        return None
+    return labels[0] if labels[0] == labels[-1] else f"{labels[0]}-{labels[-1]}"
+
+
+def _word_windows(text: str, count_tokens: Callable[[str], int], max_tokens: int) -> List[Piece]:
+    pieces = []
+    start = end = 0
+    tokens = 0
+    for word in re.finditer(r"\S+", text):
+        word_tokens = count_tokens(word.group())
+        if tokens and tokens + word_tokens > max_tokens:
+            pieces.append((start, end, None))
+            start, tokens = word.start(), 0
+        end = word.end()
+        tokens += word_tokens
+    if end > start:
+        pieces.append((start, end, None))
+    return pieces
+
+
+def split_to_fit(text: str, count_tokens: Callable[[str], int], max_tokens: int,
+                 levels=(SUBSECTION, CLAUSE, SENTENCE)) -> List[Piece]:
+    """
+    Splits a section into pieces of at most `max_tokens` tokens, cutting at
+    sub-sections first, then clauses, then sentences and, for a single
+    overlong sentence, between words. Consecutive provisions are packed into
+    one piece while they fit.
+
+    Returns:
+        List[Tuple[int, int, Optional[str]]]: (start, end, label) of each piece,
+        where the label names the provisions it covers, e.g. "(2)-(4)" or "(3)(a)-(c)".
+    """
+    if count_tokens(text) <= max_tokens:
+        return [(0, len(text), None)]
+    if not levels:
+        return _word_windows(text, count_tokens, max_tokens)
+
+    markers = [m for m in levels[0].finditer(text) if m.start() > 0]
+    if not markers:
+        return split_to_fit(text, count_tokens, max_tokens, levels[1:])
+    bounds = [0] + [m.start() for m in markers] + [len(text)]
+    labels = [None] + [f"({m.group('label')})" if "label" in m.groupdict() else None for m in markers]
+
+    pieces: List[Piece] = []
+    pack_start, pack_end, pack_tokens, pack_labels = 0, 0, 0, []
+
+    def flush():
+        if pack_end > pack_start:
+            pieces.append((pack_start, pack_end, _label_range(pack_labels)))
+
+    for start, end, label in zip(bounds, bounds[1:], labels):
+        segment = text[start:end]
+        tokens = count_tokens(segment)
+        if tokens > max_tokens:
+            flush()
+            for sub_start, sub_end, sub_label in split_to_fit(segment, count_tokens, max_tokens, levels[1:]):
+                combined = (label or "") + (sub_label or "") or None
+                pieces.append((start + sub_start, start + sub_end, combined))
+            pack_start, pack_end, pack_tokens, pack_labels = end, end, 0, []
+            continue
+        if pack_tokens and pack_tokens + tokens > max_tokens:
+            flush()
+            pack_start, pack_tokens, pack_labels = start, 0, []
+        pack_end = end
+        pack_tokens += tokens
+        if label:
+            pack_labels.append(label)
+    flush()
+    return pieces
+
+
+def iter_section_chunks(file_path: str, max_tokens: int = DEFAULT_MAX_TOKENS, min_tokens: int = DEFAULT_MIN_TOKENS,
+                        count_tokens: Callable[[str], int] = approximate_token_count) -> Iterator[Chunk]:
+    """
+    Streams section-aligned chunks of a statute.
+
+    CHAPTER headings and numbered section headings ("12. Title.—") are found
+    as pages are read. Each section becomes one chunk; a section longer than
+    `max_tokens` is split at its sub-sections and clauses, and consecutive
+    short sections of the same chapter are packed together up to `min_tokens`.
+    Text before the first section (title, arrangement of sections) is
+    chunked as "Preamble". Only the section being read and any short sections
+    waiting to be packed are held in memory.
+
+    Args:
+        file_path (str): The path to the PDF document.
+        max_tokens (int): The maximum number of tokens per chunk.
+        min_tokens (int): Sections shorter than this are packed with their neighbours.
+        count_tokens (Callable[[str], int]): Token counter; see make_token_counter.
+
+    Yields:
+        Chunk: Each chunk with its page range, character offsets and a
+        hierarchy path such as ("CHAPTER IV CONSUMER DISPUTES REDRESSAL
+        COMMISSION", "35. Manner in which complaint shall be made", "(1)").
+    """
+    buffer = ""
+    buffer_start = 0            # document offset of buffer[0]
+    page_marks = []             # (document offset, page number) of each page's first character
+    scan_from = 0               # document offset from which to look for the next section heading
+    unit_start = 0              # document offset where the section being read starts
+    unit_path: Tuple[str, ...] = ("Preamble",)
+    unit_number = None
+    chapter = None
+    last_section = (0, "")
+    pending = []                # (start, end, path, section number, tokens) of short sections to pack
+
+    def text_at(start: int, end: int) -> str:
+        return buffer[start - buffer_start:end - buffer_start]
+
+    def make_chunk(start: int, end: int, path: Tuple[str, ...]) -> Chunk:
+        page_start, page_end = page_range(page_marks, start, end)
+        return Chunk(text_at(start, end), file_path, page_start, page_end, start, end, path)
+
+    def flush_pending() -> Iterator[Chunk]:
+        if not pending:
+            return
+        start, end, path = pending[0][0], pending[-1][1], pending[0][2]
+        if len(pending) > 1:
+            path = path[:-1] + (f"Sections {pending[0][3]}-{pending[-1][3]}",)
+        pending.clear()
+        yield make_chunk(start, end, path)
+
+    def close_unit(start: int, end: int, path: Tuple[str, ...], number: Optional[str]) -> Iterator[Chunk]:
+        text = text_at(start, end)
+        start += len(text) - len(text.lstrip())
+        end -= len(text) - len(text.rstrip())
+        if end <= start:
+            return
+        tokens = count_tokens(text_at(start, end))
+        if tokens > max_tokens:
+            yield from flush_pending()
+            for piece_start, piece_end, label in split_to_fit(text_at(start, end), count_tokens, max_tokens):
+                piece_text = text_at(start + piece_start, start + piece_end)
+                lead = len(piece_text) - len(piece_text.lstrip())
+                trail = len(piece_text) - len(piece_text.rstrip())
+                yield make_chunk(start + piece_start + lead, start + piece_end - trail,
+                                 path + ((label,) if label else ()))
+            return
+        packed = sum(entry[4] for entry in pending)
+        if pending and (packed >= min_tokens or packed + tokens > max_tokens or number is None
+                        or pending[0][3] is None or pending[0][2][:-1] != path[:-1]):
+            yield from flush_pending()
+        pending.append((start, end, path, number, tokens))
+
+    def take_units(final: bool) -> Iterator[Chunk]:
+        nonlocal scan_from, unit_start, unit_path, unit_number, chapter, last_section
+        for match in SECTION.finditer(buffer, scan_from - buffer_start):
+            if not final and match.end() > len(buffer) - HEADING_LOOKAHEAD:
+                break
+            scan_from = match.end() + buffer_start
+            number = (int(match.group("number")), match.group("suffix"))
+            if number <= last_section:
+                continue
+            last_section = number
+            # A chapter heading between the previous section and this one opens a new chapter
+            boundary = match.start()
+            for chapter_match in CHAPTER.finditer(buffer, unit_start - buffer_start, match.start()):
+                if chapter_match.start() > unit_start - buffer_start:
+                    boundary = chapter_match.start()
+                    chapter = f"CHAPTER {chapter_match.group('number')} {chapter_match.group('title').strip()}".strip()
+            yield from close_unit(unit_start, boundary + buffer_start, unit_path, unit_number)
+            unit_start = boundary + buffer_start
+            unit_number = f"{number[0]}{number[1]}"
+            unit_path = tuple(p for p in (chapter, f"{unit_number}. {match.group('title').strip()}") if p)
+
+    def trim():
+        nonlocal buffer, buffer_start
+        keep_from = pending[0][0] if pending else unit_start
+        buffer = buffer[keep_from - buffer_start:]
+        buffer_start = keep_from
+        while len(page_marks) > 1 and page_marks[1][0] <= keep_from:
+            page_marks.pop(0)
+
+    with fitz.open(file_path) as doc:
+        for page_number, text in iter_normalized_pages(doc):
+            page_marks.append((buffer_start + len(buffer) + (1 if text.startswith(' ') else 0), page_number))
+            buffer += text
+            yield from take_units(final=False)
+            trim()
+
+    if not page_marks:
+        return
+    yield from take_units(final=True)
+    yield from close_unit(unit_start, buffer_start + len(buffer), unit_path, unit_number)
+    yield from flush_pending()
@@ -0,0 +1,319 @@
+import json
+import os
+import re
+import sys
+import threading
+import time
+from typing import Dict, Iterable, List, NamedTuple, Optional, Pattern, Tuple
+
+try:
+    # The regex parser moved under re in Python 3.11; the old modules are deprecated
+    from re import _constants as sre_constants, _parser as sre_parse
+except ImportError:
+    import sre_constants
+    import sre_parse
+
+DEFAULT_RULES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "rules.json")
+
+# What a rule does when it fires:
+#   block      - replace the whole response with the rule's message
+#   disclaimer - let the response through with the rule's message appended
+#   flag       - let the response through unchanged, only report the match
+ACTIONS = ("block", "disclaimer", "flag")
+
+
+class Rule(NamedTuple):
+    id: str
+    type: str          # "keyword" (case-insensitive substring) or "regex"
+    pattern: str
+    action: str
+    category: str
+    message: str
+    ignore_case: bool
+
+
+class RuleMatch(NamedTuple):
+    rule_id: str
+    category: str
+    action: str
+    start: int
+    end: int
+    text: str
+
+
+def load_rules(path: str) -> List[Rule]:
+    """
+    Reads a rule set from a JSON file of the form
+    {"rules": [{"id", "type", "pattern", "action", "category", "message"}, ...]}.
+    """
+    with open(path, "r") as f:
+        data = json.load(f)
+    rules = []
+    for entry in data.get("rules", []):
+        rule = Rule(
+            id=entry["id"],
+            type=entry.get("type", "keyword"),
+            pattern=entry["pattern"],
+            action=entry.get("action", "block"),
+            category=entry.get("category", "general"),
+            message=entry.get("message", ""),
+            ignore_case=entry.get("ignore_case", entry.get("type", "keyword") == "keyword"),
+        )
+        if rule.type not in ("keyword", "regex"):
+            raise ValueError(f"Rule '{rule.id}' has unknown type '{rule.type}'.")
+        if rule.action not in ACTIONS:
+            raise ValueError(f"Rule '{rule.id}' has unknown action '{rule.action}'.")
+        rules.append(rule)
+    return rules
+
+
+def trie_regex(words: Iterable[str]) -> str:
+    """
+    Builds a regex that matches any of the words, with shared prefixes factored
+    into a trie: "harm", "harmful" and "hate" become h(?:arm(?:ful)?|ate).
+    The regex engine then follows one branch per character instead of trying
+    every word at every position, so its cost barely grows with the word count.
+    At each position the longest word wins.
+    """
+    trie: Dict = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[""] = True
+
+    def build(node: Dict) -> str:
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char != ""]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        if "" in node:
+            return "(?:" + body + ")?"
+        return body
+
+    return build(trie)
+
+
+def literal_prefix(pattern: str, flags: int = 0) -> str:
+    """
+    Returns the literal text every match of a regex starts with, skipping
+    leading anchors such as \\b, or "" if the regex can start with a choice
+    of characters. "\\bsection\\s+\\d+" gives "section".
+    """
+    prefix = []
+    for op, value in sre_parse.parse(pattern, flags):
+        if op is sre_constants.AT:
+            if prefix:
+                break
+            continue
+        if op is not sre_constants.LITERAL:
+            break
+        prefix.append(chr(value))
+    return "".join(prefix)
+
+
+class CompiledRuleSet:
+    """
+    A rule set compiled for a single pass over a response.
+
+    Every keyword, plus the literal prefix of every regex rule that has one
+    (see literal_prefix), goes into one trie. The trie is searched on the
+    lowercased text, so the regex engine skips ahead to the next position
+    where any of them can start, and at each hit the keywords found there are
+    reported and the regex rules with that prefix are tried at that position
+    only. The trie is searched again from the next character, so a match for
+    one rule never hides a match for another rule that overlaps it. Keyword
+    rules and prefixed regex rules thus cost one scan together, however many
+    there are. A regex rule without a literal prefix (one starting with a
+    character class, such as the PII patterns) is scanned on its own, so each
+    of those adds a pass over the response.
+    """
+    def __init__(self, rules: List[Rule]):
+        self.rules = rules
+        self.rules_by_id = {rule.id: rule for rule in rules}
+        self.keyword_rules: Dict[str, List[Rule]] = {}
+        # Regex rules keyed by their lowercased literal prefix, and those without one
+        self.prefixed_rules: Dict[str, List[Tuple[Rule, Pattern]]] = {}
+        # (rule, pattern, max_lengths[rule.id]) for the regex rules without a prefix
+        self.unprefixed_rules: List[Tuple[Rule, Pattern, int]] = []
+
+        # The most characters a match of each rule can span
+        self.max_lengths: Dict[str, int] = {}
+        # How far back a match of any rule found through the trie can start
+        self.trie_reach = 0
+
+        for rule in rules:
+            if rule.type == "keyword":
+                self.keyword_rules.setdefault(rule.pattern.lower(), []).append(rule)
+                self.max_lengths[rule.id] = len(rule.pattern)
+                self.trie_reach = max(self.trie_reach, len(rule.pattern))
+                continue
+            flags = re.IGNORECASE if rule.ignore_case else 0
+            compiled = re.compile(rule.pattern, flags)
+            self.max_lengths[rule.id] = sre_parse.parse(rule.pattern, flags).getwidth()[1]
+            prefix = literal_prefix(rule.pattern, flags).lower()
+            if prefix:
+                self.prefixed_rules.setdefault(prefix, []).append((rule, compiled))
+                self.trie_reach = max(self.trie_reach, self.max_lengths[rule.id])
+            else:
+                self.unprefixed_rules.append((rule, compiled, self.max_lengths[rule.id]))
+
+        literals = set(self.keyword_rules) | set(self.prefixed_rules)
+        # The trie only reports the longest literal at a position; shorter
+        # ones that are prefixes of it are looked up by length
+        self.literal_lengths = sorted({len(literal) for literal in literals})
+        self.trie = re.compile(trie_regex(literals)) if literals else None
+        # The same trie for texts whose lowercase form changes length
+        self.trie_ignore_case = re.compile(trie_regex(literals), re.IGNORECASE) if literals else None
+
+    def scan(self, text: str) -> List[RuleMatch]:
+        """
+        Returns every rule match in the text, in order of position.
+        """
+        return self.scan_from(text, 0)
+
+    def scan_from(self, text: str, pos: int) -> List[RuleMatch]:
+        """
+        Returns every rule match starting at or after `pos`, in order of
+        position. The text before `pos` is still visible to \\b and look-behinds.
+        """
+        return self.scan_appended(text, pos, pos, 0)
+
+    def scan_appended(self, text: str, pos: int, appended: int, max_length: int) -> List[RuleMatch]:
+        """
+        Rescans a text after more was appended at offset `appended`, when
+        scan_from(text[:appended], pos) has already been seen. Returns the
+        matches starting at or after `pos` that can involve the new text,
+        counting no match longer than `max_length`: each rule is rescanned
+        only from as far before `appended` as its own matches can reach, so
+        a short addition costs about its own length. Matches already
+        reported may be returned again.
+        """
+        matches = []
+        if self.trie is not None:
+            self._scan_trie(text, max(pos, appended - min(self.trie_reach, max_length)), matches)
+        for rule, compiled, reach in self.unprefixed_rules:
+            for match in compiled.finditer(text, max(pos, appended - min(reach, max_length))):
+                matches.append(RuleMatch(rule.id, rule.category, rule.action, match.start(), match.end(),
+                                         match.group()))
+        matches.sort(key=lambda match: match.start)
+        return matches
+
+    def _scan_trie(self, text: str, pos: int, matches: List[RuleMatch]):
+        # Matches of different rules may overlap; each rule on its own stays
+        # non-overlapping, as finditer would report it
+        rule_end: Dict[str, int] = {}
+        lowered = text[pos:].lower()
+        if len(lowered) == len(text) - pos:
+            trie = self.trie
+        else:
+            lowered, trie = text[pos:], self.trie_ignore_case
+        hit = trie.search(lowered)
+        while hit is not None:
+            start = hit.start() + pos
+            found = hit.group().lower()
+            for length in self.literal_lengths:
+                if length > len(found):
+                    break
+                literal = found[:length]
+                for rule in self.keyword_rules.get(literal, []):
+                    if start >= rule_end.get(rule.id, -1):
+                        rule_end[rule.id] = start + length
+                        matches.append(RuleMatch(rule.id, rule.category, rule.action, start, start + length,
+                                                 text[start:start + length]))
+                for rule, compiled in self.prefixed_rules.get(literal, []):
+                    if start < rule_end.get(rule.id, -1):
+                        continue
+                    match = compiled.match(text, start)
+                    if match is not None:
+                        rule_end[rule.id] = match.end()
+                        matches.append(RuleMatch(rule.id, rule.category, rule.action, start, match.end(),
+                                                 match.group()))
+            hit = trie.search(lowered, hit.start() + 1)
+
+
+class GuardrailEngine:
+    """
+    Loads a rule set from a JSON file and hot-reloads it when the file changes.
+    """
+    def __init__(self, rules_path: str = DEFAULT_RULES_PATH, reload_interval: float = 2.0):
+        """
+        Args:
+            rules_path (str): Path to the JSON rule file.
+            reload_interval (float): Minimum seconds between checks of the file's mtime.
+        """
+        self.rules_path = rules_path
+        self.reload_interval = reload_interval
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._checked_at = 0.0
+        self.compiled = CompiledRuleSet([])
+        self.reload(force=True)
+
+    def reload(self, force: bool = False) -> bool:
+        """
+        Recompiles the rule set if the file has changed. A broken rule file is
+        reported and the previous rule set stays active.
+
+        Returns:
+            bool: True if a new rule set was loaded.
+        """
+        now = time.monotonic()
+        if not force and now - self._checked_at < self.reload_interval:
+            return False
+        with self._lock:
+            self._checked_at = now
+            try:
+                mtime = os.path.getmtime(self.rules_path)
+                if not force and mtime == self._mtime:
+                    return False
+                compiled = CompiledRuleSet(load_rules(self.rules_path))
+            except (OSError, ValueError, KeyError, re.error) as e:
+                print(f"Failed to load guardrail rules from '{self.rules_path}': {e}", file=sys.stderr)
+                return False
+            self.compiled = compiled
+            self._mtime = mtime
+        print(f" [i] Loaded {len(compiled.rules)} guardrail rules from '{self.rules_path}'.", file=sys.stderr)
+        return True
+
+    def scan(self, text: str) -> List[RuleMatch]:
+        """
+        Returns every rule match in the text, reloading the rule set first if it changed.
+        """
+        self.reload()
+        return self.compiled.scan(text)
+
+    def evaluate(self, text: str) -> Tuple[str, List[RuleMatch]]:
+        """
+        Applies the rule actions to a response.
+
+        Returns:
+            Tuple[str, List[RuleMatch]]: The text to show the user and the matches found.
+        """
+        self.reload()
+        compiled = self.compiled
+        matches = compiled.scan(text)
+        for match in matches:
+            if match.action == "block":
+                return compiled.rules_by_id[match.rule_id].message, matches
+        disclaimers = []
+        for match in matches:
+            message = compiled.rules_by_id[match.rule_id].message
+            if match.action == "disclaimer" and message not in disclaimers:
+                disclaimers.append(message)
+        if disclaimers:
+            text = text.rstrip() + "\n\n" + "\n".join(disclaimers)
+        return text, matches
+
+
+_default_engine: Optional[GuardrailEngine] = None
+
+
+def get_engine() -> GuardrailEngine:
+    """
+    Returns the process-wide engine for the rule file named by GUARDRAIL_RULES.
+    """
+    global _default_engine
+    if _default_engine is None:
+        _default_engine = GuardrailEngine(os.getenv("GUARDRAIL_RULES", DEFAULT_RULES_PATH))
+    return _default_engine
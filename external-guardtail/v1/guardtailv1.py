@@ -1,43 +1,111 @@
 import sys
 import os
-import re
+
+# Add the project root to the system path to allow importing the shared package
+# when this script is run from its own directory.
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(os.path.dirname(current_dir)))
+
+from shared.queueManager import QueueManager
+from shared.envelope import parse_envelope, stamp, dumps
+from shared.instrumentation import get_logger, substage
+from guardrailEngine import get_engine
+from streamingGuard import StreamingGuard
+
+log = get_logger("guardrail")
 
 def check_safety(llm_response: str) -> str:
     """
     Scans the LLM's response for unsafe or inappropriate content.
 
-    This is a basic implementation that checks for a predefined list of
-    unwanted keywords and sensitive information patterns.
+    The rules (banned keywords, PII patterns, legal-advice disclaimers) are
+    loaded from the rule file named by GUARDRAIL_RULES (rules.json by default),
+    compiled into a single-pass matcher, and reloaded when the file changes.
 
     Args:
         llm_response (str): The text generated by the LLM.
 
     Returns:
-        str: The original response if it's safe, or a generic safety message.
+        str: The original response if it's safe (with any disclaimers appended),
+        or the safety message of the first blocking rule.
     """
-    # A list of keywords to flag. In a production system, this would be a more
-    # sophisticated classification model or a comprehensive list.
-    unsafe_keywords = ["unethical", "dangerous", "illegal", "harmful", "sensitive"]
-    
-    # A basic regex to detect PII like email addresses, even though the
-    # initial PII filter should have caught this.
-    pii_pattern = r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b'
-    
-    # Check for keywords
-    for keyword in unsafe_keywords:
-        if keyword in llm_response.lower():
-            print(f"Detected unsafe keyword: {keyword}", file=sys.stderr)
-            return "I'm sorry, I cannot provide a response for that query. If you believe this is an error, please try again."
-            
-    # Check for PII patterns
-    if re.search(pii_pattern, llm_response):
-        print("Detected PII in response.", file=sys.stderr)
-        return "I'm sorry, I cannot provide a response that contains sensitive information."
-
-    # If all checks pass, the response is considered safe.
-    return llm_response
+    final_response, matches = get_engine().evaluate(llm_response)
+    for match in matches:
+        print(f"Guardrail rule '{match.rule_id}' ({match.category}, {match.action}) matched at {match.start}-{match.end}", file=sys.stderr)
+    return final_response
+
+def check_stream(stream, chunk_size: int = 64):
+    """
+    Checks a response as it is read from a stream and writes verified-safe text
+    to standard output as soon as it is released, instead of waiting for the
+    whole response. If a blocking rule fires, the output is cut off and the
+    rule's safety message is printed.
+
+    Args:
+        stream: A text stream such as sys.stdin.
+        chunk_size (int): Maximum characters read per chunk.
+    """
+    guard = StreamingGuard()
+    while guard.blocked is None:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        sys.stdout.write(guard.feed(chunk))
+        sys.stdout.flush()
+    tail = guard.finish()
+    if guard.blocked is not None:
+        print(f"Guardrail rule '{guard.blocked.rule_id}' fired mid-stream", file=sys.stderr)
+        print("\n" + guard.block_message)
+    else:
+        print(tail)
+
+def guardrail_callback(ch, method, properties, body):
+    """
+    Callback function for the guardrail stage. It checks the LLM response in
+    the envelope and replies to the client that sent the original request.
+    """
+    envelope = parse_envelope(body)
+    with substage("guardrail", "guard"):
+        envelope["response"], matches = get_engine().evaluate(envelope.get("response", ""))
+    for match in matches:
+        log.info("guardrail rule matched", correlation_id=envelope["correlation_id"], rule=match.rule_id,
+                 category=match.category, action=match.action)
+    envelope["guardrail_matches"] = [match._asdict() for match in matches]
+    stamp(envelope, "guardrail")
+
+    if envelope.get("reply_to"):
+        queue_manager.send_reply(envelope["reply_to"], dumps(envelope), envelope["correlation_id"])
+    else:
+        log.warning("no reply_to; dropping the response", correlation_id=envelope["correlation_id"])
+
+def bind_queue_manager(publisher):
+    """
+    Installs the publisher the callback uses to reply to clients.
+    """
+    global queue_manager
+    queue_manager = publisher
+
+def run_worker():
+    """
+    Runs the guardrail stage: consumes 'guardrail_queue' and replies to each client's reply queue.
+    """
+    global queue_manager
+    queue_manager = QueueManager()
+    try:
+        queue_manager.start_listening(queue_name='guardrail_queue', callback=guardrail_callback)
+    except KeyboardInterrupt:
+        print('Interrupted. Exiting...')
+    finally:
+        queue_manager.close()
 
 if __name__ == "__main__":
+    if len(sys.argv) == 2 and sys.argv[1] == "--worker":
+        run_worker()
+        sys.exit(0)
+    if len(sys.argv) == 2 and sys.argv[1] == "--stream":
+        check_stream(sys.stdin)
+        sys.exit(0)
+
     # Read the full response from standard input
     llm_response = sys.stdin.read()
     
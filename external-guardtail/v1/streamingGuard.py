@@ -0,0 +1,157 @@
+import os
+from typing import List, Optional, Tuple
+from guardrailEngine import CompiledRuleSet, GuardrailEngine, RuleMatch, get_engine
+
+# Characters held back from the client until they are known to be safe. Any
+# rule match up to this long is caught before its first character is shown.
+STREAM_WINDOW = int(os.getenv("GUARDRAIL_STREAM_WINDOW", 64))
+# Characters of already-released text kept for \b and look-behinds at the scan start
+LEFT_CONTEXT = 16
+
+
+class StreamingGuard:
+    """
+    Checks an LLM response chunk by chunk as it is generated.
+
+    Text is released once it is at least `window` characters behind the end
+    of what has arrived, so a rule match is always complete, and rejected,
+    before any of it reaches the client. Each new chunk is checked
+    incrementally: a rule is rescanned only from as far before the chunk as
+    one of its matches can reach (see CompiledRuleSet.scan_appended), so
+    keywords and fixed-length patterns cost about the chunk's length. A
+    pattern of unbounded length, such as the e-mail rule, still rescans the
+    unreleased text, which bounds its cost by the window. A match that ends
+    exactly at the end of the buffer is held as tentative, because the next
+    chunk may extend it (or, for patterns ending in \\b, invalidate it); it
+    only fires once text after it has arrived or the stream is finished.
+    """
+    def __init__(self, engine: Optional[GuardrailEngine] = None, window: int = STREAM_WINDOW):
+        """
+        Args:
+            engine (GuardrailEngine): Source of the rule set; defaults to the process-wide engine.
+            window (int): Characters held back; raised to the longest keyword if shorter.
+        """
+        engine = engine or get_engine()
+        engine.reload()
+        # Keep one rule set for the whole response even if the file is reloaded mid-stream
+        self.compiled: CompiledRuleSet = engine.compiled
+        longest_keyword = max((len(k) for k in self.compiled.keyword_rules), default=0)
+        self.window = max(window, longest_keyword)
+        self._buffer = ""      # unreleased text plus LEFT_CONTEXT characters before it
+        self._base = 0         # absolute offset of _buffer[0]
+        self.released = 0      # absolute offset up to which text has been released
+        self._scanned = 0      # absolute offset up to which text has been scanned
+        self.matches: List[RuleMatch] = []
+        self._seen = set()
+        self.blocked: Optional[RuleMatch] = None
+        self.finished = False
+
+    def _scan(self, final: bool) -> Optional[int]:
+        """
+        Scans the text added since the last scan, recording new matches and
+        setting `blocked` if a blocking rule fired. Returns the absolute start
+        of the earliest tentative match, if any.
+        """
+        tentative_start = None
+        end_of_buffer = len(self._buffer)
+        found = self.compiled.scan_appended(self._buffer, self.released - self._base, self._scanned - self._base,
+                                            self.window)
+        self._scanned = self._base + end_of_buffer
+        for match in found:
+            if match.end == end_of_buffer and not final:
+                if tentative_start is None:
+                    tentative_start = match.start + self._base
+                continue
+            absolute = match._replace(start=match.start + self._base, end=match.end + self._base)
+            key = (absolute.rule_id, absolute.start)
+            if key in self._seen:
+                continue
+            self._seen.add(key)
+            self.matches.append(absolute)
+            if absolute.action == "block" and self.blocked is None:
+                self.blocked = absolute
+        return tentative_start
+
+    def _release(self, upto: int) -> str:
+        if upto <= self.released:
+            return ""
+        text = self._buffer[self.released - self._base:upto - self._base]
+        self.released = upto
+        # Drop released text apart from the context the next scan needs
+        keep_from = max(self._base, upto - LEFT_CONTEXT)
+        self._buffer = self._buffer[keep_from - self._base:]
+        self._base = keep_from
+        return text
+
+    def feed(self, chunk: str) -> str:
+        """
+        Adds a chunk of the response.
+
+        Returns:
+            str: Text that is now verified safe and can be shown, possibly empty.
+            Nothing more is released once a blocking rule has fired; check `blocked`.
+        """
+        if self.blocked is not None or self.finished:
+            return ""
+        self._buffer += chunk
+        tentative_start = self._scan(final=False)
+        if self.blocked is not None:
+            return ""
+        safe_end = self._base + len(self._buffer) - self.window
+        if tentative_start is not None:
+            safe_end = min(safe_end, tentative_start)
+        return self._release(safe_end)
+
+    def finish(self) -> str:
+        """
+        Ends the stream, checking and releasing the held-back tail.
+
+        Returns:
+            str: The remaining safe text followed by any disclaimers, or an
+            empty string if a blocking rule fired.
+        """
+        if self.finished or self.blocked is not None:
+            self.finished = True
+            return ""
+        self.finished = True
+        self._scan(final=True)
+        if self.blocked is not None:
+            return ""
+        tail = self._release(self._base + len(self._buffer))
+        disclaimers = []
+        for match in self.matches:
+            message = self.compiled.rules_by_id[match.rule_id].message
+            if match.action == "disclaimer" and message not in disclaimers:
+                disclaimers.append(message)
+        if disclaimers:
+            tail = tail.rstrip() + "\n\n" + "\n".join(disclaimers)
+        return tail
+
+    @property
+    def block_message(self) -> Optional[str]:
+        """
+        The message to show instead of the response, if a blocking rule fired.
+        """
+        if self.blocked is None:
+            return None
+        return self.compiled.rules_by_id[self.blocked.rule_id].message
+
+
+def guard_stream(chunks, engine: Optional[GuardrailEngine] = None,
+                 window: int = STREAM_WINDOW) -> Tuple[List[str], StreamingGuard]:
+    """
+    Runs an iterable of chunks through a StreamingGuard, stopping at the first
+    blocking match. Returns the released pieces and the guard.
+    """
+    guard = StreamingGuard(engine, window)
+    released = []
+    for chunk in chunks:
+        piece = guard.feed(chunk)
+        if piece:
+            released.append(piece)
+        if guard.blocked is not None:
+            break
+    tail = guard.finish()
+    if tail:
+        released.append(tail)
+    return released, guard
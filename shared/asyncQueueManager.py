@@ -0,0 +1,314 @@
+import asyncio
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+from typing import Awaitable, Callable, Iterable
+import aio_pika
+from shared.flowControl import DEAD_LETTER_QUEUE, PIPELINE_QUEUES, Backpressure, FlowControl, QueueFullError
+from shared.instrumentation import (QUEUE_DEPTH, QUEUE_DEPTH_INTERVAL_S, REJECTED, get_logger, instrument_callback,
+                                    instrument_handler, start_metrics_server)
+
+log = get_logger("queue")
+
+
+class AsyncQueueManager:
+    """
+    An asyncio counterpart of QueueManager built on aio-pika.
+
+    A stage can process up to `concurrency` messages at once: the broker's
+    prefetch window and a semaphore both bound the number of in-flight handlers.
+    Native handlers (see serve_handler) await their publishes directly and hand
+    blocking calls, such as the query encode, a ChromaDB search or reading
+    the Ollama stream, to `run_blocking`, so the event loop keeps consuming
+    while they wait. The encoders and HTTP clients release the GIL, so a
+    thread pool suffices and the resident model need not be copied into
+    worker processes. Messages are acked when the handler returns and
+    rejected if it raises. Queues are declared with the same flow-control
+    arguments as QueueManager's.
+    """
+    def __init__(self, rabbitmq_host='rabbitmq', concurrency: int = 8, flow_control: FlowControl = FlowControl()):
+        """
+        Args:
+            rabbitmq_host (str): Host name of the RabbitMQ broker.
+            concurrency (int): Maximum number of messages handled at once.
+            flow_control (FlowControl): Length limits, overflow policy, priority lanes and
+                backpressure threshold for the pipeline queues.
+        """
+        self.rabbitmq_host = rabbitmq_host
+        self.flow_control = flow_control
+        self.backpressure = Backpressure(self.queue_depth_from_thread, flow_control)
+        self.concurrency = concurrency
+        self.connection = None
+        self.channel = None
+        self.loop = None
+        self._queues = {}
+        self._semaphore = None
+        self._thread_pool = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="stage-worker")
+
+    async def connect(self):
+        """
+        Opens a robust connection that re-establishes itself (and its consumers)
+        after a broker restart.
+        """
+        self.loop = asyncio.get_running_loop()
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        try:
+            self.connection = await aio_pika.connect_robust(host=self.rabbitmq_host)
+        except Exception as e:
+            print(f"Error: Could not connect to RabbitMQ at '{self.rabbitmq_host}'. Please ensure the service is running. Details: {e}", file=sys.stderr)
+            raise
+        self.channel = await self.connection.channel(publisher_confirms=True)
+        await self.channel.set_qos(prefetch_count=self.concurrency)
+        print(" [i] Connected to RabbitMQ (asyncio).")
+
+    async def declare_queue(self, queue_name: str):
+        """
+        Declares a queue once and caches the handle.
+        """
+        if queue_name not in self._queues:
+            if self.flow_control.dead_letters and queue_name in PIPELINE_QUEUES:
+                await self.declare_queue(DEAD_LETTER_QUEUE)
+            self._queues[queue_name] = await self.channel.declare_queue(
+                queue_name, arguments=self.flow_control.queue_arguments(queue_name))
+        return self._queues[queue_name]
+
+    async def queue_depth(self, queue_name: str) -> int:
+        """
+        Returns the number of messages ready in a queue; re-declaring an
+        existing queue is idempotent and reports its depth.
+        """
+        queue = await self.declare_queue(queue_name)
+        declared = await queue.declare()
+        return declared.message_count
+
+    def queue_depth_from_thread(self, queue_name: str) -> int:
+        """
+        queue_depth() for callers on a thread other than the event loop's.
+        """
+        future = asyncio.run_coroutine_threadsafe(self.queue_depth(queue_name), self.loop)
+        return future.result()
+
+    async def send_message(self, queue_name: str, message: str, **properties):
+        """
+        Publishes a message to a queue and waits for the broker's confirm.
+
+        Args:
+            queue_name (str): The name of the queue.
+            message (str): The message to send.
+            **properties: Optional aio_pika.Message properties (headers, correlation_id, priority, ...).
+
+        Raises:
+            QueueFullError: If the queue is at its maximum length.
+        """
+        await self.declare_queue(queue_name)
+        try:
+            await self.channel.default_exchange.publish(
+                aio_pika.Message(body=message.encode('utf-8'), **properties),
+                routing_key=queue_name,
+            )
+        except aio_pika.exceptions.DeliveryError:
+            REJECTED.inc(queue=queue_name)
+            raise QueueFullError(queue_name)
+        log.debug("sent", queue=queue_name)
+
+    async def send_messages(self, queue_name: str, messages: Iterable[str], **properties) -> int:
+        """
+        Publishes a batch of messages and waits for all of their confirms together.
+
+        Returns:
+            int: The number of messages confirmed by the broker.
+
+        Raises:
+            QueueFullError: If the queue refused some of the messages; its
+                `unsent` lists them, and the others were published.
+        """
+        await self.declare_queue(queue_name)
+        publishes = [
+            self.channel.default_exchange.publish(
+                aio_pika.Message(body=message.encode('utf-8'), **properties), routing_key=queue_name)
+            for message in messages
+        ]
+        results = await asyncio.gather(*publishes, return_exceptions=True)
+        unsent = []
+        for index, result in enumerate(results):
+            if isinstance(result, aio_pika.exceptions.DeliveryError):
+                unsent.append(index)
+            elif isinstance(result, BaseException):
+                raise result
+        if unsent:
+            REJECTED.inc(len(unsent), queue=queue_name)
+            raise QueueFullError(queue_name, unsent=unsent)
+        log.debug("sent batch", queue=queue_name, messages=len(publishes))
+        return len(publishes)
+
+    async def forward(self, queue_name: str, message: str, **properties):
+        """
+        Publishes to the next pipeline queue like send_message, first waiting
+        (on the thread pool) while the queue's backlog is over the high-water
+        mark, as QueueManager.send_message does.
+
+        Raises:
+            QueueFullError: If the queue is at its maximum length.
+        """
+        await self.run_blocking(self.backpressure.wait, queue_name)
+        await self.send_message(queue_name, message, **properties)
+
+    async def send_reply(self, reply_to: str, message: str, correlation_id: str):
+        """
+        Publishes a reply to a client's reply queue without declaring it (the
+        queue is exclusive to the client's connection).
+        """
+        await self.channel.default_exchange.publish(
+            aio_pika.Message(body=message.encode('utf-8'), correlation_id=correlation_id),
+            routing_key=reply_to,
+        )
+
+    async def run_blocking(self, func: Callable, *args):
+        """
+        Runs a blocking function (e.g. a synchronous HTTP client call) on the thread pool.
+        """
+        return await self.loop.run_in_executor(self._thread_pool, func, *args)
+
+    async def start_listening(self, queue_name: str, handler: Callable[[aio_pika.IncomingMessage], Awaitable[None]]):
+        """
+        Consumes a queue with up to `concurrency` handlers running at once.
+        This coroutine runs until cancelled.
+
+        Args:
+            queue_name (str): The name of the queue to listen to.
+            handler: An async function called with each aio_pika.IncomingMessage.
+        """
+        queue = await self.declare_queue(queue_name)
+
+        async def on_message(message: aio_pika.IncomingMessage):
+            async with self._semaphore:
+                # Requeue a failed message once; drop it if it fails again on redelivery
+                async with message.process(requeue=not message.redelivered, ignore_processed=True):
+                    await handler(message)
+
+        await queue.consume(on_message)
+        print(f' [*] Waiting for messages on {queue_name} (concurrency={self.concurrency}). To exit press CTRL+C')
+        start_metrics_server()
+        while True:
+            try:
+                QUEUE_DEPTH.set(await self.queue_depth(queue_name), queue=queue_name)
+            except Exception as e:
+                log.debug("queue depth unavailable", queue=queue_name, error=str(e))
+            await asyncio.sleep(QUEUE_DEPTH_INTERVAL_S)
+
+    def blocking_facade(self) -> "BlockingPublisher":
+        """
+        Returns an object with QueueManager's synchronous publishing API that
+        can be used from worker threads, so existing callbacks run unchanged.
+        """
+        return BlockingPublisher(self)
+
+    async def close(self):
+        """
+        Closes the connection and shuts down the worker pool.
+        """
+        if self.connection and not self.connection.is_closed:
+            await self.connection.close()
+            print(" [i] Closed connection to RabbitMQ.")
+        self._thread_pool.shutdown(wait=False)
+
+
+class BlockingPublisher:
+    """
+    Synchronous publishing facade over an AsyncQueueManager, for use from
+    threads other than the event loop's. Publishes to a queue with a long
+    backlog block the calling worker thread, not the event loop.
+    """
+    def __init__(self, manager: AsyncQueueManager):
+        self.manager = manager
+        self.backpressure = Backpressure(self.queue_depth, manager.flow_control)
+
+    def queue_depth(self, queue_name: str) -> int:
+        return self.manager.queue_depth_from_thread(queue_name)
+
+    def send_message(self, queue_name: str, message: str, **properties):
+        self.backpressure.wait(queue_name)
+        future = asyncio.run_coroutine_threadsafe(
+            self.manager.send_message(queue_name, message, **properties), self.manager.loop)
+        return future.result()
+
+    def send_messages(self, queue_name: str, messages: Iterable[str], **properties) -> int:
+        self.backpressure.wait(queue_name)
+        future = asyncio.run_coroutine_threadsafe(
+            self.manager.send_messages(queue_name, list(messages), **properties), self.manager.loop)
+        return future.result()
+
+    def send_reply(self, reply_to: str, message: str, correlation_id: str):
+        future = asyncio.run_coroutine_threadsafe(
+            self.manager.send_reply(reply_to, message, correlation_id), self.manager.loop)
+        return future.result()
+
+    def close(self):
+        pass
+
+
+def adapt_callback(manager: AsyncQueueManager, callback: Callable):
+    """
+    Wraps a pika-style callback(ch, method, properties, body) as an async
+    handler. The callback runs on the manager's thread pool; acknowledgement is
+    handled by the manager, so the callback must not ack itself.
+
+    Args:
+        manager (AsyncQueueManager): The manager whose thread pool runs the callback.
+        callback: The existing blocking callback.
+    """
+    async def handler(message: aio_pika.IncomingMessage):
+        method = SimpleNamespace(delivery_tag=message.delivery_tag, redelivered=message.redelivered,
+                                 routing_key=message.routing_key, exchange=message.exchange)
+        properties = SimpleNamespace(headers=message.headers, correlation_id=message.correlation_id,
+                                     reply_to=message.reply_to, message_id=message.message_id,
+                                     timestamp=message.timestamp, priority=message.priority,
+                                     expiration=message.expiration)
+        await manager.run_blocking(callback, None, method, properties, message.body)
+
+    return handler
+
+
+async def serve_callback(queue_name: str, callback: Callable, concurrency: int, bind_publisher: Callable,
+                         rabbitmq_host: str = 'rabbitmq'):
+    """
+    Runs an existing blocking callback under the async manager with `concurrency`
+    handlers in flight. Each message occupies a pool thread for the whole
+    callback; stages with a native async handler use serve_handler instead.
+
+    Args:
+        queue_name (str): The queue to consume.
+        callback: The existing pika-style callback.
+        concurrency (int): Maximum number of messages handled at once.
+        bind_publisher: Called with the blocking publisher facade so the stage can
+            install it as its module-level `queue_manager`.
+        rabbitmq_host (str): Host name of the RabbitMQ broker.
+    """
+    manager = AsyncQueueManager(rabbitmq_host=rabbitmq_host, concurrency=concurrency)
+    await manager.connect()
+    bind_publisher(manager.blocking_facade())
+    try:
+        await manager.start_listening(queue_name, adapt_callback(manager, instrument_callback(queue_name, callback)))
+    finally:
+        await manager.close()
+
+
+async def serve_handler(queue_name: str, make_handler: Callable[[AsyncQueueManager], Callable], concurrency: int,
+                        rabbitmq_host: str = 'rabbitmq'):
+    """
+    Runs a native async handler under the async manager with `concurrency`
+    handlers in flight.
+
+    Args:
+        queue_name (str): The queue to consume.
+        make_handler: Called with the connected manager; returns the async
+            handler(message) that publishes through it.
+        concurrency (int): Maximum number of messages handled at once.
+        rabbitmq_host (str): Host name of the RabbitMQ broker.
+    """
+    manager = AsyncQueueManager(rabbitmq_host=rabbitmq_host, concurrency=concurrency)
+    await manager.connect()
+    try:
+        await manager.start_listening(queue_name, instrument_handler(queue_name, make_handler(manager)))
+    finally:
+        await manager.close()
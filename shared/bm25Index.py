@@ -0,0 +1,152 @@
+import json
+import os
+import re
+import time
+from collections import Counter
+from typing import Dict, List, Optional, Sequence, Tuple
+import numpy as np
+
+# Lower-cased runs of letters and digits: "Section 35(1)(c)" -> section, 35, 1, c.
+# Numbers are kept as tokens because section and clause numbers are what
+# dense search misses.
+TOKEN = re.compile(r"[a-z0-9]+")
+# A section heading in a statute ("35. Manner in which complaint shall be
+# made.—") and a reference to a section in a query ("section 35", "sec 2A").
+# Both map to the term "§35", which only the heading's chunk carries, so a
+# section-number query finds the section itself rather than every chunk
+# that cites it.
+HEADING = re.compile(r"(?<![\w(])(\d{1,3}[A-Z]?)\. (?=[A-Z])")
+SECTION_REFERENCE = re.compile(r"\bsec(?:tion|\.)?\s*(\d{1,3}[a-z]?)\b", re.IGNORECASE)
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or shall that the this to was were which with".split()
+)
+FORMAT_VERSION = 1
+
+
+def tokenize(text: str) -> List[str]:
+    return [token for token in TOKEN.findall(text.lower()) if token not in STOPWORDS]
+
+
+def document_terms(text: str) -> List[str]:
+    return tokenize(text) + ["§" + number.lower() for number in HEADING.findall(text)]
+
+
+def query_terms(query: str) -> List[str]:
+    return tokenize(query) + ["§" + number.lower() for number in SECTION_REFERENCE.findall(query)]
+
+
+def sidecar_path(index_path: str) -> str:
+    return os.path.splitext(index_path)[0] + ".meta.json"
+
+
+class BM25Index:
+    """
+    A BM25 inverted index over the chunk texts, kept next to the dense
+    vectors and used by RAG-Core's hybrid search for exact terms and section
+    numbers.
+
+    Postings are stored term by term in flat arrays (CSR layout) with the
+    BM25 weight of each (term, chunk) pair precomputed, so scoring a query is
+    one slice-and-add per query term. The arrays go in a .npz file and the
+    vocabulary, chunk IDs and texts in a .meta.json sidecar.
+    """
+    def __init__(self, ids: List[str], texts: List[str], vocabulary: Dict[str, int], indptr: np.ndarray,
+                 postings: np.ndarray, weights: np.ndarray, version: Optional[str] = None):
+        self.ids = ids
+        self.texts = texts
+        self.vocabulary = vocabulary
+        self.indptr = indptr
+        self.postings = postings
+        self.weights = weights
+        self.version = version
+
+    @classmethod
+    def build(cls, ids: Sequence[str], texts: Sequence[str], k1: float = 1.2, b: float = 0.75,
+              version: Optional[str] = None) -> "BM25Index":
+        """
+        Builds the index.
+
+        Args:
+            ids (Sequence[str]): Chunk IDs, matching the IDs of the dense vectors.
+            texts (Sequence[str]): Chunk texts.
+            k1 (float): BM25 term-frequency saturation.
+            b (float): BM25 document-length normalization.
+            version (str): Version stamp; defaults to the current time.
+        """
+        term_counts = [Counter(document_terms(text)) for text in texts]
+        lengths = np.array([sum(counts.values()) for counts in term_counts], dtype=np.float32)
+        average_length = float(lengths.mean()) if len(lengths) and lengths.mean() > 0 else 1.0
+
+        by_term: Dict[str, List[Tuple[int, int]]] = {}
+        for row, counts in enumerate(term_counts):
+            for term, count in counts.items():
+                by_term.setdefault(term, []).append((row, count))
+
+        vocabulary = {term: index for index, term in enumerate(sorted(by_term))}
+        indptr = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+        postings, frequencies = [], []
+        for term, index in vocabulary.items():
+            entries = by_term[term]
+            indptr[index + 1] = indptr[index] + len(entries)
+            postings.extend(row for row, _ in entries)
+            frequencies.extend(count for _, count in entries)
+        postings = np.asarray(postings, dtype=np.int32)
+        frequencies = np.asarray(frequencies, dtype=np.float32)
+
+        document_frequency = np.diff(indptr).astype(np.float32)
+        idf = np.log(1.0 + (len(texts) - document_frequency + 0.5) / (document_frequency + 0.5))
+        term_of_posting = np.repeat(np.arange(len(vocabulary)), np.diff(indptr))
+        norm = k1 * (1.0 - b + b * lengths[postings] / average_length) if len(postings) else np.zeros(0)
+        weights = (idf[term_of_posting] * frequencies * (k1 + 1.0) / (frequencies + norm)).astype(np.float32)
+        return cls(list(ids), list(texts), vocabulary, indptr, postings, weights, version or str(time.time_ns()))
+
+    def save(self, index_path: str):
+        """
+        Writes the .npz arrays and then the sidecar, each under a temporary
+        name renamed into place, so readers see either the old or the new index.
+        """
+        temp_path = index_path + ".tmp.npz"
+        np.savez(temp_path, indptr=self.indptr, postings=self.postings, weights=self.weights)
+        os.replace(temp_path, index_path)
+        temp_sidecar = sidecar_path(index_path) + ".tmp"
+        with open(temp_sidecar, "w") as f:
+            json.dump({"format": FORMAT_VERSION, "version": self.version, "ids": self.ids, "texts": self.texts,
+                       "vocabulary": sorted(self.vocabulary, key=self.vocabulary.get)}, f)
+        os.replace(temp_sidecar, sidecar_path(index_path))
+
+    @classmethod
+    def load(cls, index_path: str) -> "BM25Index":
+        with open(sidecar_path(index_path), "r") as f:
+            sidecar = json.load(f)
+        with np.load(index_path, allow_pickle=False) as arrays:
+            indptr, postings, weights = arrays["indptr"], arrays["postings"], arrays["weights"]
+        vocabulary = {term: index for index, term in enumerate(sidecar["vocabulary"])}
+        if len(indptr) != len(vocabulary) + 1 or len(postings) != len(weights):
+            raise ValueError(f"'{index_path}' does not match its sidecar.")
+        return cls(sidecar["ids"], sidecar["texts"], vocabulary, indptr, postings, weights, sidecar.get("version"))
+
+    def scores(self, query: str) -> np.ndarray:
+        """
+        Returns the BM25 score of every chunk for the query.
+        """
+        scores = np.zeros(len(self.ids), dtype=np.float32)
+        for term in query_terms(query):
+            index = self.vocabulary.get(term)
+            if index is not None:
+                start, end = self.indptr[index], self.indptr[index + 1]
+                # Each chunk appears at most once in a term's postings, so += does not drop updates
+                scores[self.postings[start:end]] += self.weights[start:end]
+        return scores
+
+    def search(self, query: str, n_results: int) -> List[Tuple[int, float]]:
+        """
+        Returns up to n_results (row, score) pairs, best first; chunks sharing no term with the query are left out.
+        """
+        if n_results <= 0:
+            return []
+        scores = self.scores(query)
+        matched = np.flatnonzero(scores)
+        if len(matched) > n_results:
+            matched = matched[np.argpartition(-scores[matched], n_results - 1)[:n_results]]
+        matched = matched[np.argsort(-scores[matched], kind="stable")]
+        return [(int(row), float(scores[row])) for row in matched]
@@ -0,0 +1,155 @@
+import json
+import math
+import time
+import uuid
+from typing import Dict, List, Optional
+
+# Messages travel through the pipeline as a JSON envelope:
+#
+#   {
+#       "correlation_id": "...",        # identifies the request end to end
+#       "reply_to": "amq.gen-...",      # queue the final stage answers on
+#       "text": "...",                  # the user's (later PII-redacted) query
+#       "deadline": 1700000120.0,       # optional: unix time after which stages drop the request
+#       "interactive": true,            # optional: put the request in the high-priority lane
+#       "priority": 1,                  # set by the first stage: the request's priority lane
+#       "prompt": "...",                # set by RAG-Core
+#       "prompt_tokens": 412,           # set by RAG-Core: prompt size after fitting to the budget
+#       "prompt_tokens_saved": 96,      # and the tokens that merging and the budget removed
+#       "context_ids": ["3f2a...", ...], # set by RAG-Core: IDs of the retrieved chunks, in prompt order
+#       "index_version": "17...",        # set by RAG-Core: version stamp of the searched index
+#       "answer_cache": "hit",           # set by the LLM worker when the answer came from its cache
+#       "busy": "llm_queue",            # set by a stage that replied busy because this queue was full
+#       "response": "...",              # set by the LLM worker / guardrail
+#       "timestamps": [["client", 1700000000.0], ["pii_filter", ...], ...]
+#   }
+#
+# Each stage appends a [stage, unix time] stamp when it hands the message on,
+# so the gap between two consecutive stamps is the latency of that hop
+# (queue wait plus processing).
+
+
+def new_envelope(text: str, reply_to: Optional[str] = None, stage: str = "client",
+                 deadline_s: Optional[float] = None, interactive: bool = False) -> Dict:
+    """
+    Creates an envelope for a new request and stamps it with the sending stage.
+
+    Args:
+        text (str): The user's query.
+        reply_to (str): The queue the final answer should be published to.
+        stage (str): The name of the stage creating the envelope.
+        deadline_s (float): Seconds the sender will wait for the answer; the
+            stages drop the request once they have passed. None for no deadline.
+        interactive (bool): Whether a user is waiting on the answer, which puts
+            the request in the high-priority lane whatever its length.
+
+    Returns:
+        Dict: The envelope.
+    """
+    envelope = {
+        "correlation_id": uuid.uuid4().hex,
+        "reply_to": reply_to,
+        "text": text,
+        "timestamps": [],
+    }
+    if deadline_s is not None:
+        envelope["deadline"] = time.time() + deadline_s
+    if interactive:
+        envelope["interactive"] = True
+    return stamp(envelope, stage)
+
+
+def parse_envelope(body: bytes) -> Dict:
+    """
+    Decodes a message body into an envelope. Plain-text bodies and bare
+    {"text": ...} payloads from older clients are wrapped in a new envelope.
+
+    Args:
+        body (bytes): The raw message body.
+
+    Returns:
+        Dict: The envelope.
+    """
+    text = body.decode('utf-8')
+    try:
+        data = json.loads(text)
+    except json.JSONDecodeError:
+        return new_envelope(text, stage="ingress")
+    if not isinstance(data, dict):
+        return new_envelope(text, stage="ingress")
+    if "correlation_id" not in data:
+        return new_envelope(data.get("text", ""), data.get("reply_to"), stage="ingress")
+    data.setdefault("timestamps", [])
+    return data
+
+
+def stamp(envelope: Dict, stage: str) -> Dict:
+    """
+    Records that `stage` has finished with the envelope.
+    """
+    envelope["timestamps"].append([stage, time.time()])
+    return envelope
+
+
+def dumps(envelope: Dict) -> str:
+    """
+    Serializes an envelope for publishing.
+    """
+    return json.dumps(envelope)
+
+
+def hop_latencies(envelope: Dict) -> Dict[str, float]:
+    """
+    Returns the latency of each hop in milliseconds, keyed "from->to", plus
+    "end_to_end" from the first stamp to the last.
+    """
+    stamps = envelope.get("timestamps", [])
+    latencies = {}
+    for (previous, previous_ts), (stage, ts) in zip(stamps, stamps[1:]):
+        latencies[f"{previous}->{stage}"] = (ts - previous_ts) * 1000
+    if len(stamps) >= 2:
+        latencies["end_to_end"] = (stamps[-1][1] - stamps[0][1]) * 1000
+    return latencies
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """
+    Nearest-rank percentile of a list of values.
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = math.ceil(pct / 100.0 * len(ordered))
+    return ordered[max(0, min(len(ordered), rank) - 1)]
+
+
+class LatencyStats:
+    """
+    Collects per-hop latencies from completed envelopes and reports p50/p95/p99.
+    """
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = {}
+
+    def record(self, envelope: Dict):
+        for hop, latency_ms in hop_latencies(envelope).items():
+            self.samples.setdefault(hop, []).append(latency_ms)
+
+    def report(self) -> Dict[str, Dict[str, float]]:
+        """
+        Returns {hop: {"count", "p50", "p95", "p99"}} with latencies in milliseconds.
+        """
+        return {
+            hop: {
+                "count": len(values),
+                "p50": percentile(values, 50),
+                "p95": percentile(values, 95),
+                "p99": percentile(values, 99),
+            }
+            for hop, values in self.samples.items()
+        }
+
+    def format_report(self) -> str:
+        lines = [f"{'hop':<28} {'count':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}"]
+        for hop, row in self.report().items():
+            lines.append(f"{hop:<28} {row['count']:>6} {row['p50']:>9.1f} {row['p95']:>9.1f} {row['p99']:>9.1f}")
+        return "\n".join(lines)
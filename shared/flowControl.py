@@ -0,0 +1,221 @@
+import os
+import time
+from typing import Any, Callable, Dict, Iterable, NamedTuple, Optional
+from shared.envelope import dumps, stamp
+from shared.instrumentation import BACKPRESSURE_SECONDS, EXPIRED, get_logger
+
+# The queues between the stages. Every process declares them with the same
+# arguments, so QUEUE_MAX_LENGTH, QUEUE_OVERFLOW and QUEUE_PRIORITIES must be
+# set alike for all stages and clients; RabbitMQ refuses to redeclare a queue
+# with different arguments, so delete the queues once after changing them.
+# Length limits and priority lanes are off by default, which declares the
+# queues as before and keeps existing deployments starting unchanged.
+PIPELINE_QUEUES = ("pii_redaction_queue", "rag_core_queue", "llm_queue", "guardrail_queue")
+INGRESS_QUEUE = PIPELINE_QUEUES[0]
+# Maximum messages waiting in each pipeline queue (0, the default, for no
+# limit). When a queue is full the broker refuses further publishes
+# ("reject"), or refuses them and moves them to DEAD_LETTER_QUEUE
+# ("dead-letter"), which then also receives messages dropped after failing twice.
+QUEUE_MAX_LENGTH = int(os.getenv("QUEUE_MAX_LENGTH", 0))
+QUEUE_OVERFLOW = os.getenv("QUEUE_OVERFLOW", "reject")
+DEAD_LETTER_QUEUE = "dead_letter_queue"
+DEAD_LETTER_MAX_LENGTH = 10000
+# QUEUE_PRIORITIES=1 makes the pipeline queues priority queues with two
+# lanes: short queries (at most PRIORITY_SHORT_CHARS characters) and requests
+# marked "interactive" overtake long complaint analyses waiting in the same queue.
+QUEUE_PRIORITIES = os.getenv("QUEUE_PRIORITIES", "0") == "1"
+PRIORITY_SHORT_CHARS = int(os.getenv("PRIORITY_SHORT_CHARS", 200))
+PRIORITY_NORMAL = 0
+PRIORITY_HIGH = 1
+# A stage publishing to a queue with at least BACKPRESSURE_HIGH_WATER messages
+# waiting holds the message back (and so stops taking new ones) for up to
+# BACKPRESSURE_MAX_WAIT_S, letting the backlog build up at the ingress queue,
+# where the length limit turns new requests away. 0, the default, disables it
+# (opt-in like the length limits). Clients are never held back: publishes to
+# the ingress queue go through or are refused.
+BACKPRESSURE_HIGH_WATER = int(os.getenv("BACKPRESSURE_HIGH_WATER", 0))
+BACKPRESSURE_MAX_WAIT_S = float(os.getenv("BACKPRESSURE_MAX_WAIT_S", 10))
+# Seconds a queue depth reading is reused before the broker is asked again
+BACKPRESSURE_DEPTH_TTL_S = 0.25
+
+OVERFLOW_POLICIES = {"reject": "reject-publish", "dead-letter": "reject-publish-dlx"}
+# The answer sent to a client whose request was turned away by a full queue
+BUSY_RESPONSE = "The service is busy; please try again shortly."
+
+log = get_logger("flow_control")
+
+
+class QueueFullError(Exception):
+    """
+    Raised when the broker refuses a publish because the queue is at its
+    maximum length. For a batch publish, `unsent` holds the positions of the
+    messages the broker did not take; the others were published.
+    """
+    def __init__(self, queue_name: str, unsent: Iterable[int] = ()):
+        super().__init__(f"Queue '{queue_name}' is full.")
+        self.queue_name = queue_name
+        self.unsent = tuple(unsent)
+
+
+class FlowControl(NamedTuple):
+    """
+    The length limit, overflow policy, priority lanes and backpressure
+    threshold applied to the pipeline queues.
+    """
+    max_length: int = QUEUE_MAX_LENGTH
+    overflow: str = QUEUE_OVERFLOW
+    priorities: bool = QUEUE_PRIORITIES
+    high_water: int = BACKPRESSURE_HIGH_WATER
+    max_wait_s: float = BACKPRESSURE_MAX_WAIT_S
+
+    def queue_arguments(self, queue_name: str) -> Optional[Dict[str, Any]]:
+        """
+        Returns the x-arguments a queue is declared with, or None for a plain queue.
+        """
+        if queue_name == DEAD_LETTER_QUEUE:
+            return {"x-max-length": DEAD_LETTER_MAX_LENGTH}
+        if queue_name not in PIPELINE_QUEUES:
+            return None
+        arguments = {}
+        if self.priorities:
+            arguments["x-max-priority"] = PRIORITY_HIGH
+        if self.max_length > 0:
+            if self.overflow not in OVERFLOW_POLICIES:
+                raise ValueError(f"Unknown QUEUE_OVERFLOW '{self.overflow}'; "
+                                 f"expected one of {sorted(OVERFLOW_POLICIES)}.")
+            arguments["x-max-length"] = self.max_length
+            arguments["x-overflow"] = OVERFLOW_POLICIES[self.overflow]
+        if self.overflow == "dead-letter":
+            arguments["x-dead-letter-exchange"] = ""
+            arguments["x-dead-letter-routing-key"] = DEAD_LETTER_QUEUE
+        return arguments or None
+
+    @property
+    def dead_letters(self) -> bool:
+        return self.overflow == "dead-letter"
+
+
+# The pipeline as it behaved before flow control: unbounded FIFO queues
+UNLIMITED = FlowControl(max_length=0, overflow="reject", priorities=False, high_water=0)
+
+
+def message_priority(envelope: Dict) -> int:
+    """
+    Returns the envelope's priority lane, deciding it on first use: requests
+    marked "interactive" and short queries go in the high lane. The lane is
+    stored in the envelope so later stages keep it after the text changes.
+    """
+    if "priority" not in envelope:
+        short = len(envelope.get("text", "")) <= PRIORITY_SHORT_CHARS
+        envelope["priority"] = PRIORITY_HIGH if envelope.get("interactive") or short else PRIORITY_NORMAL
+    return envelope["priority"]
+
+
+def reply_busy(publisher, envelope: Dict, stage: str, queue_name: str):
+    """
+    Answers a request that a stage could not hand on because `queue_name` is
+    full, so the client is told at once instead of waiting out its timeout.
+    The stage then acks the message: a retry would only meet the same full
+    queue. Under the dead-letter policy the broker has already moved the
+    refused message to DEAD_LETTER_QUEUE.
+
+    Args:
+        publisher: The stage's queue manager, used for send_reply.
+        envelope (Dict): The request's envelope.
+        stage (str): The name of the stage turning the request away.
+        queue_name (str): The queue that was full.
+    """
+    if mark_busy(envelope, stage, queue_name):
+        publisher.send_reply(envelope["reply_to"], dumps(envelope), envelope["correlation_id"])
+
+
+def mark_busy(envelope: Dict, stage: str, queue_name: str) -> bool:
+    """
+    Turns the envelope into reply_busy's answer. Returns whether there is a
+    client to send it to; async stages publish it themselves.
+    """
+    log.warning("next queue full; replying busy", stage=stage, queue=queue_name,
+                correlation_id=envelope.get("correlation_id"))
+    if not envelope.get("reply_to"):
+        return False
+    envelope["response"] = BUSY_RESPONSE
+    envelope["busy"] = queue_name
+    stamp(envelope, stage)
+    return True
+
+
+def expired(envelope: Dict, queue_name: str, now: Optional[float] = None) -> bool:
+    """
+    Returns True (and counts the drop) if the request's deadline has passed,
+    so the stage can discard it before doing any work. Envelopes without a
+    deadline never expire.
+    """
+    deadline = envelope.get("deadline")
+    if deadline is None or (now if now is not None else time.time()) < deadline:
+        return False
+    EXPIRED.inc(queue=queue_name)
+    log.debug("deadline passed", queue=queue_name, correlation_id=envelope.get("correlation_id"))
+    return True
+
+
+class Backpressure:
+    """
+    Holds back publishes to a pipeline queue whose backlog is at or above the
+    high-water mark, polling its depth with exponential backoff until it
+    drains or `max_wait_s` has passed. A stage consuming with a small prefetch
+    window stops taking messages while it waits, so the slowdown travels
+    upstream queue by queue.
+    """
+    def __init__(self, read_depth: Callable[[str], int], flow_control: FlowControl = FlowControl(),
+                 sleep: Callable[[float], None] = time.sleep):
+        """
+        Args:
+            read_depth (Callable[[str], int]): Returns the number of messages waiting in a queue.
+            flow_control (FlowControl): Supplies the high-water mark and the longest wait.
+            sleep (Callable[[float], None]): Waits between depth readings.
+        """
+        self.read_depth = read_depth
+        self.high_water = flow_control.high_water
+        self.max_wait_s = flow_control.max_wait_s
+        self.sleep = sleep
+        self._depths: Dict[str, tuple] = {}
+
+    def _depth(self, queue_name: str, fresh: bool = False) -> int:
+        now = time.monotonic()
+        cached = self._depths.get(queue_name)
+        if fresh or cached is None or now - cached[1] > BACKPRESSURE_DEPTH_TTL_S:
+            cached = (self.read_depth(queue_name), now)
+            self._depths[queue_name] = cached
+        return cached[0]
+
+    def wait(self, queue_name: str) -> float:
+        """
+        Blocks while the queue's backlog is over the high-water mark.
+
+        Returns:
+            float: The seconds spent waiting.
+        """
+        if self.high_water <= 0 or queue_name not in PIPELINE_QUEUES or queue_name == INGRESS_QUEUE:
+            return 0.0
+        if self._depth(queue_name) < self.high_water:
+            self._count_publish(queue_name)
+            return 0.0
+        started = time.monotonic()
+        delay = 0.01
+        while self._depth(queue_name, fresh=True) >= self.high_water:
+            if time.monotonic() - started >= self.max_wait_s:
+                log.warning("backlog still over the high-water mark; publishing anyway", queue=queue_name,
+                            high_water=self.high_water, waited_s=round(self.max_wait_s, 1))
+                break
+            self.sleep(delay)
+            delay = min(delay * 2, 0.5)
+        self._count_publish(queue_name)
+        waited = time.monotonic() - started
+        BACKPRESSURE_SECONDS.inc(waited, queue=queue_name)
+        return waited
+
+    def _count_publish(self, queue_name: str):
+        # Counts the message about to be published into the reused reading,
+        # so a burst can't overshoot the mark before the next one
+        depth, read_at = self._depths[queue_name]
+        self._depths[queue_name] = (depth + 1, read_at)
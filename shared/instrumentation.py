@@ -0,0 +1,507 @@
+import atexit
+import bisect
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter as TallyCounter
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Port of the Prometheus endpoint each process serves on /metrics; 0 disables it
+METRICS_PORT = int(os.getenv("METRICS_PORT", 9108))
+# Interface the endpoint listens on; set 0.0.0.0 for a scraper in another container
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+# DEBUG shows per-message events; INFO (the default) keeps only start-up,
+# warnings and errors off the hot path
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# "text" for key=value lines, "json" for one JSON object per line
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")
+# PIPELINE_PROFILE=1 samples the stacks of running callbacks from start-up.
+# PIPELINE_PROFILE_ENDPOINTS=1 also serves the profiler on the metrics endpoint:
+# POST /profile/start and /profile/stop toggle it and GET /profile reads it.
+# They are unauthenticated and write to disk, so they are off by default.
+# Folded stacks (for flamegraph.pl or speedscope) are written to PIPELINE_PROFILE_PATH.
+PIPELINE_PROFILE = os.getenv("PIPELINE_PROFILE", "0") == "1"
+PIPELINE_PROFILE_ENDPOINTS = os.getenv("PIPELINE_PROFILE_ENDPOINTS", "0") == "1"
+PIPELINE_PROFILE_PATH = os.getenv("PIPELINE_PROFILE_PATH", "profile.folded")
+PIPELINE_PROFILE_INTERVAL_MS = float(os.getenv("PIPELINE_PROFILE_INTERVAL_MS", 5))
+# Seconds between queue depth readings taken by the consumers
+QUEUE_DEPTH_INTERVAL_S = float(os.getenv("QUEUE_DEPTH_INTERVAL_S", 5))
+
+# Histogram buckets in seconds, from a cache hit to a long generation
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+Labels = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Sequence[str], values: Labels, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Metric:
+    """
+    A named family of time series, one per combination of label values.
+    """
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, label_names: Sequence[str] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Labels:
+        return tuple(str(labels.get(name, "")) for name in self.label_names)
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def exposition(self) -> str:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        return "\n".join(lines + self.samples())
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, label_names: Sequence[str] = ()):
+        super().__init__(name, help_text, label_names)
+        self.values: Dict[Labels, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self.values[key] = self.values.get(key, 0.0) + amount
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            return [f"{self.name}{_format_labels(self.label_names, key)} {value}" for key, value in self.values.items()]
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, help_text: str, label_names: Sequence[str] = ()):
+        super().__init__(name, help_text, label_names)
+        self.values: Dict[Labels, float] = {}
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self.values[self._key(labels)] = float(value)
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self.values[key] = self.values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            return [f"{self.name}{_format_labels(self.label_names, key)} {value}" for key, value in self.values.items()]
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, label_names: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help_text, label_names)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: [count in each bucket (not cumulative)..., overflow], sum, count
+        self.values: Dict[Labels, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        # The first bucket whose upper bound is at least the value; the last slot is +Inf
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts, totals = self.values.setdefault(key, ([0] * (len(self.buckets) + 1), [0.0, 0]))
+            counts[index] += 1
+            totals[0] += value
+            totals[1] += 1
+
+    @contextmanager
+    def time(self, **labels) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self) -> List[str]:
+        lines = []
+        with self._lock:
+            for key, (counts, (total, count)) in self.values.items():
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += bucket_count
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    labels = _format_labels(self.label_names, key, 'le="%s"' % le)
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                lines.append(f"{self.name}_sum{_format_labels(self.label_names, key)} {total}")
+                lines.append(f"{self.name}_count{_format_labels(self.label_names, key)} {count}")
+        return lines
+
+
+class Registry:
+    """
+    The metrics a process exposes on /metrics.
+    """
+    def __init__(self):
+        self.metrics: Dict[str, Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: Metric) -> Metric:
+        with self._lock:
+            return self.metrics.setdefault(metric.name, metric)
+
+    def exposition(self) -> str:
+        with self._lock:
+            metrics = list(self.metrics.values())
+        return "\n".join(metric.exposition() for metric in metrics) + "\n"
+
+
+registry = Registry()
+MESSAGE_SECONDS = registry.register(Histogram(
+    "pipeline_message_seconds", "Time the consumer's callback spent on one message.", ["queue"]))
+SUBSTAGE_SECONDS = registry.register(Histogram(
+    "pipeline_substage_seconds", "Time spent in one step of a stage (redact, encode, search, generate, guard).",
+    ["stage", "substage"]))
+QUEUE_DEPTH = registry.register(Gauge(
+    "pipeline_queue_depth", "Messages waiting in a queue, as last read by its consumer.", ["queue"]))
+IN_FLIGHT = registry.register(Gauge(
+    "pipeline_in_flight", "Messages the consumer is processing right now.", ["queue"]))
+CACHE_REQUESTS = registry.register(Counter(
+    "pipeline_cache_requests_total", "Cache lookups by cache and result (hit or miss).", ["cache", "result"]))
+ERRORS = registry.register(Counter(
+    "pipeline_errors_total", "Messages whose callback raised.", ["queue"]))
+EXPIRED = registry.register(Counter(
+    "pipeline_expired_total", "Requests dropped by a stage because their deadline had passed.", ["queue"]))
+REJECTED = registry.register(Counter(
+    "pipeline_rejected_total", "Publishes the broker refused because the queue was at its maximum length.", ["queue"]))
+BACKPRESSURE_SECONDS = registry.register(Counter(
+    "pipeline_backpressure_seconds_total", "Time publishers held back because the queue's backlog was too long.",
+    ["queue"]))
+
+
+@contextmanager
+def substage(stage: str, name: str) -> Iterator[None]:
+    """
+    Times a step of a stage into pipeline_substage_seconds.
+    """
+    with SUBSTAGE_SECONDS.time(stage=stage, substage=name):
+        yield
+
+
+def observe_substage(stage: str, name: str, seconds: float):
+    SUBSTAGE_SECONDS.observe(seconds, stage=stage, substage=name)
+
+
+def count_cache(cache: str, hit: bool, amount: int = 1):
+    if amount:
+        CACHE_REQUESTS.inc(amount, cache=cache, result="hit" if hit else "miss")
+
+
+class SamplingProfiler:
+    """
+    Samples the Python stacks of threads that are inside an instrumented
+    callback every few milliseconds and tallies them as folded stacks
+    ("queue;outer;...;inner count"), the input format of flamegraph.pl and
+    speedscope. Threads outside a callback are never sampled, so idle
+    consumers don't dilute the profile.
+    """
+    def __init__(self, interval_ms: float = PIPELINE_PROFILE_INTERVAL_MS):
+        self.interval = interval_ms / 1000.0
+        self.stacks: TallyCounter = TallyCounter()
+        self.active: Dict[int, str] = {}
+        self._thread: Optional[threading.Thread] = None
+        self._running = False
+        self._lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self._running
+
+    def enter(self, stage: str):
+        self.active[threading.get_ident()] = stage
+
+    def exit(self):
+        self.active.pop(threading.get_ident(), None)
+
+    def start(self):
+        with self._lock:
+            if self._running:
+                return
+            self._running = True
+            self._thread = threading.Thread(target=self._sample, name="sampling-profiler", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> str:
+        with self._lock:
+            self._running = False
+        if self._thread is not None:
+            self._thread.join()
+        return self.folded()
+
+    def _sample(self):
+        while self._running:
+            frames = sys._current_frames()
+            for ident, stage in list(self.active.items()):
+                frame = frames.get(ident)
+                names = []
+                while frame is not None:
+                    code = frame.f_code
+                    names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                if names:
+                    self.stacks[";".join([stage] + names[::-1])] += 1
+            time.sleep(self.interval)
+
+    def folded(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def dump(self, path: str = PIPELINE_PROFILE_PATH) -> str:
+        with open(path, "w") as f:
+            f.write(self.folded())
+        return path
+
+
+profiler = SamplingProfiler()
+
+
+def instrument_callback(queue_name: str, callback: Callable) -> Callable:
+    """
+    Wraps a pika-style callback(ch, method, properties, body) so each message
+    is counted in flight, timed, counted as an error if it raises, and
+    sampled by the profiler when it is running.
+    """
+    def instrumented(ch, method, properties, body):
+        IN_FLIGHT.inc(queue=queue_name)
+        profiler.enter(queue_name)
+        start = time.perf_counter()
+        try:
+            return callback(ch, method, properties, body)
+        except Exception:
+            ERRORS.inc(queue=queue_name)
+            raise
+        finally:
+            MESSAGE_SECONDS.observe(time.perf_counter() - start, queue=queue_name)
+            profiler.exit()
+            IN_FLIGHT.dec(queue=queue_name)
+    return instrumented
+
+
+def instrument_batch_callback(queue_name: str, batch_callback: Callable) -> Callable:
+    """
+    Wraps a batch callback(ch, deliveries) like instrument_callback. Every
+    message in the batch is observed with the batch's processing time.
+    """
+    def instrumented(ch, deliveries):
+        IN_FLIGHT.inc(len(deliveries), queue=queue_name)
+        profiler.enter(queue_name)
+        start = time.perf_counter()
+        try:
+            return batch_callback(ch, deliveries)
+        except Exception:
+            ERRORS.inc(len(deliveries), queue=queue_name)
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            for _ in deliveries:
+                MESSAGE_SECONDS.observe(elapsed, queue=queue_name)
+            profiler.exit()
+            IN_FLIGHT.dec(len(deliveries), queue=queue_name)
+    return instrumented
+
+
+def instrument_handler(queue_name: str, handler: Callable) -> Callable:
+    """
+    Wraps an async handler(message) like instrument_callback. Handlers share
+    the event loop's thread, so they are not sampled by the profiler.
+    """
+    async def instrumented(message):
+        IN_FLIGHT.inc(queue=queue_name)
+        start = time.perf_counter()
+        try:
+            return await handler(message)
+        except Exception:
+            ERRORS.inc(queue=queue_name)
+            raise
+        finally:
+            MESSAGE_SECONDS.observe(time.perf_counter() - start, queue=queue_name)
+            IN_FLIGHT.dec(queue=queue_name)
+    return instrumented
+
+
+class DepthSampler:
+    """
+    Rate-limits queue depth readings, which cost a broker round trip, to one
+    every QUEUE_DEPTH_INTERVAL_S per queue.
+    """
+    def __init__(self, read_depth: Callable[[str], Optional[int]], interval: float = QUEUE_DEPTH_INTERVAL_S):
+        self.read_depth = read_depth
+        self.interval = interval
+        self._read_at: Dict[str, float] = {}
+
+    def maybe_sample(self, queue_name: str):
+        now = time.monotonic()
+        if now - self._read_at.get(queue_name, float("-inf")) < self.interval:
+            return
+        self._read_at[queue_name] = now
+        try:
+            depth = self.read_depth(queue_name)
+        except Exception as e:
+            get_logger("instrumentation").debug("queue depth unavailable", queue=queue_name, error=str(e))
+            return
+        if depth is not None:
+            QUEUE_DEPTH.set(depth, queue=queue_name)
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    """
+    Serves /metrics in the Prometheus text format and, with
+    PIPELINE_PROFILE_ENDPOINTS=1, the profiler: POST /profile/start, POST
+    /profile/stop (returns and writes the folded stacks) and GET /profile
+    (the stacks so far).
+    """
+    def do_GET(self):
+        if self.path == "/metrics":
+            self._send(200, registry.exposition(), "text/plain; version=0.0.4")
+        elif self.path == "/profile" and PIPELINE_PROFILE_ENDPOINTS:
+            self._send(200, profiler.folded())
+        else:
+            self._send(404, "not found\n")
+
+    def do_POST(self):
+        if not PIPELINE_PROFILE_ENDPOINTS:
+            self._send(404, "not found\n")
+        elif self.path == "/profile/start":
+            profiler.start()
+            self._send(200, "profiling\n")
+        elif self.path == "/profile/stop":
+            folded = profiler.stop()
+            profiler.dump()
+            self._send(200, folded)
+        else:
+            self._send(404, "not found\n")
+
+    def _send(self, status: int, text: str, content_type: str = "text/plain"):
+        body = text.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+_metrics_server: Optional[ThreadingHTTPServer] = None
+_server_lock = threading.Lock()
+
+
+def start_metrics_server(port: int = METRICS_PORT, host: str = METRICS_HOST) -> Optional[ThreadingHTTPServer]:
+    """
+    Starts the process's metrics endpoint on a background thread, listening
+    on `host` (loopback by default), once; later calls return the running
+    server. Also starts the profiler if PIPELINE_PROFILE=1. Returns None if
+    METRICS_PORT is 0 or the port is taken.
+    """
+    global _metrics_server
+    with _server_lock:
+        if PIPELINE_PROFILE and not profiler.running:
+            profiler.start()
+            atexit.register(lambda: profiler.dump() if profiler.stacks else None)
+        if _metrics_server is not None or not port:
+            return _metrics_server
+        try:
+            _metrics_server = ThreadingHTTPServer((host, port), MetricsHandler)
+        except OSError as e:
+            get_logger("instrumentation").warning("metrics endpoint not started", port=port, error=str(e))
+            return None
+        threading.Thread(target=_metrics_server.serve_forever, name="metrics-server", daemon=True).start()
+        get_logger("instrumentation").info("serving metrics", host=host, port=port, path="/metrics")
+        return _metrics_server
+
+
+class StructuredFormatter(logging.Formatter):
+    """
+    Formats a record and its fields as "time level logger event key=value ..."
+    or, with LOG_FORMAT=json, as one JSON object per line.
+    """
+    def __init__(self, json_lines: bool = False):
+        super().__init__()
+        self.json_lines = json_lines
+
+    def format(self, record: logging.LogRecord) -> str:
+        timestamp = time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z"
+        fields = getattr(record, "fields", {})
+        if self.json_lines:
+            return json.dumps({"ts": timestamp, "level": record.levelname.lower(), "logger": record.name,
+                               "event": record.getMessage(), **fields}, default=str)
+        pairs = "".join(f" {key}={json.dumps(value) if isinstance(value, str) and ' ' in value else value}"
+                        for key, value in fields.items())
+        return f"{timestamp} {record.levelname:<7} {record.name} {record.getMessage()}{pairs}"
+
+
+class StageLogger:
+    """
+    A leveled logger taking an event name and key=value fields. Fields are
+    only formatted when the level is enabled, so disabled hot-path events
+    cost a level check.
+    """
+    def __init__(self, logger: logging.Logger):
+        self.logger = logger
+
+    def enabled(self, level: int) -> bool:
+        return self.logger.isEnabledFor(level)
+
+    def _log(self, level: int, event: str, fields: Dict):
+        if self.logger.isEnabledFor(level):
+            self.logger.log(level, event, extra={"fields": fields})
+
+    def debug(self, event: str, **fields):
+        self._log(logging.DEBUG, event, fields)
+
+    def info(self, event: str, **fields):
+        self._log(logging.INFO, event, fields)
+
+    def warning(self, event: str, **fields):
+        self._log(logging.WARNING, event, fields)
+
+    def error(self, event: str, **fields):
+        self._log(logging.ERROR, event, fields)
+
+
+_configured = False
+
+
+def get_logger(name: str) -> StageLogger:
+    """
+    Returns the structured logger for a stage, configuring the "pipeline"
+    logger hierarchy from LOG_LEVEL and LOG_FORMAT on first use.
+    """
+    global _configured
+    if not _configured:
+        root = logging.getLogger("pipeline")
+        handler = logging.StreamHandler(sys.stderr)
+        handler.setFormatter(StructuredFormatter(json_lines=LOG_FORMAT == "json"))
+        root.addHandler(handler)
+        root.setLevel(getattr(logging, LOG_LEVEL, logging.INFO))
+        root.propagate = False
+        _configured = True
+    return StageLogger(logging.getLogger(f"pipeline.{name}"))
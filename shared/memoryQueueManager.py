@@ -0,0 +1,286 @@
+import itertools
+import sys
+import threading
+import time
+from collections import deque
+from types import SimpleNamespace
+from typing import Any, Deque, Dict, Iterable, Optional, Tuple
+from shared.flowControl import Backpressure, FlowControl, QueueFullError
+from shared.instrumentation import QUEUE_DEPTH, REJECTED, instrument_batch_callback, instrument_callback
+
+Delivery = Tuple[bytes, SimpleNamespace, bool]
+
+
+class MemoryQueue:
+    """
+    One queue of a MemoryBroker, honouring the x-arguments RabbitMQ would:
+    x-max-priority gives it a FIFO lane per priority, delivered highest first;
+    x-max-length with x-overflow reject-publish(-dlx) refuses publishes when full.
+    """
+    def __init__(self, arguments: Optional[Dict[str, Any]] = None):
+        arguments = arguments or {}
+        self.max_priority = arguments.get("x-max-priority", 0)
+        self.max_length = arguments.get("x-max-length", 0)
+        self.dead_letter_queue = arguments.get("x-dead-letter-routing-key")
+        self.lanes: Dict[int, Deque[Delivery]] = {priority: deque() for priority in range(self.max_priority, -1, -1)}
+
+    def __len__(self) -> int:
+        return sum(len(lane) for lane in self.lanes.values())
+
+    def full(self) -> bool:
+        return self.max_length > 0 and len(self) >= self.max_length
+
+    def append(self, delivery: Delivery):
+        priority = getattr(delivery[1], "priority", None) or 0
+        self.lanes[min(max(priority, 0), self.max_priority)].append(delivery)
+
+    def popleft(self) -> Delivery:
+        for lane in self.lanes.values():
+            if lane:
+                return lane.popleft()
+        raise IndexError("pop from an empty queue")
+
+
+class MemoryBroker:
+    """
+    An in-process stand-in for RabbitMQ: named queues shared by every
+    MemoryQueueManager created on it, as queues on one broker are shared by
+    every connection. Used by the load-test harness to run the whole pipeline
+    in one process without a broker.
+    """
+    def __init__(self):
+        self._queues: Dict[str, MemoryQueue] = {}
+        self._condition = threading.Condition()
+        self._tags = itertools.count(1)
+        self._reply_names = itertools.count(1)
+        self.closed = False
+        self.stats = {"published": 0, "delivered": 0, "requeued": 0, "dropped": 0, "rejected": 0, "dead_lettered": 0}
+
+    def declare(self, queue_name: str, arguments: Optional[Dict[str, Any]] = None):
+        with self._condition:
+            if queue_name not in self._queues:
+                self._queues[queue_name] = MemoryQueue(arguments)
+
+    def new_reply_queue(self) -> str:
+        name = f"amq.gen-memory-{next(self._reply_names)}"
+        self.declare(name)
+        return name
+
+    def publish(self, queue_name: str, body: bytes, properties: Optional[SimpleNamespace] = None,
+                redelivered: bool = False):
+        """
+        Appends a message to a queue. Requeued messages are let back in past the length limit.
+
+        Raises:
+            QueueFullError: If the queue is at its maximum length.
+        """
+        properties = properties or SimpleNamespace(correlation_id=None, priority=None)
+        with self._condition:
+            queue = self._queues.setdefault(queue_name, MemoryQueue())
+            if not redelivered and queue.full():
+                self.stats["rejected"] += 1
+                if queue.dead_letter_queue:
+                    self._dead_letter(queue.dead_letter_queue, body, properties)
+                raise QueueFullError(queue_name)
+            queue.append((body, properties, redelivered))
+            if not redelivered:
+                self.stats["published"] += 1
+            self._condition.notify_all()
+
+    def _dead_letter(self, queue_name: str, body: bytes, properties: SimpleNamespace):
+        queue = self._queues.setdefault(queue_name, MemoryQueue())
+        if queue.full():
+            # The dead-letter queue drops its oldest message, like RabbitMQ's default overflow
+            queue.popleft()
+        queue.append((body, properties, False))
+        self.stats["dead_lettered"] += 1
+
+    def drop(self, queue_name: str, body: bytes, properties: SimpleNamespace):
+        """
+        Discards a message that failed twice, dead-lettering it if its queue has a dead-letter queue.
+        """
+        with self._condition:
+            self.stats["dropped"] += 1
+            dead_letter_queue = self._queues.setdefault(queue_name, MemoryQueue()).dead_letter_queue
+            if dead_letter_queue:
+                self._dead_letter(dead_letter_queue, body, properties)
+
+    def get(self, queue_name: str, timeout: Optional[float]):
+        """
+        Takes the next message off a queue, waiting up to `timeout` seconds.
+
+        Returns:
+            The (method, properties, body) of the delivery, or None on timeout or shutdown.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            queue = self._queues.setdefault(queue_name, MemoryQueue())
+            while not queue and not self.closed:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return None
+                self._condition.wait(remaining)
+            if not queue:
+                return None
+            body, properties, redelivered = queue.popleft()
+            self.stats["delivered"] += 1
+        method = SimpleNamespace(delivery_tag=next(self._tags), redelivered=redelivered, routing_key=queue_name)
+        return method, properties, body
+
+    def depth(self, queue_name: str) -> int:
+        with self._condition:
+            return len(self._queues.get(queue_name, ()))
+
+    def depths(self) -> Dict[str, int]:
+        with self._condition:
+            return {name: len(queue) for name, queue in self._queues.items()}
+
+    def shutdown(self):
+        """
+        Wakes every consumer so its listening loop returns.
+        """
+        with self._condition:
+            self.closed = True
+            self._condition.notify_all()
+
+
+class MemoryQueueManager:
+    """
+    The QueueManager interface over a MemoryBroker. Callbacks are called as
+    callback(channel, method, properties, body), like pika's, and settled the
+    same way: acked when they return, requeued once if they raise and dropped
+    if they fail again on redelivery. start_listening blocks until the
+    broker is shut down, so run each consumer on its own thread. Queues are
+    declared with the flow-control arguments and publishes are held back by
+    the same backpressure as QueueManager's.
+    """
+    def __init__(self, broker: MemoryBroker, prefetch_count: int = 1, flow_control: FlowControl = FlowControl()):
+        """
+        Args:
+            broker (MemoryBroker): The broker shared by every stage of the pipeline.
+            prefetch_count (int): Accepted for compatibility; deliveries are taken one at a time.
+            flow_control (FlowControl): Length limits, overflow policy, priority lanes and
+                backpressure threshold for the pipeline queues.
+        """
+        self.broker = broker
+        self.prefetch_count = prefetch_count
+        self.flow_control = flow_control
+        self.backpressure = Backpressure(broker.depth, flow_control)
+        self.channel = None
+
+    def declare_queue(self, queue_name: str):
+        self.broker.declare(queue_name, self.flow_control.queue_arguments(queue_name))
+
+    def _publish(self, queue_name: str, message: str, properties, priority: Optional[int]):
+        if priority is not None:
+            properties = SimpleNamespace(**vars(properties)) if properties else SimpleNamespace(correlation_id=None)
+            properties.priority = priority
+        try:
+            self.broker.publish(queue_name, message.encode('utf-8'), properties)
+        except QueueFullError:
+            REJECTED.inc(queue=queue_name)
+            raise
+
+    def send_message(self, queue_name: str, message: str, properties=None, priority: Optional[int] = None):
+        self.declare_queue(queue_name)
+        self.backpressure.wait(queue_name)
+        self._publish(queue_name, message, properties, priority)
+
+    def send_messages(self, queue_name: str, messages: Iterable[str], properties=None,
+                      priority: Optional[int] = None) -> int:
+        self.declare_queue(queue_name)
+        self.backpressure.wait(queue_name)
+        messages = list(messages)
+        for count, message in enumerate(messages):
+            try:
+                self._publish(queue_name, message, properties, priority)
+            except QueueFullError:
+                raise QueueFullError(queue_name, unsent=range(count, len(messages)))
+        return len(messages)
+
+    def declare_reply_queue(self) -> str:
+        return self.broker.new_reply_queue()
+
+    def send_reply(self, reply_to: str, message: str, correlation_id: str):
+        self.broker.publish(reply_to, message.encode('utf-8'),
+                            SimpleNamespace(correlation_id=correlation_id, priority=None))
+
+    def iter_replies(self, reply_queue: str, correlation_id: str, timeout: float = 120.0):
+        """
+        Yields the bodies of replies with the given correlation ID until the
+        caller stops or none arrives for `timeout` seconds. Replies for other
+        correlation IDs are discarded.
+        """
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            delivery = self.broker.get(reply_queue, max(0.0, deadline - time.monotonic()))
+            if delivery is None:
+                return
+            _, properties, body = delivery
+            if properties.correlation_id == correlation_id:
+                deadline = time.monotonic() + timeout
+                yield body
+
+    def wait_for_reply(self, reply_queue: str, correlation_id: str, timeout: float = 120.0) -> Optional[bytes]:
+        for body in self.iter_replies(reply_queue, correlation_id, timeout):
+            return body
+        return None
+
+    def _settle(self, method, properties, body, succeeded: bool):
+        if not succeeded:
+            if method.redelivered:
+                self.broker.drop(method.routing_key, body, properties)
+            else:
+                self.broker.stats["requeued"] += 1
+                self.broker.publish(method.routing_key, body, properties, redelivered=True)
+
+    def start_listening(self, queue_name: str, callback, prefetch_count: Optional[int] = None):
+        """
+        Delivers messages from a queue to the callback until the broker is shut down.
+        """
+        self.declare_queue(queue_name)
+        callback = instrument_callback(queue_name, callback)
+        while not self.broker.closed:
+            delivery = self.broker.get(queue_name, timeout=0.5)
+            if delivery is None:
+                continue
+            method, properties, body = delivery
+            try:
+                callback(self.channel, method, properties, body)
+                succeeded = True
+            except Exception as e:
+                print(f"Error processing message: {e}", file=sys.stderr)
+                succeeded = False
+            self._settle(method, properties, body, succeeded)
+            QUEUE_DEPTH.set(self.broker.depth(queue_name), queue=queue_name)
+
+    def start_batch_listening(self, queue_name: str, batch_callback, batch_size: int = 32, max_wait_ms: int = 50):
+        """
+        Delivers messages in batches of up to `batch_size`, dispatching a
+        partial batch `max_wait_ms` after its first message arrived.
+        """
+        self.declare_queue(queue_name)
+        batch_callback = instrument_batch_callback(queue_name, batch_callback)
+        while not self.broker.closed:
+            first = self.broker.get(queue_name, timeout=0.5)
+            if first is None:
+                continue
+            batch = [first]
+            deadline = time.monotonic() + max_wait_ms / 1000.0
+            while len(batch) < batch_size:
+                delivery = self.broker.get(queue_name, timeout=max(0.0, deadline - time.monotonic()))
+                if delivery is None:
+                    break
+                batch.append(delivery)
+            try:
+                batch_callback(self.channel, batch)
+                succeeded = True
+            except Exception as e:
+                print(f"Error processing batch: {e}", file=sys.stderr)
+                succeeded = False
+            for method, properties, body in batch:
+                self._settle(method, properties, body, succeeded)
+            QUEUE_DEPTH.set(self.broker.depth(queue_name), queue=queue_name)
+
+    def close(self):
+        pass
@@ -0,0 +1,139 @@
+import json
+import os
+import sys
+import time
+from typing import Any, List, Optional, Sequence, Union
+import numpy as np
+
+# Files written by export_onnx() into the model directory
+MODEL_FILE = "model.onnx"
+QUANTIZED_MODEL_FILE = "model_int8.onnx"
+TOKENIZER_FILE = "tokenizer.json"
+CONFIG_FILE = "encoder.json"
+# Encoder backends selectable by EMBED_BACKEND in chunking/embed.py and RAG_ENCODER in RAG-Core
+BACKENDS = ("sentence-transformers", "onnx", "onnx-int8")
+
+
+class OnnxEncoder:
+    """
+    A sentence encoder that runs an exported transformer graph on onnxruntime
+    with the Rust `tokenizers` package, then applies the same mean pooling
+    and normalization as the sentence-transformers model it was exported
+    from. Neither torch nor transformers is imported, so it starts in a
+    fraction of the time and memory.
+
+    It implements the part of the SentenceTransformer interface the
+    Retriever and the Embedder use, so either can be passed a loaded encoder.
+    """
+    def __init__(self, model_dir: str, quantized: bool = False, num_threads: int = 0):
+        """
+        Args:
+            model_dir (str): Directory written by export_onnx().
+            quantized (bool): Load the int8-quantized graph instead of the float32 one.
+            num_threads (int): onnxruntime intra-op threads; 0 keeps its default (one per core).
+        """
+        try:
+            import onnxruntime
+            from tokenizers import Tokenizer
+        except ImportError:
+            raise RuntimeError("The ONNX encoder needs the onnxruntime and tokenizers packages: "
+                               "pip install onnxruntime tokenizers")
+        with open(os.path.join(model_dir, CONFIG_FILE), "r") as f:
+            self.config = json.load(f)
+        self.model_name = self.config["model_name"]
+        self.max_seq_length = self.config["max_seq_length"]
+        self.normalize = self.config["normalize"]
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, TOKENIZER_FILE))
+        self.tokenizer.enable_truncation(self.max_seq_length)
+        # Pad each batch to its longest text only
+        self.tokenizer.enable_padding(pad_id=self.config["pad_token_id"], pad_token=self.config["pad_token"])
+
+        options = onnxruntime.SessionOptions()
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        path = os.path.join(model_dir, QUANTIZED_MODEL_FILE if quantized else MODEL_FILE)
+        self.session = onnxruntime.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        self.input_names = {graph_input.name for graph_input in self.session.get_inputs()}
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.config["dimension"]
+
+    def _encode_batch(self, texts: List[str]) -> np.ndarray:
+        encodings = self.tokenizer.encode_batch(texts)
+        feed = {
+            "input_ids": np.array([e.ids for e in encodings], dtype=np.int64),
+            "attention_mask": np.array([e.attention_mask for e in encodings], dtype=np.int64),
+            "token_type_ids": np.array([e.type_ids for e in encodings], dtype=np.int64),
+        }
+        hidden = self.session.run(None, {name: value for name, value in feed.items() if name in self.input_names})[0]
+        mask = feed["attention_mask"][:, :, None].astype(np.float32)
+        vectors = (hidden * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+        if self.normalize:
+            vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        return vectors.astype(np.float32)
+
+    def encode(self, sentences: Union[str, Sequence[str]], batch_size: int = 32, convert_to_numpy: bool = True,
+               convert_to_tensor: bool = False, show_progress_bar: bool = False, **kwargs) -> np.ndarray:
+        """
+        Encodes one text (returning a vector) or a list of texts (returning
+        one row per text), like SentenceTransformer.encode. The result is
+        always a NumPy array; the conversion flags are accepted for
+        compatibility.
+        """
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        vectors = np.empty((len(texts), self.get_sentence_embedding_dimension()), dtype=np.float32)
+        for start in range(0, len(texts), batch_size):
+            vectors[start:start + batch_size] = self._encode_batch(texts[start:start + batch_size])
+        return vectors[0] if single else vectors
+
+
+def encoder_key(backend: str, model_name: str) -> str:
+    """
+    Names the vectors an encoder produces, e.g. for caching them: the backends
+    give slightly different vectors for the same model (int8 most of all), so
+    the ONNX ones are told apart from the sentence-transformers ones.
+    """
+    return model_name if backend == "sentence-transformers" else f"{model_name}:{backend}"
+
+
+def load_encoder(backend: str, model_name: str, onnx_dir: str = "", num_threads: int = 0,
+                 device: Optional[str] = None) -> Any:
+    """
+    Loads the sentence encoder for a backend in BACKENDS: the
+    sentence-transformers model itself, or its ONNX export (float32 or int8)
+    from onnx_dir. sentence-transformers, and with it torch, is only
+    imported when it is the backend in use.
+    """
+    start = time.perf_counter()
+    if backend == "sentence-transformers":
+        if num_threads:
+            import torch
+            torch.set_num_threads(num_threads)
+        from sentence_transformers import SentenceTransformer
+        encoder = SentenceTransformer(model_name, device=device)
+    elif backend in ("onnx", "onnx-int8"):
+        if not onnx_dir:
+            raise ValueError(f"The '{backend}' encoder needs the directory of an ONNX export of '{model_name}'.")
+        encoder = OnnxEncoder(onnx_dir, quantized=backend == "onnx-int8", num_threads=num_threads)
+        if encoder.model_name != model_name:
+            print(f" [!] ONNX export in '{onnx_dir}' is of '{encoder.model_name}', not '{model_name}'.", file=sys.stderr)
+    else:
+        raise ValueError(f"Unknown encoder backend '{backend}'; expected one of {', '.join(BACKENDS)}.")
+    print(f" [i] Loaded {backend} encoder for '{model_name}' in {(time.perf_counter() - start) * 1000:.0f} ms",
+          file=sys.stderr)
+    return encoder
+
+
+def cosine_agreement(reference: Any, candidate: Any, texts: List[str], batch_size: int = 32) -> np.ndarray:
+    """
+    Returns, per text, the cosine similarity between the vectors two encoders
+    produce for it. An ONNX export is compatible with a collection ingested
+    with the original model when these are all close to 1.
+    """
+    expected = np.asarray(reference.encode(texts, batch_size=batch_size, convert_to_numpy=True), dtype=np.float32)
+    actual = np.asarray(candidate.encode(texts, batch_size=batch_size, convert_to_numpy=True), dtype=np.float32)
+    expected /= np.maximum(np.linalg.norm(expected, axis=1, keepdims=True), 1e-12)
+    actual /= np.maximum(np.linalg.norm(actual, axis=1, keepdims=True), 1e-12)
+    return (expected * actual).sum(axis=1)
@@ -1,48 +1,421 @@
 import sys
+import time
+from typing import Iterable, Optional
 import pika
+from shared.flowControl import DEAD_LETTER_QUEUE, PIPELINE_QUEUES, Backpressure, FlowControl, QueueFullError
+from shared.instrumentation import (REJECTED, DepthSampler, get_logger, instrument_batch_callback, instrument_callback,
+                                    start_metrics_server)
+
+# Errors after which the connection (or channel) is unusable and must be rebuilt
+RECONNECT_ERRORS = (
+    pika.exceptions.AMQPConnectionError,
+    pika.exceptions.AMQPChannelError,
+    pika.exceptions.StreamLostError,
+    pika.exceptions.ConnectionClosedByBroker,
+)
+
+log = get_logger("queue")
 
 class QueueManager:
     """
     A reusable class to manage RabbitMQ connections and message handling.
+
+    Queues are declared once per connection, consumers use manual acknowledgements
+    with a configurable prefetch window, publishes go through a confirm-mode channel,
+    and the connection is re-established automatically after a broker restart.
+
+    Delivery is at-least-once. A message is acked only after its callback has
+    returned, so if the connection drops while a callback is publishing, the
+    message is redelivered on the new connection and processed again, even
+    if its output had already reached the next queue.
+    Consumers are instrumented: processing time, in-flight messages, errors and
+    queue depth are exported on the process's metrics endpoint.
+
+    The pipeline queues can be declared bounded and with priority lanes, and
+    publishes to a queue with a long backlog can be held back; all three are
+    opt-in (see flowControl).
     """
-    def __init__(self, rabbitmq_host='rabbitmq'):
+    def __init__(self, rabbitmq_host='rabbitmq', prefetch_count: int = 1,
+                 connect_retries: int = 10, retry_delay: float = 2.0, flow_control: FlowControl = FlowControl()):
         """
         Initializes the QueueManager and establishes a connection to RabbitMQ.
+
+        Args:
+            rabbitmq_host (str): Host name of the RabbitMQ broker.
+            prefetch_count (int): The number of unacknowledged messages the broker
+                may push to this consumer at once.
+            connect_retries (int): How many times to retry connecting before giving up.
+            retry_delay (float): Initial delay between retries, doubled on each attempt.
+            flow_control (FlowControl): Length limits, overflow policy, priority lanes and
+                backpressure threshold for the pipeline queues.
         """
+        self.rabbitmq_host = rabbitmq_host
+        self.flow_control = flow_control
+        self.backpressure = Backpressure(self.queue_depth, flow_control, sleep=self._sleep)
+        self.prefetch_count = prefetch_count
+        self.connect_retries = connect_retries
+        self.retry_delay = retry_delay
+        self.connection = None
+        self.channel = None
+        self.publish_channel = None
+        self._declared = set()
+        self._in_callback = False
         try:
-            self.connection = pika.BlockingConnection(pika.ConnectionParameters(rabbitmq_host))
-            self.channel = self.connection.channel()
-            print(" [i] Connected to RabbitMQ.")
+            self._connect()
         except pika.exceptions.AMQPConnectionError as e:
             print(f"Error: Could not connect to RabbitMQ at '{rabbitmq_host}'. Please ensure the service is running. Details: {e}", file=sys.stderr)
             sys.exit(1)
 
-    def send_message(self, queue_name: str, message: str):
+    def _connect(self):
+        """
+        Opens the connection, retrying with exponential backoff. One channel is
+        used for consuming and a second, confirm-mode channel for publishing.
+        """
+        delay = self.retry_delay
+        for attempt in range(1, self.connect_retries + 1):
+            try:
+                self.connection = pika.BlockingConnection(pika.ConnectionParameters(self.rabbitmq_host))
+                break
+            except pika.exceptions.AMQPConnectionError as e:
+                if attempt == self.connect_retries:
+                    raise
+                print(f" [!] RabbitMQ not reachable (attempt {attempt}/{self.connect_retries}): {e}. Retrying in {delay:.0f}s", file=sys.stderr)
+                time.sleep(delay)
+                delay = min(delay * 2, 30)
+
+        self.channel = self.connection.channel()
+        self.publish_channel = self.connection.channel()
+        self.publish_channel.confirm_delivery()
+        self._declared = set()
+        print(" [i] Connected to RabbitMQ.")
+
+    def reconnect(self):
         """
-        Sends a message to a specified queue.
+        Drops the current connection and opens a new one.
+        """
+        try:
+            if self.connection and self.connection.is_open:
+                self.connection.close()
+        except Exception:
+            pass
+        self._connect()
+
+    def _recover(self, error: Exception, what: str):
+        """
+        Reconnects after a failed publish so it can be retried. Inside a
+        consumer callback the error is raised instead: the delivery being
+        processed belongs to the old channel, so the consume loop has to
+        reconnect and let the broker redeliver it.
+        """
+        if self._in_callback:
+            raise error
+        print(f" [!] {what} failed ({error}); reconnecting and retrying.", file=sys.stderr)
+        self.reconnect()
+
+    def declare_queue(self, queue_name: str):
+        """
+        Declares a queue once per connection; later calls are free. Pipeline
+        queues get their flow-control arguments, and the dead-letter queue is
+        declared alongside them when overflow is dead-lettered.
+
+        Args:
+            queue_name (str): The name of the queue.
+        """
+        if queue_name not in self._declared:
+            self.channel.queue_declare(queue=queue_name, arguments=self.flow_control.queue_arguments(queue_name))
+            self._declared.add(queue_name)
+            if self.flow_control.dead_letters and queue_name in PIPELINE_QUEUES:
+                self.declare_queue(DEAD_LETTER_QUEUE)
+
+    def _publish(self, queue_name: str, message: str, properties: Optional[pika.BasicProperties] = None,
+                 priority: Optional[int] = None):
+        self.declare_queue(queue_name)
+        if priority is not None:
+            properties = properties or pika.BasicProperties()
+            properties.priority = priority
+        # The confirm-mode channel raises NackError/UnroutableError if the broker
+        # did not take responsibility for the message; a full queue nacks.
+        try:
+            self.publish_channel.basic_publish(exchange='',
+                                               routing_key=queue_name,
+                                               body=message.encode('utf-8'),
+                                               properties=properties)
+        except pika.exceptions.NackError:
+            REJECTED.inc(queue=queue_name)
+            raise QueueFullError(queue_name)
+
+    def send_message(self, queue_name: str, message: str, properties: Optional[pika.BasicProperties] = None,
+                     priority: Optional[int] = None):
+        """
+        Sends a message to a specified queue and waits for the broker's confirm.
+        If the queue's backlog is over the high-water mark, waits for it to drain first.
 
         Args:
             queue_name (str): The name of the queue.
             message (str): The message to send.
+            properties (pika.BasicProperties): Optional AMQP message properties.
+            priority (int): The message's priority lane (see flowControl.message_priority).
+
+        Raises:
+            QueueFullError: If the queue is at its maximum length.
         """
-        self.channel.queue_declare(queue=queue_name)
-        self.channel.basic_publish(exchange='',
-                                   routing_key=queue_name,
-                                   body=message.encode('utf-8'))
-        print(f" [x] Sent message to '{queue_name}'")
+        self.declare_queue(queue_name)
+        self.backpressure.wait(queue_name)
+        try:
+            self._publish(queue_name, message, properties, priority)
+        except RECONNECT_ERRORS as e:
+            self._recover(e, "Publish")
+            self._publish(queue_name, message, properties, priority)
+        log.debug("sent", queue=queue_name)
+
+    def send_messages(self, queue_name: str, messages: Iterable[str], properties: Optional[pika.BasicProperties] = None,
+                      priority: Optional[int] = None) -> int:
+        """
+        Publishes a batch of messages to a queue over the confirm-mode channel.
+        If the connection drops part way through, the unconfirmed remainder is
+        re-sent after reconnecting (outside a consumer callback; see _recover).
+
+        Args:
+            queue_name (str): The name of the queue.
+            messages (Iterable[str]): The messages to send, in order.
+            properties (pika.BasicProperties): Optional AMQP properties applied to every message.
+            priority (int): The priority lane of every message.
 
-    def start_listening(self, queue_name: str, callback):
+        Returns:
+            int: The number of messages confirmed by the broker.
+
+        Raises:
+            QueueFullError: If the queue filled up part way through; its
+                `unsent` lists the messages from that point on.
+        """
+        messages = list(messages)
+        confirmed = 0
+        retried = False
+        self.declare_queue(queue_name)
+        self.backpressure.wait(queue_name)
+        while confirmed < len(messages):
+            try:
+                self._publish(queue_name, messages[confirmed], properties, priority)
+                confirmed += 1
+            except QueueFullError:
+                raise QueueFullError(queue_name, unsent=range(confirmed, len(messages)))
+            except RECONNECT_ERRORS as e:
+                if retried:
+                    raise
+                self._recover(e, f"Batch publish after {confirmed} messages")
+                retried = True
+        log.debug("sent batch", queue=queue_name, messages=confirmed)
+        return confirmed
+
+    def declare_reply_queue(self) -> str:
+        """
+        Declares a private, server-named queue for receiving replies on this connection.
+
+        Returns:
+            str: The name of the reply queue.
+        """
+        result = self.channel.queue_declare(queue='', exclusive=True, auto_delete=True)
+        return result.method.queue
+
+    def send_reply(self, reply_to: str, message: str, correlation_id: str):
+        """
+        Publishes a reply to a client's reply queue. The queue belongs to the
+        client's connection, so it is not declared here.
+
+        Args:
+            reply_to (str): The client's reply queue.
+            message (str): The reply body.
+            correlation_id (str): The correlation ID of the request being answered.
+        """
+        properties = pika.BasicProperties(correlation_id=correlation_id)
+        try:
+            self.publish_channel.basic_publish(exchange='', routing_key=reply_to,
+                                               body=message.encode('utf-8'), properties=properties)
+        except RECONNECT_ERRORS as e:
+            self._recover(e, "Reply")
+            self.publish_channel.basic_publish(exchange='', routing_key=reply_to,
+                                               body=message.encode('utf-8'), properties=properties)
+        log.debug("sent reply", reply_to=reply_to, correlation_id=correlation_id)
+
+    def iter_replies(self, reply_queue: str, correlation_id: str, timeout: float = 120.0):
+        """
+        Yields the bodies of replies with the given correlation ID as they
+        arrive on the reply queue, until the caller stops iterating or no
+        reply arrives for `timeout` seconds. Replies for other correlation IDs
+        are discarded.
+
+        Args:
+            reply_queue (str): The queue returned by declare_reply_queue.
+            correlation_id (str): The correlation ID to wait for.
+            timeout (float): Seconds of silence before giving up.
+        """
+        deadline = time.monotonic() + timeout
+        try:
+            for method, properties, body in self.channel.consume(queue=reply_queue, auto_ack=True, inactivity_timeout=0.5):
+                if method is not None and properties.correlation_id == correlation_id:
+                    deadline = time.monotonic() + timeout
+                    yield body
+                elif time.monotonic() >= deadline:
+                    return
+        finally:
+            self.channel.cancel()
+
+    def wait_for_reply(self, reply_queue: str, correlation_id: str, timeout: float = 120.0) -> Optional[bytes]:
+        """
+        Blocks until a reply with the given correlation ID arrives on the reply queue.
+
+        Args:
+            reply_queue (str): The queue returned by declare_reply_queue.
+            correlation_id (str): The correlation ID to wait for.
+            timeout (float): Seconds to wait before giving up.
+
+        Returns:
+            Optional[bytes]: The reply body, or None on timeout.
+        """
+        for body in self.iter_replies(reply_queue, correlation_id, timeout):
+            return body
+        return None
+
+    def queue_depth(self, queue_name: str) -> int:
+        """
+        Returns the number of messages ready in a queue, read with a passive declare.
+        """
+        return self.channel.queue_declare(queue=queue_name, passive=True).method.message_count
+
+    def _sleep(self, seconds: float):
+        """
+        Waits while letting the BlockingConnection service heartbeats and I/O,
+        so backpressure inside a consumer callback doesn't get the connection dropped.
+        """
+        self.connection.sleep(seconds)
+
+    def _settle(self, channel, method, succeeded: bool):
+        """
+        Acks a processed delivery, or rejects a failed one. A failed message is
+        requeued once; if it fails again on redelivery it is dropped so a poison
+        message can't block the queue.
+        """
+        if succeeded:
+            channel.basic_ack(delivery_tag=method.delivery_tag)
+        else:
+            channel.basic_nack(delivery_tag=method.delivery_tag, requeue=not method.redelivered)
+
+    def _settle_batch(self, channel, batch, succeeded: bool):
+        """
+        Settles every delivery of a batch. A processed batch is acked with one
+        multiple ack; a failed one is rejected delivery by delivery, since
+        whether each message is requeued depends on its own redelivered flag.
+        """
+        if succeeded:
+            channel.basic_ack(delivery_tag=batch[-1][0].delivery_tag, multiple=True)
+            return
+        for method, _, _ in batch:
+            self._settle(channel, method, succeeded=False)
+
+    def _consume_forever(self, queue_name: str, prefetch_count: int, consume):
+        """
+        Runs a consume loop, re-establishing the connection whenever the broker goes away.
+        """
+        while True:
+            try:
+                self.declare_queue(queue_name)
+                self.channel.basic_qos(prefetch_count=prefetch_count)
+                consume()
+                return
+            except RECONNECT_ERRORS as e:
+                print(f" [!] Lost connection to RabbitMQ ({e}); reconnecting.", file=sys.stderr)
+                time.sleep(self.retry_delay)
+                self.reconnect()
+
+    def start_listening(self, queue_name: str, callback, prefetch_count: Optional[int] = None):
         """
         Starts listening for messages on a queue. This is a blocking call.
 
+        The message is acknowledged only after the callback returns; if the
+        callback raises, the message is rejected instead. If the connection is
+        lost during the callback, the message is left unacked for the broker
+        to redeliver once the consume loop has reconnected.
+
         Args:
             queue_name (str): The name of the queue to listen to.
-            callback: The function to call when a message is received.
+            callback: The function to call when a message is received, called as
+                callback(channel, method, properties, body).
+            prefetch_count (int): Overrides the manager's prefetch window for this consumer.
         """
-        self.channel.queue_declare(queue=queue_name)
-        self.channel.basic_consume(queue=queue_name, on_message_callback=callback, auto_ack=True)
-        print(f' [*] Waiting for messages on {queue_name}. To exit press CTRL+C')
-        self.channel.start_consuming()
+        prefetch_count = prefetch_count or self.prefetch_count
+        callback = instrument_callback(queue_name, callback)
+        depth = DepthSampler(self.queue_depth)
+        start_metrics_server()
+
+        def on_message(ch, method, properties, body):
+            self._in_callback = True
+            try:
+                callback(ch, method, properties, body)
+                succeeded = True
+            except RECONNECT_ERRORS:
+                raise
+            except Exception as e:
+                log.error("callback failed", queue=queue_name, error=str(e), redelivered=method.redelivered)
+                succeeded = False
+            finally:
+                self._in_callback = False
+            self._settle(ch, method, succeeded=succeeded)
+            depth.maybe_sample(queue_name)
+
+        def consume():
+            self.channel.basic_consume(queue=queue_name, on_message_callback=on_message, auto_ack=False)
+            print(f' [*] Waiting for messages on {queue_name} (prefetch={prefetch_count}). To exit press CTRL+C')
+            self.channel.start_consuming()
+
+        self._consume_forever(queue_name, prefetch_count, consume)
+
+    def start_batch_listening(self, queue_name: str, batch_callback, batch_size: int = 32, max_wait_ms: int = 50):
+        """
+        Starts listening for messages on a queue and hands them to the callback
+        in batches. A batch is dispatched when it holds `batch_size` messages or
+        when `max_wait_ms` has passed since its first message arrived,
+        whichever comes first. This is a blocking call.
+
+        Args:
+            queue_name (str): The name of the queue to listen to.
+            batch_callback: Called as batch_callback(channel, deliveries), where
+                deliveries is a list of (method, properties, body) tuples in arrival order.
+            batch_size (int): The maximum number of messages per batch.
+            max_wait_ms (int): The maximum time to wait for a batch to fill.
+        """
+        max_wait = max_wait_ms / 1000.0
+        batch_callback = instrument_batch_callback(queue_name, batch_callback)
+        depth = DepthSampler(self.queue_depth)
+        start_metrics_server()
+
+        def consume():
+            print(f' [*] Waiting for messages on {queue_name} (batch_size={batch_size}, max_wait_ms={max_wait_ms}). To exit press CTRL+C')
+            batch = []
+            deadline = None
+            for method, properties, body in self.channel.consume(queue=queue_name, inactivity_timeout=max_wait):
+                if method is not None:
+                    batch.append((method, properties, body))
+                    if deadline is None:
+                        deadline = time.monotonic() + max_wait
+                if batch and (len(batch) >= batch_size or method is None or time.monotonic() >= deadline):
+                    self._in_callback = True
+                    try:
+                        batch_callback(self.channel, batch)
+                        succeeded = True
+                    except RECONNECT_ERRORS:
+                        raise
+                    except Exception as e:
+                        log.error("batch callback failed", queue=queue_name, error=str(e), messages=len(batch))
+                        succeeded = False
+                    finally:
+                        self._in_callback = False
+                    self._settle_batch(self.channel, batch, succeeded)
+                    depth.maybe_sample(queue_name)
+                    batch = []
+                    deadline = None
+
+        # The broker must be allowed to push a full batch before we ack anything
+        self._consume_forever(queue_name, batch_size, consume)
 
     def close(self):
         """
@@ -50,4 +423,4 @@ class QueueManager:
         """
         if self.connection and self.connection.is_open:
             self.connection.close()
-            print(" [i] Closed connection to RabbitMQ.")
\ No newline at end of file
+            print(" [i] Closed connection to RabbitMQ.")
@@ -0,0 +1,92 @@
+import os
+import random
+import re
+import sys
+
+# Add the guardrail directory to the system path to allow importing the guardrail modules
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(os.path.dirname(current_dir), "external-guardtail", "v1"))
+
+import pytest
+
+from guardrailEngine import get_engine
+from streamingGuard import guard_stream
+
+RESPONSE_PARAGRAPH = (
+    "Under the Consumer Protection Act, 2019, a consumer may file a complaint with the District "
+    "Commission where the value of the goods or services paid as consideration does not exceed one "
+    "crore rupees. The complaint may be filed electronically and should describe the defect in the "
+    "goods or the deficiency in service, the relief sought, and include copies of the invoice. "
+)
+PADDING = " " + "x" * 100
+
+
+def random_chunks(text: str, rng: random.Random, max_size: int = 12):
+    chunks = []
+    position = 0
+    while position < len(text):
+        size = rng.randint(1, max_size)
+        chunks.append(text[position:position + size])
+        position += size
+    return chunks
+
+
+@pytest.mark.parametrize("chunks, rule_id, hidden", [
+    # A keyword split across two chunks
+    (["This may be ille", "gal in some states." + PADDING], "kw-illegal", "ille"),
+    # An e-mail address split across three chunks
+    (["Write to care", "@shop.", "in for a refund." + PADDING], "pii-email", "care"),
+    # An Aadhaar number split between its digit groups
+    (["His number is 2345 67", "89 0123 on file." + PADDING], "pii-aadhaar", "2345"),
+])
+def test_blocking_match_split_across_chunks(chunks, rule_id, hidden):
+    released, guard = guard_stream(chunks)
+    assert guard.blocked is not None and guard.blocked.rule_id == rule_id
+    assert hidden not in "".join(released)
+
+
+def test_disclaimer_split_across_chunks():
+    # A phrase longer than the guard's left context, split inside a word
+    released, guard = guard_stream(["If so, you will defin", "itely win the case." + PADDING])
+    assert "legal-guaranteed" in {match.rule_id for match in guard.matches}
+    assert "".join(released).endswith(get_engine().compiled.rules_by_id["legal-guaranteed"].message)
+
+
+def test_tentative_match_invalidated_by_next_chunk():
+    # A PAN-shaped prefix that the next chunk turns into a longer word must not fire
+    released, guard = guard_stream(["Code ABCDE1234F", "GH is not a PAN." + PADDING])
+    assert guard.blocked is None
+    assert "".join(released).startswith("Code ABCDE1234FGH")
+
+
+def test_match_at_end_of_stream_fires_on_finish():
+    released, guard = guard_stream(["Please do not do anything harm", "ful"])
+    assert guard.blocked is not None and guard.blocked.rule_id == "kw-harmful"
+    assert released == []
+
+
+def test_disclaimer_appended_once_after_text():
+    tokens = re.findall(r"\s*\S+", "If they refuse, you should sue them in the District Commission.")
+    released, guard = guard_stream(tokens)
+    message = get_engine().compiled.rules_by_id["legal-you-should-sue"].message
+    assert "".join(released).endswith(message)
+    assert "".join(released).count(message) == 1
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_random_chunkings_match_whole_response_check(seed):
+    # Random chunkings decide exactly as a whole-response check does, and release the text unchanged
+    rng = random.Random(seed)
+    inserts = ["illegal", "a.b@mail.com", "ABCDE1234F", "2345 6789 0123", "dangerously", "fine", "you should sue"]
+    engine = get_engine()
+    for _ in range(100):
+        words = RESPONSE_PARAGRAPH.split()
+        for _ in range(rng.randint(0, 2)):
+            words.insert(rng.randrange(len(words)), rng.choice(inserts))
+        text = " ".join(words)
+        expected, matches = engine.evaluate(text)
+        released, guard = guard_stream(random_chunks(text, rng))
+        blocked = any(match.action == "block" for match in matches)
+        assert (guard.blocked is not None) == blocked, text
+        if not blocked:
+            assert "".join(released) == expected, text